@@ -0,0 +1,132 @@
+# admission.py
+# Admission control for trainings that run inside the serving process. Concurrent Keras
+# trainings share the cores, so past a small number each extra one only slows the others
+# down. AdmissionController hands out a fixed number of slots, lets a bounded FIFO queue
+# wait for them, and rejects the rest straight away with a Retry-After estimate. The
+# thread settings below size TensorFlow's and the BLAS/OpenMP pools to match.
+
+import os
+import math
+import time
+import threading
+from collections import deque
+
+
+class Rejected(Exception):
+    """Request turned away: `status` is 429 (queue full) or 503 (waited too long)."""
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def serving_thread_counts(max_concurrent, cpu_count=None):
+    """
+    Thread pools for up to `max_concurrent` trainings sharing one process. TensorFlow's
+    intra-op pool is process-wide, so it keeps every core and the inter-op pool gets one
+    lane per training; OpenMP/BLAS teams are created per calling thread, so each gets its
+    share of the cores instead of all of them.
+    """
+    cores = cpu_count or os.cpu_count() or 1
+    concurrent = max(1, min(int(max_concurrent), cores))
+    return {'intra_op': cores, 'inter_op': concurrent, 'omp': max(1, cores // concurrent)}
+
+
+def configure_serving_threads(max_concurrent, cpu_count=None):
+    """
+    Apply serving_thread_counts() unless the environment already sets a value. Must run
+    before TensorFlow is imported; BLAS libraries already loaded (NumPy's) are limited
+    through threadpoolctl when it is installed.
+    Returns: the effective {'intra_op', 'inter_op', 'omp'}
+    """
+    counts = serving_thread_counts(max_concurrent, cpu_count)
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ.setdefault(var, str(counts['omp']))
+    os.environ.setdefault('TF_NUM_INTRAOP_THREADS', str(counts['intra_op']))
+    os.environ.setdefault('TF_NUM_INTEROP_THREADS', str(counts['inter_op']))
+    effective = {'intra_op': int(os.environ['TF_NUM_INTRAOP_THREADS']),
+                 'inter_op': int(os.environ['TF_NUM_INTEROP_THREADS']),
+                 'omp': int(os.environ['OMP_NUM_THREADS'])}
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=effective['omp'])
+    except ImportError:
+        pass
+    return effective
+
+
+class AdmissionController:
+    """
+    At most `max_concurrent` holders at once; up to `max_queue` more wait in arrival order
+    for at most `max_wait` seconds. acquire() raises Rejected(429) when the queue is full
+    and Rejected(503) when the wait runs out; both carry a Retry-After estimate from the
+    recent service time. stats() reports queue depth and recent wait times.
+    """
+
+    def __init__(self, max_concurrent=1, max_queue=8, max_wait=120.0, default_service=30.0):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queue = max(0, int(max_queue))
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = deque()         # tickets in arrival order
+        self._service = default_service  # EWMA of slot hold time, seconds
+        self._waits = deque(maxlen=512)  # recent waits of admitted requests, seconds
+        self._admitted = 0
+        self._rejected = {'queue_full': 0, 'timeout': 0}
+
+    def _retry_after(self):
+        # time until the requests ahead of a newcomer have likely been served
+        ahead = self._active + len(self._waiting) + 1 - self.max_concurrent
+        return max(1, math.ceil(self._service * max(ahead, 1) / self.max_concurrent))
+
+    def acquire(self):
+        """Blocks until a slot is free. Returns: ticket for release() (holds the wait time)."""
+        t0 = time.monotonic()
+        with self._cond:
+            if self._active < self.max_concurrent and not self._waiting:
+                self._active += 1
+            else:
+                if len(self._waiting) >= self.max_queue:
+                    self._rejected['queue_full'] += 1
+                    raise Rejected(429, f"Too many forecasts in progress ({len(self._waiting)} queued)",
+                                   self._retry_after())
+                ticket = object()
+                self._waiting.append(ticket)
+                try:
+                    while self._active >= self.max_concurrent or self._waiting[0] is not ticket:
+                        remaining = t0 + self.max_wait - time.monotonic()
+                        if remaining <= 0:
+                            self._rejected['timeout'] += 1
+                            raise Rejected(503, f"No forecast slot freed up within {self.max_wait:g}s",
+                                           self._retry_after())
+                        self._cond.wait(remaining)
+                    self._active += 1
+                finally:
+                    self._waiting.remove(ticket)
+                    self._cond.notify_all()  # the next in line may be able to go now
+            self._admitted += 1
+            waited = time.monotonic() - t0
+            self._waits.append(waited)
+        return {'waited': waited, 'started': time.monotonic()}
+
+    def release(self, ticket):
+        with self._cond:
+            self._active -= 1
+            held = time.monotonic() - ticket['started']
+            self._service = 0.8 * self._service + 0.2 * held
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            waits = sorted(self._waits)
+            pick = lambda q: round(waits[min(len(waits) - 1, int(q * len(waits)))] * 1000, 1) if waits else None
+            return {
+                'max_concurrent': self.max_concurrent, 'active': self._active,
+                'queued': len(self._waiting), 'max_queue': self.max_queue, 'max_wait_s': self.max_wait,
+                'admitted': self._admitted, 'rejected': dict(self._rejected),
+                'wait_ms': {'p50': pick(0.5), 'p95': pick(0.95), 'max': pick(1.0)},
+                'service_s': round(self._service, 3), 'retry_after_s': self._retry_after(),
+            }
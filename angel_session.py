@@ -0,0 +1,256 @@
+# angel_session.py
+# Shared Angel One SmartConnect session (login once, refresh the JWT before it expires)
+# and a chunked, rate-limited historical candle fetcher.
+
+import json
+import time
+import base64
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+# Longest date range (in days) getCandleData serves per request for each interval;
+# longer ranges are silently truncated by the broker, so they are split into chunks.
+MAX_DAYS_PER_REQUEST = {
+    'ONE_MINUTE': 30,
+    'THREE_MINUTE': 60,
+    'FIVE_MINUTE': 100,
+    'TEN_MINUTE': 100,
+    'FIFTEEN_MINUTE': 200,
+    'THIRTY_MINUTE': 200,
+    'ONE_HOUR': 400,
+    'ONE_DAY': 2000
+}
+CANDLE_COLUMNS = ['timestamp', 'Open', 'High', 'Low', 'Close', 'Volume']
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+RATE_LIMIT_ERROR = 'AB1019'  # "Access denied because of exceeding access rate"
+# invalid / expired / missing JWT, invalid refresh token, expired session
+AUTH_ERRORS = {'AG8001', 'AG8002', 'AG8003', 'AB8050', 'AB8051', 'AB1010'}
+
+
+class AngelAuthError(Exception):
+    """The broker rejected the session's token; renew the session and retry."""
+
+
+class CandleFetchError(Exception):
+    """A chunk of a candle range could not be fetched, so the range must not be stored."""
+
+
+def jwt_expiry(token):
+    """Expiry (epoch seconds) from a JWT's payload, or None if it cannot be read. No signature check."""
+    try:
+        token = token.split(' ')[-1]  # tolerate a "Bearer " prefix
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+    except Exception:
+        return None
+
+
+def checked_call(method, *args):
+    """
+    A SmartConnect call whose token rejections raise AngelAuthError: SmartConnect raises
+    TokenException on HTTP 403, other endpoints answer with an auth errorcode instead.
+    """
+    try:
+        resp = method(*args)
+    except Exception as e:
+        if type(e).__name__ == 'TokenException':
+            raise AngelAuthError(str(e)) from e
+        raise
+    if isinstance(resp, dict) and resp.get('errorcode') in AUTH_ERRORS:
+        raise AngelAuthError(f"{resp['errorcode']}: {resp.get('message')}")
+    return resp
+
+
+class TokenBucket:
+    """
+    Blocking token-bucket rate limiter: `rate` requests per second, bursts up to `capacity`.
+    Keep capacity at 1 for brokers that enforce the limit over a sliding one-second window.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AngelSessionManager:
+    """
+    Thread-safe holder of one logged-in SmartConnect.
+
+    get() returns the cached session while its JWT is valid for at least `refresh_margin`
+    seconds, renews it with the refresh token when it is about to expire, and only falls
+    back to a full login (the only step that needs a TOTP) when no usable session exists.
+    """
+
+    def __init__(self, api_key, client_id, password, totp_secret=None, root=None,
+                 refresh_margin=300, default_ttl=6 * 3600, smartconnect_factory=None):
+        self.api_key = api_key
+        self.client_id = client_id
+        self.password = password
+        self.totp_secret = totp_secret
+        self.root = root
+        self.refresh_margin = refresh_margin
+        self.default_ttl = default_ttl
+        self._factory = smartconnect_factory
+        self._lock = threading.Lock()
+        self._obj = None
+        self._refresh_token = None
+        self._expires_at = 0.0
+        self._issued_at = 0.0
+        self.logins = 0
+        self.refreshes = 0
+
+    @property
+    def configured(self):
+        return bool(self.api_key and self.client_id and self.password)
+
+    def _new_client(self):
+        if self._factory is not None:
+            return self._factory()
+        from SmartApi import SmartConnect
+        kwargs = {'api_key': self.api_key}
+        if self.root:
+            kwargs['root'] = self.root
+        return SmartConnect(**kwargs)
+
+    def _set_tokens(self, jwt_token, refresh_token=None):
+        if refresh_token:
+            self._refresh_token = refresh_token
+        self._expires_at = jwt_expiry(jwt_token) or (time.time() + self.default_ttl)
+        self._issued_at = time.time()
+
+    def _login(self, totp):
+        if not totp and self.totp_secret:
+            import pyotp
+            totp = pyotp.TOTP(self.totp_secret).now()
+        if not totp:
+            return None, 'TOTP required: pass one or set ANGEL_TOTP_SECRET'
+        obj = self._new_client()
+        data = obj.generateSession(self.client_id, self.password, totp)
+        if not (data and data.get('status')):
+            return None, data.get('message') if isinstance(data, dict) else 'unknown error'
+        self._obj = obj
+        self._set_tokens(data['data']['jwtToken'], data['data'].get('refreshToken'))
+        self.logins += 1
+        return obj, None
+
+    def _refresh(self):
+        try:
+            resp = self._obj.generateToken(self._refresh_token)
+            data = resp.get('data') or {}
+            if not resp.get('status') or not data.get('jwtToken'):
+                return False
+            self._obj.setAccessToken(data['jwtToken'].split(' ')[-1])
+            self._set_tokens(data['jwtToken'], data.get('refreshToken'))
+            self.refreshes += 1
+            return True
+        except Exception as e:
+            print("Angel One token refresh failed:", e)
+            return False
+
+    def get(self, totp=None):
+        """Returns: (SmartConnect or None, error message or None)"""
+        if not self.configured:
+            return None, 'Angel One credentials are not configured'
+        with self._lock:
+            now = time.time()
+            if self._obj is not None and now < self._expires_at - self.refresh_margin:
+                return self._obj, None
+            if self._obj is not None and self._refresh_token and self._refresh():
+                return self._obj, None
+            self._obj = None
+            try:
+                return self._login(totp)
+            except Exception as e:
+                return None, str(e)
+
+    def invalidate(self, issued_before=None):
+        """
+        Treat the cached session as expired after the broker rejected its token, so the
+        next get() refreshes it (or logs in again). issued_before: the time the rejected
+        call started; a session renewed since then by another caller is kept.
+        """
+        with self._lock:
+            if issued_before is None or self._issued_at < issued_before:
+                self._expires_at = 0.0
+
+
+def chunk_ranges(start, end, interval):
+    """Split [start, end] into consecutive (from, to) datetimes the broker serves in one request."""
+    span = timedelta(days=MAX_DAYS_PER_REQUEST.get(interval, 30))
+    ranges = []
+    cur = start
+    while cur < end:
+        nxt = min(cur + span, end)
+        ranges.append((cur, nxt))
+        cur = nxt + timedelta(minutes=1)
+    return ranges
+
+
+def fetch_candles(obj, token, start, end, interval='ONE_DAY', exchange='NSE', limiter=None, max_workers=4,
+                  retries=3):
+    """
+    Download [start, end] in interval-sized chunks, concurrently but no faster than `limiter`
+    allows, and stitch them into one DataFrame (timestamp index, numeric OHLCV columns).
+    Chunks rejected by the broker's rate limit are retried with backoff. Any other failed
+    chunk fails the whole fetch: a stitched frame with a hole would be stored as complete.
+    Returns None if no chunk returned data.
+    Raises: AngelAuthError when the session's token is rejected, CandleFetchError when a
+    chunk fails or is still rate limited after `retries` retries
+    """
+    def fetch_one(rng):
+        span = f"{rng[0]:%Y-%m-%d}..{rng[1]:%Y-%m-%d}"
+        for attempt in range(retries + 1):
+            if limiter is not None:
+                limiter.acquire()
+            hist = checked_call(obj.getCandleData, {
+                'exchange': exchange,
+                'symboltoken': token,
+                'interval': interval,
+                'fromdate': rng[0].strftime(DATE_FORMAT),
+                'todate': rng[1].strftime(DATE_FORMAT)
+            })
+            if isinstance(hist, dict) and hist.get('status'):
+                return hist.get('data') or []  # no candles in range (holidays, before listing)
+            if not (isinstance(hist, dict) and hist.get('errorcode') == RATE_LIMIT_ERROR):
+                message = hist.get('message') if isinstance(hist, dict) else 'empty response'
+                raise CandleFetchError(f"candles {span}: {message}")
+            time.sleep(0.5 * (attempt + 1))
+        raise CandleFetchError(f"candles {span}: still rate limited after {retries} retries")
+
+    ranges = chunk_ranges(start, end, interval)
+    if not ranges:
+        return None
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(ranges)))) as pool:
+        chunks = list(pool.map(fetch_one, ranges))
+    rows = [row for chunk in chunks for row in chunk]
+    if not rows:
+        return None
+    df = pd.DataFrame(rows, columns=CANDLE_COLUMNS)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df = df.drop_duplicates('timestamp', keep='last').set_index('timestamp').sort_index()
+    for col in df.columns:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df.dropna()
+
+
+def parse_angel_date(value):
+    return value if isinstance(value, datetime) else datetime.strptime(value, DATE_FORMAT)
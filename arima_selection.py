@@ -0,0 +1,221 @@
+# arima_selection.py
+# Per-symbol ARIMA order selection. The differencing order d is picked once with an ADF
+# test and the series is differenced once; every (p, q) candidate then fits an ARMA model
+# on that shared differenced series (same trend as ARIMA(p, d, q) on the levels) in a
+# process pool, and the lowest AIC wins. The chosen order is cached per symbol
+# (ArimaOrderCache) so later fits of the same symbol skip the search.
+#
+# Usage: python arima_selection.py --csv history.csv [--max-p 5] [--max-q 2] [--workers 4]
+
+import os
+import sys
+import json
+import time
+import fcntl
+import atexit
+import argparse
+import warnings
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+
+DEFAULT_ORDER = (5, 1, 0)
+
+
+def choose_d(series, max_d=2, alpha=0.05):
+    """Smallest d <= max_d whose d-th difference rejects a unit root (ADF test at `alpha`)."""
+    from statsmodels.tsa.stattools import adfuller
+    y = np.asarray(series, dtype=np.float64)
+    for d in range(max_d):
+        try:
+            if adfuller(y, autolag='AIC')[1] < alpha:
+                return d
+        except ValueError:  # constant series: nothing left to difference away
+            return d
+        y = np.diff(y)
+    return max_d
+
+
+def fit_candidate(diffed, p, q, trend, max_iters=50):
+    """
+    ARMA(p, q) on the differenced series, maximised for up to max_iters iterations.
+    Runs in a pool worker.
+    Returns: {'p', 'q', 'aic', 'status': 'finished' | 'failed'}
+    """
+    from statsmodels.tsa.arima.model import ARIMA
+    # the variance is profiled out of the likelihood: one parameter less to search, same AIC
+    # (a white-noise model with nothing else to estimate keeps it)
+    concentrate = p + q > 0 or trend != 'n'
+    try:
+        model = ARIMA(diffed, order=(p, 0, q), trend=trend, concentrate_scale=concentrate)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')  # unconverged fits are used as they are, like ARIMA.fit
+            res = model.fit(method_kwargs={'maxiter': max_iters})
+    except Exception as e:
+        return {'p': p, 'q': q, 'aic': None, 'status': 'failed', 'error': str(e)}
+    if not np.isfinite(res.aic):
+        return {'p': p, 'q': q, 'aic': None, 'status': 'failed', 'error': 'non-finite AIC'}
+    return {'p': p, 'q': q, 'aic': float(res.aic), 'status': 'finished'}
+
+
+class _Inline:
+    """Executor stand-in for a single worker: runs each call at submit time, no processes."""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _executor(workers):
+    """
+    Returns: the executor for one search. The process pool is spawned on first use and
+    reused by later searches. Inside a pool worker (a job or backtest process) candidates
+    always run inline: that process already has its share of the cores, and its children
+    would multiply the pool.
+    """
+    global _pool, _pool_workers
+    if workers <= 1 or multiprocessing.parent_process() is not None:
+        return _Inline()
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            else:
+                atexit.register(shutdown)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown():
+    """Stop the search pool (registered with atexit once it exists)."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+        _pool, _pool_workers = None, 0
+
+
+def search_order(series, max_p=5, max_q=2, max_d=2, max_iters=50, workers=1, max_rows=None):
+    """
+    Pick (p, d, q) by AIC over p <= max_p, q <= max_q for the last `max_rows` values of
+    `series` (all when None). Every candidate runs to convergence or max_iters optimizer
+    iterations (statsmodels' default).
+    Returns: {'order', 'aic', 'ranked': [[p, d, q, aic]], 'failed', 'elapsed_s'}
+    Raises: ValueError when no candidate could be fitted
+    """
+    t0 = time.perf_counter()
+    y = np.asarray(series, dtype=np.float64)
+    if max_rows:
+        y = y[-max_rows:]
+    d = choose_d(y, max_d)
+    diffed = np.diff(y, n=d) if d else y
+    trend = 'c' if d == 0 else 'n'  # ARIMA's own default for the levels model
+    # largest first, so the slowest fits do not start last and leave the other workers idle
+    grid = sorted(((p, q) for p in range(max_p + 1) for q in range(max_q + 1)), key=lambda pq: (-sum(pq), pq))
+
+    executor = _executor(workers)
+    futures = [executor.submit(fit_candidate, diffed, p, q, trend, max_iters) for p, q in grid]
+    outcomes = {'finished': [], 'failed': []}
+    for future in futures:
+        out = future.result()
+        outcomes[out['status']].append([out['p'], d, out['q'], None if out['aic'] is None else round(out['aic'], 3)])
+    if not outcomes['finished']:
+        raise ValueError(f"no ARIMA candidate could be fitted ({len(outcomes['failed'])} failed)")
+    ranked = sorted(outcomes['finished'], key=lambda row: row[3])
+    p, _, q, aic = ranked[0]
+    return {'order': (p, d, q), 'aic': aic, 'ranked': ranked,
+            'failed': [row[:3] for row in outcomes['failed']], 'elapsed_s': round(time.perf_counter() - t0, 3)}
+
+
+class ArimaOrderCache:
+    """
+    symbol -> chosen order, in one JSON file shared by every process (writes are serialised
+    with a lock file and replace the file atomically). Entries expire after `max_age`
+    seconds or when the search grid changes.
+    """
+
+    def __init__(self, path, max_age=30 * 86400):
+        self.path = path
+        self.max_age = max_age
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, symbol, grid):
+        record = self._read().get(symbol)
+        if record is None or record['grid'] != list(grid) or time.time() - record['chosen_at'] > self.max_age:
+            return None
+        return tuple(record['order'])
+
+    def put(self, symbol, grid, result):
+        with open(self.path + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            records = self._read()
+            records[symbol] = {'order': list(result['order']), 'aic': result['aic'], 'grid': list(grid),
+                               'ranked': result['ranked'][:5], 'search_s': result['elapsed_s'],
+                               'chosen_at': time.time()}
+            tmp = f"{self.path}.tmp-{os.getpid()}"
+            with open(tmp, 'w') as f:
+                json.dump(records, f)
+            os.replace(tmp, self.path)
+
+    def entries(self):
+        return self._read()
+
+
+def select_order(series, symbol=None, cache=None, max_p=5, max_q=2, max_d=2, **search):
+    """
+    The cached order for `symbol`, or search_order() over `series` (cached when a symbol
+    and cache are given). Returns: ((p, d, q), 'cache' | 'search')
+    """
+    grid = (max_p, max_d, max_q)
+    if cache is not None and symbol:
+        order = cache.get(symbol, grid)
+        if order is not None:
+            return order, 'cache'
+    result = search_order(series, max_p=max_p, max_q=max_q, max_d=max_d, **search)
+    print(f"[ARIMA] order {result['order']} for {symbol or 'series'} in {result['elapsed_s']}s "
+          f"({len(result['ranked'])} fitted, {len(result['failed'])} failed)")
+    if cache is not None and symbol:
+        cache.put(symbol, grid, result)
+    return result['order'], 'search'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pick an ARIMA order for a price series by AIC')
+    parser.add_argument('--csv', required=True, help='history CSV (date column first, with a Close column)')
+    parser.add_argument('--max-p', type=int, default=5)
+    parser.add_argument('--max-q', type=int, default=2)
+    parser.add_argument('--max-d', type=int, default=2)
+    parser.add_argument('--rows', type=int, help='search on the last N rows only')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    series = pd.read_csv(args.csv, index_col=0, parse_dates=True)['Close'].dropna()
+    result = search_order(series, max_p=args.max_p, max_q=args.max_q, max_d=args.max_d, workers=args.workers,
+                          max_rows=args.rows)
+    print(json.dumps(dict(result, order=list(result['order'])), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,305 @@
+# backtest.py
+# Walk-forward backtesting of the ARIMA/LSTM/meta pipeline. Folds (expanding or sliding
+# training windows, each followed by a `horizon`-bar test window) run in a process pool,
+# finished folds are checkpointed to disk so an interrupted run resumes where it stopped,
+# and metrics for all folds are computed at once on (folds, horizon) arrays.
+#
+# Usage: python backtest.py --symbol RELIANCE-EQ [--folds 10] [--horizon 7] [--scheme expanding|sliding]
+#            [--window 750] [--step 7] [--workers 2] [--mode fast] [--meta-learner ridge]
+#            [--csv history.csv] [--out report.json]
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from meta_learners import learner_params
+from model_registry import data_fingerprint
+
+MODELS = ('meta', 'arima', 'lstm')
+SCHEMES = ('expanding', 'sliding')
+PARAM_KEYS = ('n_test', 'time_step', 'lstm_units', 'arima_order', 'pipeline_mode', 'meta_learner')
+
+
+def fold_schedule(n_rows, horizon, folds, step=None, scheme='expanding', window=None, min_train=200):
+    """
+    Walk-forward folds ending at the last bar, oldest first.
+    Returns: list of (train_start, train_end) row offsets; fold i tests rows [train_end, train_end + horizon)
+    """
+    if scheme not in SCHEMES:
+        raise ValueError(f"scheme must be one of {SCHEMES}")
+    if scheme == 'sliding' and not window:
+        raise ValueError("a sliding schedule needs a window length")
+    step = step or horizon
+    schedule = []
+    for k in range(folds):
+        train_end = n_rows - horizon - (folds - 1 - k) * step
+        train_start = 0 if scheme == 'expanding' else max(0, train_end - window)
+        if train_end - train_start < min_train:
+            raise ValueError(f"fold {k} would train on {max(0, train_end - train_start)} rows (need {min_train}); "
+                             "use fewer folds, a smaller step or more history")
+        schedule.append((train_start, train_end))
+    return schedule
+
+
+def fold_metrics(actual, pred):
+    """
+    Vectorized metrics over aligned (folds, horizon) arrays; each returned array has one
+    value per fold. Same definitions as rmse/mean_absolute_error/r2_score/accuracy_from_mape.
+    """
+    actual = np.asarray(actual, dtype=float)
+    err = np.asarray(pred, dtype=float) - actual
+    ss_res = np.sum(err ** 2, axis=1)
+    ss_tot = np.sum((actual - actual.mean(axis=1, keepdims=True)) ** 2, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r2 = np.where(ss_tot > 0, 1.0 - ss_res / ss_tot, np.nan)
+    mape = np.mean(np.abs(err / (actual + 1e-8)), axis=1) * 100.0
+    return {
+        'rmse': np.sqrt(ss_res / actual.shape[1]),
+        'mae': np.mean(np.abs(err), axis=1),
+        'r2': r2,
+        'accuracy_pct': np.maximum(0.0, 100.0 - mape)
+    }
+
+
+def _summary(values):
+    values = np.asarray(values, dtype=float)
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        return {'mean': None, 'std': None, 'median': None}
+    return {'mean': float(finite.mean()), 'std': float(finite.std()), 'median': float(np.median(finite))}
+
+
+def run_fold(train, horizon, params):
+    """Entry point executed inside a pool worker: forecast `horizon` bars after `train`."""
+    import stock_forecast_api as api
+    result = api.train_and_forecast(train, days=horizon, **params)
+    return {name: [p['value'] for p in result[name]['predictions']] for name in MODELS}
+
+
+class Backtest:
+    """
+    One walk-forward run over `df`. Its id is derived from the data and the configuration,
+    so re-running the same backtest finds (and skips) the folds already on disk.
+    """
+
+    def __init__(self, symbol, df, horizon=7, folds=10, scheme='expanding', window=None, step=None,
+                 params=None, root='data/backtests'):
+        self.symbol = symbol
+        self.df = df
+        self.horizon = int(horizon)
+        self.params = {k: v for k, v in (params or {}).items() if k in PARAM_KEYS and v is not None}
+        if self.params.get('arima_order') not in (None, 'auto'):
+            self.params['arima_order'] = tuple(self.params['arima_order'])
+        min_train = self.params.get('time_step', 60) + self.params.get('n_test', 100) + 40
+        self.schedule = fold_schedule(len(df), self.horizon, int(folds), step=step, scheme=scheme, window=window,
+                                      min_train=min_train)
+        self.config = {
+            'symbol': symbol, 'horizon': self.horizon, 'folds': int(folds), 'scheme': scheme, 'window': window,
+            'step': step or self.horizon, 'params': {k: list(v) if isinstance(v, tuple) else v
+                                                     for k, v in sorted(self.params.items())},
+            'data': {'rows': len(df), 'start': df.index[0].isoformat(), 'end': df.index[-1].isoformat(),
+                     'fingerprint': data_fingerprint(df)}
+        }
+        self.run_id = hashlib.sha1(json.dumps(self.config, sort_keys=True).encode()).hexdigest()[:16]
+        self.dir = os.path.join(root, self.run_id)
+        self._lock = threading.Lock()
+
+    @property
+    def checkpoint_path(self):
+        return os.path.join(self.dir, 'folds.jsonl')
+
+    def completed(self):
+        return load_folds(self.dir)
+
+    def _write_config(self):
+        os.makedirs(self.dir, exist_ok=True)
+        config_path = os.path.join(self.dir, 'config.json')
+        if not os.path.exists(config_path):
+            with open(config_path, 'w') as f:
+                json.dump(dict(self.config, run_id=self.run_id), f, indent=2)
+
+    def _checkpoint(self, record):
+        with self._lock:
+            with open(self.checkpoint_path, 'ab+') as f:
+                # after a crash mid-write the file may end in a torn line: start on a fresh one
+                torn = False
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    torn = f.read(1) != b'\n'
+                f.write((b'\n' if torn else b'') + json.dumps(record).encode() + b'\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def run(self, submit, on_fold=None):
+        """
+        submit(fn, *args) -> concurrent.futures.Future; runs every fold not yet checkpointed.
+        on_fold(record or None, error or None) is called as each fold finishes.
+        Returns: report dict (see build_report)
+        """
+        self._write_config()
+        done = self.completed()
+        futures = {}
+        for i, (start, end) in enumerate(self.schedule):
+            if i in done:
+                continue
+            futures[submit(run_fold, self.df.iloc[start:end], self.horizon, self.params)] = (i, start, end)
+
+        errors = {}
+        for fut in as_completed(futures):
+            i, start, end = futures[fut]
+            try:
+                predictions = fut.result()
+            except Exception as e:
+                errors[i] = str(e)
+                print(f"[Backtest {self.run_id}] fold {i} failed: {e}")
+                if on_fold:
+                    on_fold(None, str(e))
+                continue
+            test = self.df.iloc[end:end + self.horizon]
+            record = {
+                'fold': i, 'train_start': start, 'train_end': end,
+                'train_range': [self.df.index[start].isoformat(), self.df.index[end - 1].isoformat()],
+                'test_dates': [d.strftime('%Y-%m-%d %H:%M') for d in test.index],
+                'actual': [float(v) for v in test['Close'].values],
+                'predictions': predictions
+            }
+            self._checkpoint(record)
+            if on_fold:
+                on_fold(record, None)
+        return build_report(self.config, self.completed(), errors, run_id=self.run_id)
+
+
+def load_folds(directory):
+    """{fold index: record} from a checkpoint; a torn last line (crash mid-write) is ignored."""
+    folds = {}
+    try:
+        with open(os.path.join(directory, 'folds.jsonl')) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                folds[record['fold']] = record
+    except FileNotFoundError:
+        pass
+    return folds
+
+
+def build_report(config, folds, errors=None, run_id=None):
+    records = [folds[i] for i in sorted(folds)]
+    report = {'run_id': run_id, 'config': config, 'folds_total': config['folds'], 'folds_done': len(records),
+              'failed_folds': errors or {}, 'models': {}, 'folds': []}
+    if not records:
+        return report
+    actual = np.array([r['actual'] for r in records])
+    for name in MODELS:
+        pred = np.array([r['predictions'][name] for r in records])
+        per_fold = fold_metrics(actual, pred)
+        pooled = fold_metrics(actual.reshape(1, -1), pred.reshape(1, -1))
+        report['models'][name] = {
+            metric: dict(_summary(values), pooled=_finite_or_none(pooled[metric][0]))
+            for metric, values in per_fold.items()
+        }
+        for record, *values in zip(records, *per_fold.values()):
+            record.setdefault('metrics', {})[name] = dict(zip(per_fold.keys(), map(_finite_or_none, values)))
+    report['folds'] = [{k: r[k] for k in ('fold', 'train_range', 'test_dates', 'metrics')} for r in records]
+    return report
+
+
+def _finite_or_none(x):
+    return float(x) if np.isfinite(x) else None
+
+
+def load_report(root, run_id):
+    """Report for a checkpointed run (finished or not), or None if the run is unknown."""
+    directory = os.path.join(root, run_id)
+    try:
+        with open(os.path.join(directory, 'config.json')) as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return None
+    config.pop('run_id', None)
+    return build_report(config, load_folds(directory), run_id=run_id)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Walk-forward backtest of the forecasting pipeline')
+    parser.add_argument('--symbol', default='RELIANCE-EQ')
+    parser.add_argument('--csv', help='history CSV (date column first, Close/Volume) instead of downloading')
+    parser.add_argument('--folds', type=int, default=10)
+    parser.add_argument('--horizon', type=int, default=7, help='bars forecast per fold')
+    parser.add_argument('--step', type=int, help='bars between fold origins (default: horizon)')
+    parser.add_argument('--scheme', choices=SCHEMES, default='expanding')
+    parser.add_argument('--window', type=int, help='training rows per fold for --scheme sliding')
+    parser.add_argument('--n-test', type=int)
+    parser.add_argument('--time-step', type=int)
+    parser.add_argument('--lstm-units', type=int)
+    parser.add_argument('--arima-order', type=int, nargs=3, help='fixed (p, d, q) (default: ARIMA_ORDER)')
+    parser.add_argument('--mode', dest='pipeline_mode', choices=['standard', 'fast'])
+    parser.add_argument('--meta-learner', choices=['nn', 'constrained_ls', 'ridge', 'inverse_error'])
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--dir', default=os.getenv('BACKTEST_DIR', os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'data', 'backtests')), help='checkpoint directory')
+    parser.add_argument('--restart', action='store_true', help='ignore folds checkpointed by an earlier run')
+    parser.add_argument('--out', help='write the JSON report here')
+    args = parser.parse_args(argv)
+
+    # imported here so `--help` does not pay for the API start-up
+    import pandas as pd
+    import stock_forecast_api as api
+    from forecast_jobs import worker_thread_counts, configure_worker_threads
+
+    if args.csv:
+        df = pd.read_csv(args.csv, index_col=0, parse_dates=True)[['Close', 'Volume']].dropna()
+    else:
+        df, _, _, err = api.load_history(args.symbol)
+        if err:
+            print(f"[backtest] {err[0]}", file=sys.stderr)
+            return 1
+    params = {'n_test': args.n_test, 'time_step': args.time_step, 'lstm_units': args.lstm_units,
+              'arima_order': args.arima_order or api.ARIMA_ORDER, 'pipeline_mode': args.pipeline_mode,
+              **learner_params(args.meta_learner)}
+    bt = Backtest(args.symbol, df, horizon=args.horizon, folds=args.folds, scheme=args.scheme, window=args.window,
+                  step=args.step, params=params, root=args.dir)
+    if args.restart and os.path.exists(bt.checkpoint_path):
+        os.remove(bt.checkpoint_path)
+    resumed = len(bt.completed())
+    print(f"[backtest] run {bt.run_id}: {args.folds} folds, {resumed} already done, {args.workers} workers",
+          file=sys.stderr)
+
+    started = time.time()
+    progress = {'done': resumed}
+
+    def on_fold(record, error):
+        progress['done'] += record is not None
+        print(f"[backtest] {progress['done']}/{args.folds} folds after {time.time() - started:.1f}s"
+              + (f" (fold failed: {error})" if error else ''), file=sys.stderr)
+
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=configure_worker_threads,
+                             initargs=worker_thread_counts(args.workers)) as pool:
+        report = bt.run(pool.submit, on_fold=on_fold)
+    api.forecast_jobs.shutdown()
+
+    for name, metrics in report['models'].items():
+        line = ', '.join(f"{m} {v['mean']:.3f}±{v['std']:.3f}" for m, v in metrics.items() if v['mean'] is not None)
+        print(f"[backtest] {name}: {line}", file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0 if report['folds_done'] == report['folds_total'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
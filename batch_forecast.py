@@ -0,0 +1,54 @@
+# batch_forecast.py
+# Command-line entry point for forecasting a list of symbols (defaults to every symbol
+# in STOCK_TOKENS), e.g. from an evening cron job. Writes one JSON object per symbol,
+# newline-delimited, as each symbol finishes.
+#
+# Usage: python batch_forecast.py [--symbols RELIANCE-EQ TCS-EQ] [--days 7] [--mode fast]
+#            [--meta-learner ridge] [--out results.ndjson]
+
+import sys
+import json
+import time
+import argparse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Forecast several symbols in parallel')
+    parser.add_argument('--symbols', nargs='+', help='symbols to forecast (default: all known symbols)')
+    parser.add_argument('--days', type=int, default=7, help='forecast horizon in business days')
+    parser.add_argument('--totp', help='Angel One TOTP (otherwise generated from ANGEL_TOTP_SECRET)')
+    parser.add_argument('--mode', choices=['standard', 'fast'], help='pipeline mode (default: PIPELINE_MODE)')
+    parser.add_argument('--meta-learner', help='stacking learner (default: META_LEARNER)')
+    parser.add_argument('--out', help='write NDJSON results to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    # imported here so `--help` does not pay for TensorFlow start-up
+    import stock_forecast_api as api
+
+    meta_learner, err = api.parse_meta_learner(args.meta_learner)
+    if err:
+        parser.error(err)
+    symbols = args.symbols or list(api.STOCK_TOKENS.keys())
+    out = open(args.out, 'w') if args.out else sys.stdout
+    started = time.time()
+    failures = 0
+    try:
+        for item in api.iter_batch_forecast(symbols, days=args.days, totp=args.totp, pipeline_mode=args.mode,
+                                            meta_learner=meta_learner):
+            if not item.get('success'):
+                failures += 1
+            out.write(json.dumps(item) + '\n')
+            out.flush()
+            status = 'ok' if item.get('success') else f"failed ({item.get('stage')}): {item.get('error')}"
+            print(f"[batch] {item['symbol']}: {status} after {time.time() - started:.1f}s", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        api.forecast_jobs.shutdown()
+    print(f"[batch] {len(symbols) - failures}/{len(symbols)} symbols forecast in {time.time() - started:.1f}s",
+          file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
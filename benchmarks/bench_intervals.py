@@ -0,0 +1,106 @@
+# benchmarks/bench_intervals.py
+# Cost of forecast intervals (forecast_intervals.py) next to a point forecast. Trains a
+# small LSTM and meta learner on synthetic data, then times forecast_from_state with and
+# without p10/p50/p90 bands, and the LSTM sampler (NumpyLSTM.sample_paths) against a naive
+# rollout of the window tiled `--paths` times. Also checks that noise-free sampled paths
+# equal the point forecast.
+#
+# Usage: python benchmarks/bench_intervals.py [--rows 1500] [--days 30] [--paths 500]
+#            [--epochs 2] [--json results.json]
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('WARMUP_ON_START', '0')
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+os.environ['MODEL_REGISTRY_DIR'] = ''
+
+from bench_pipeline import synthetic_ohlcv
+
+
+def best_of(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time forecast intervals against a point forecast')
+    parser.add_argument('--rows', type=int, default=1500)
+    parser.add_argument('--days', type=int, default=30, help='forecast horizon')
+    parser.add_argument('--paths', type=int, default=500, help='simulated paths per model')
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    import stock_forecast_api as api
+    from sklearn.preprocessing import MinMaxScaler
+    from forecast_engine import rollout_scaled
+    from meta_learners import make_learner
+    from numpy_runtime import NumpyLSTM
+
+    df = synthetic_ohlcv(args.rows)
+    time_step = api.FORECAST_PARAMS['time_step']
+    feature_scaler = MinMaxScaler().fit(df[['Close', 'Volume']])
+    target_scaler = MinMaxScaler().fit(df[['Close']].values)
+    features = feature_scaler.transform(df[['Close', 'Volume']])
+    X, y = api.build_sequences(features, target_scaler.transform(df[['Close']].values), time_step)
+    lstm = api.train_lstm_model(X, y, epochs=args.epochs)
+    arima = api.fit_arima(df['Close'])
+
+    fitted = target_scaler.inverse_transform(lstm.predict(X[-100:], verbose=0)).ravel()
+    actual = df['Close'].values[-100:]
+    meta_X = np.column_stack((actual * 1.01, fitted))
+    meta = make_learner('ridge').fit(meta_X[:80], actual[:80], meta_X[80:], actual[80:])
+    metrics = {name: {'rmse': api.rmse(actual, fitted)} for name in ('meta', 'arima', 'lstm')}
+    state = {'lstm_model': lstm, 'meta_model': meta, 'arima_model': arima, 'feature_scaler': feature_scaler,
+             'target_scaler': target_scaler, 'time_step': time_step, 'metrics': metrics,
+             'lstm_residuals': (actual - fitted).tolist()}
+
+    window = features[-time_step:]
+    sampler = NumpyLSTM.from_keras(lstm)
+    point = rollout_scaled(lstm, window[None, ...], args.days)
+    check = float(np.max(np.abs(sampler.sample_paths(window, args.days, 4) - point)))
+
+    noise = np.random.default_rng(0).normal(0, 0.01, (args.paths, args.days)).astype(np.float32)
+    tiled = np.repeat(window[None, ...], args.paths, axis=0)
+    iv = {'paths': args.paths, 'method': 'bootstrap'}
+    timings = {
+        'point_forecast_ms': best_of(lambda: api.forecast_from_state(state, df, args.days)) * 1000,
+        'forecast_with_intervals_ms': best_of(lambda: api.forecast_from_state(state, df, args.days, intervals=iv)) * 1000,
+        'mc_dropout_intervals_ms': best_of(lambda: api.forecast_from_state(
+            state, df, args.days, intervals=dict(iv, method='mc_dropout'))) * 1000,
+        'lstm_point_rollout_ms': best_of(lambda: rollout_scaled(lstm, window[None, ...], args.days)) * 1000,
+        'lstm_sample_paths_ms': best_of(lambda: sampler.sample_paths(window, args.days, args.paths, noise=noise)) * 1000,
+        'lstm_tiled_rollout_ms': best_of(lambda: rollout_scaled(sampler, tiled, args.days), repeat=2) * 1000,
+    }
+
+    print(f"{args.paths} paths x {args.days} days, time_step {time_step}")
+    print(f"{'stage':<28} {'ms':>10}")
+    print('-' * 39)
+    for name, value in timings.items():
+        print(f"{name[:-3]:<28} {value:>10.1f}")
+    print(f"\nintervals / point forecast: {timings['forecast_with_intervals_ms'] / timings['point_forecast_ms']:.1f}x")
+    print(f"noise-free sampled paths vs point forecast: max diff {check:.2e}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'timings': timings, 'check': check, 'paths': args.paths, 'days': args.days}, f, indent=2)
+    if check > 1e-5:
+        print("\nFAIL: sampled paths do not reproduce the point forecast")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
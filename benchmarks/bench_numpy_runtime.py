@@ -0,0 +1,143 @@
+# benchmarks/bench_numpy_runtime.py
+# Parity and cost check of the TensorFlow-free runtime (numpy_runtime.py). Trains a small
+# LSTM and meta NN on synthetic data, exports them to runtime.npz and compares the NumPy
+# forward passes with Keras: recursive forecasts (scaled and price units, single window
+# and a batch), meta predictions and scaler round-trips. Then loads the export in a fresh
+# interpreter and reports load + forecast time, peak RSS and whether TensorFlow was
+# imported. Fails when any scaled difference exceeds --tol.
+#
+# Usage: python benchmarks/bench_numpy_runtime.py [--rows 1500] [--steps 30] [--batch 64]
+#            [--epochs 2] [--tol 1e-5] [--json results.json]
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('WARMUP_ON_START', '0')
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+os.environ['MODEL_REGISTRY_DIR'] = ''
+
+from bench_pipeline import synthetic_ohlcv
+
+COLD_SNIPPET = """
+import sys, time
+sys.path.insert(0, {root!r})
+t0 = time.perf_counter()
+import numpy as np
+from numpy_runtime import load_runtime
+from forecast_engine import batched_recursive_forecast
+runtime = load_runtime({directory!r})
+window = runtime['feature_scaler'].transform(np.load({window!r}))
+batched_recursive_forecast(runtime['lstm_model'], window[None, ...], {steps}, runtime['target_scaler'])
+elapsed = time.perf_counter() - t0
+# VmHWM starts over at exec (ru_maxrss would include the forked parent)
+peak_kb = next(int(line.split()[1]) for line in open('/proc/self/status') if line.startswith('VmHWM'))
+print(elapsed, peak_kb / 1024, int('tensorflow' in sys.modules))
+"""
+
+
+def best_of(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the NumPy inference runtime against Keras')
+    parser.add_argument('--rows', type=int, default=1500)
+    parser.add_argument('--steps', type=int, default=30, help='forecast horizon')
+    parser.add_argument('--batch', type=int, default=64, help='windows in the batched comparison')
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--tol', type=float, default=1e-5, help='max abs difference in scaled units')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    import stock_forecast_api as api
+    from sklearn.preprocessing import MinMaxScaler
+    from forecast_engine import rollout_scaled
+    from numpy_runtime import export_runtime, load_runtime
+
+    df = synthetic_ohlcv(args.rows)
+    time_step = api.FORECAST_PARAMS['time_step']
+    feature_scaler = MinMaxScaler().fit(df[['Close', 'Volume']])
+    target_scaler = MinMaxScaler().fit(df[['Close']].values)
+    features = feature_scaler.transform(df[['Close', 'Volume']])
+    X, y = api.build_sequences(features, target_scaler.transform(df[['Close']].values), time_step)
+    lstm = api.train_lstm_model(X, y, epochs=args.epochs)
+
+    rng = np.random.default_rng(0)
+    meta_X = df['Close'].values[-200:, None] * (1 + rng.normal(0, 0.01, (200, 2)))
+    meta_y = df['Close'].values[-200:]
+    meta = api.train_meta_nn(meta_X[:150], meta_y[:150], meta_X[150:], meta_y[150:], epochs=20)
+
+    state = {'lstm_model': lstm, 'meta_model': meta, 'feature_scaler': feature_scaler,
+             'target_scaler': target_scaler, 'time_step': time_step}
+    directory = tempfile.mkdtemp(prefix='numpy-runtime-')
+    path = export_runtime(state, directory)
+    runtime = load_runtime(directory)
+
+    windows = np.stack([features[i - time_step:i] for i in
+                        np.linspace(time_step, len(features), args.batch).astype(int)])
+    checks = {}
+    scaled_keras = rollout_scaled(lstm, windows[-1:], args.steps)
+    scaled_numpy = rollout_scaled(runtime['lstm_model'], windows[-1:], args.steps)
+    checks['forecast_scaled'] = float(np.max(np.abs(scaled_keras - scaled_numpy)))
+    price_keras = target_scaler.inverse_transform(scaled_keras.reshape(-1, 1))
+    price_numpy = runtime['target_scaler'].inverse_transform(scaled_numpy.reshape(-1, 1))
+    checks['forecast_price_rel'] = float(np.max(np.abs(price_keras - price_numpy) / np.abs(price_keras)))
+    checks['batch_scaled'] = float(np.max(np.abs(rollout_scaled(lstm, windows, args.steps)
+                                              - rollout_scaled(runtime['lstm_model'], windows, args.steps))))
+    keras_meta = np.asarray(meta(meta_X.astype(np.float32), training=False)).ravel()
+    checks['meta_rel'] = float(np.max(np.abs(keras_meta - runtime['meta_model'].predict(meta_X)) / np.abs(keras_meta)))
+    checks['scaler'] = float(np.max(np.abs(runtime['feature_scaler'].transform(df[['Close', 'Volume']]) - features)))
+
+    timings = {
+        'keras_rollout_ms': best_of(lambda: rollout_scaled(lstm, windows, args.steps)) * 1000,
+        'numpy_rollout_ms': best_of(lambda: rollout_scaled(runtime['lstm_model'], windows, args.steps)) * 1000,
+    }
+
+    window_path = os.path.join(directory, 'window.npy')
+    np.save(window_path, df[['Close', 'Volume']].values[-time_step:])
+    snippet = COLD_SNIPPET.format(root=ROOT, directory=directory, window=window_path, steps=args.steps)
+    out = subprocess.run([sys.executable, '-c', snippet], capture_output=True, text=True, cwd=ROOT)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr else 'cold run failed')
+    cold_s, cold_rss, cold_tf = out.stdout.split()
+    cold = {'load_and_forecast_s': float(cold_s), 'peak_rss_mb': float(cold_rss), 'imported_tensorflow': bool(int(cold_tf))}
+
+    print(f"{'check':<22} {'max diff':>12}")
+    print('-' * 35)
+    for name, value in checks.items():
+        print(f"{name:<22} {value:>12.2e}")
+    print(f"\nruntime.npz: {os.path.getsize(path) / 1024:.1f} KB")
+    print(f"rollout of {args.batch} windows x {args.steps} steps: keras {timings['keras_rollout_ms']:.1f} ms, "
+          f"numpy {timings['numpy_rollout_ms']:.1f} ms")
+    print(f"cold load + forecast in a fresh interpreter: {cold['load_and_forecast_s']:.2f} s, "
+          f"peak RSS {cold['peak_rss_mb']:.0f} MB, tensorflow imported: {cold['imported_tensorflow']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'checks': checks, 'timings': timings, 'cold': cold, 'tol': args.tol}, f, indent=2)
+
+    failed = [name for name in ('forecast_scaled', 'batch_scaled', 'scaler') if checks[name] > args.tol]
+    failed += [name for name in ('forecast_price_rel', 'meta_rel') if checks[name] > args.tol]
+    if failed or cold['imported_tensorflow']:
+        print(f"\nFAIL: {failed or ['tensorflow imported']} above tolerance {args.tol}")
+        sys.exit(1)
+    print(f"\nOK: all differences within {args.tol}")
+
+
+if __name__ == '__main__':
+    main()
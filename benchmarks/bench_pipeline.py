@@ -0,0 +1,373 @@
+# benchmarks/bench_pipeline.py
+# Stage-by-stage benchmark of the forecasting pipeline on synthetic OHLCV data (no network).
+# Times scaling, build_sequences, ARIMA, LSTM training, recursive forecast, meta NN and JSON
+# serialization (v1 and the compact v2 format) for each dataset size, then the Flask endpoints
+# end to end through the test client with load_history stubbed. Wall time, CPU time and peak
+# RSS per stage go to a JSON file; with --baseline the run fails when a stage is slower than
+# the baseline by more than --threshold.
+#
+# Usage: python benchmarks/bench_pipeline.py [--rows 1000 10000] [--intraday-rows 10000]
+#            [--epochs 5] [--repeat 1] [--out results.json]
+#            [--baseline baseline.json --threshold 0.2] [--save-baseline baseline.json]
+#            [--stages arima lstm] [--skip-endpoints]
+#            [--compare-modes --mode-rows 1500 --origins 2 --data-csv history.csv]
+#
+# --compare-modes runs the whole pipeline in 'standard' and 'fast' mode from one or more
+# forecast origins and reports CPU time next to out-of-sample error on the bars that follow.
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import warnings
+import tempfile
+import threading
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# keep the API quiet and self-contained: no warm-up thread, a throwaway model registry
+os.environ.setdefault('WARMUP_ON_START', '0')
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+os.environ['MODEL_REGISTRY_DIR'] = tempfile.mkdtemp(prefix='bench-registry-')
+
+STAGES = ['scaling', 'build_sequences', 'arima', 'lstm', 'forecast', 'meta', 'json']
+BARS_PER_SESSION = 75  # 5-minute bars in a 09:15-15:30 NSE session
+
+
+def synthetic_ohlcv(rows, intraday=False, seed=42):
+    """Geometric random walk with OHLCV columns, on business days or 5-minute session bars."""
+    rng = np.random.default_rng(seed)
+    if intraday:
+        days = pd.bdate_range('2015-01-01', periods=rows // BARS_PER_SESSION + 1)
+        offsets = pd.to_timedelta(555 + 5 * np.arange(BARS_PER_SESSION), unit='min')  # 09:15 + 5 min steps
+        index = (days.values[:, None] + offsets.values[None, :]).ravel()[:rows]
+        vol = 0.002
+    else:
+        index = pd.bdate_range('1990-01-01', periods=rows)
+        vol = 0.015
+    close = 1000.0 * np.exp(np.cumsum(rng.normal(0.0002, vol, rows)))
+    spread = close * rng.uniform(0.0, vol, rows)
+    return pd.DataFrame({
+        'Open': close + rng.normal(0, 1, rows) * spread / 2,
+        'High': close + spread,
+        'Low': close - spread,
+        'Close': close,
+        'Volume': rng.integers(100_000, 5_000_000, rows).astype(float)
+    }, index=pd.DatetimeIndex(index))
+
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Linux reports KiB
+
+
+class Stage:
+    """Context manager recording wall time, process CPU time and peak RSS (sampled every 5 ms)."""
+
+    def __init__(self):
+        self.result = None
+
+    def _sample(self):
+        while not self._stop.wait(0.005):
+            self._peak = max(self._peak, _rss_bytes())
+
+    def __enter__(self):
+        self._peak = _rss_bytes()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        self._stop.set()
+        self._sampler.join()
+        self.result = {'wall_s': wall, 'cpu_s': cpu, 'peak_rss_mb': max(self._peak, _rss_bytes()) / 1e6}
+        return False
+
+
+def run_stages(api, df, args):
+    """One pass over the pipeline stages, mirroring fit_pipeline/forecast_from_state."""
+    from sklearn.preprocessing import MinMaxScaler
+    api.ensure_tf()
+    out = {}
+    time_step, n_test, days = args.time_step, args.n_test, args.days
+    selected = set(args.stages)
+
+    with Stage() as s:
+        feature_scaler = MinMaxScaler().fit(df[['Close', 'Volume']].iloc[:-n_test])
+        target_scaler = MinMaxScaler().fit(df[['Close']].values[:-n_test].reshape(-1, 1))
+        features_scaled = feature_scaler.transform(df[['Close', 'Volume']])
+        target_scaled = target_scaler.transform(df[['Close']].values.reshape(-1, 1))
+    out['scaling'] = s.result
+
+    with Stage() as s:
+        X_all, y_all = api.build_sequences(features_scaled, target_scaled, time_step)
+    out['build_sequences'] = s.result
+    X_train, y_train = X_all[:-n_test], y_all[:-n_test]
+
+    arima_test = np.full(n_test, df['Close'].iloc[-n_test - 1])
+    if 'arima' in selected:
+        with Stage() as s:
+            _, forecast = api.train_arima_on_series(df['Close'].iloc[:-n_test], steps=n_test, order=(5, 1, 0))
+        out['arima'] = s.result
+        if forecast is not None:
+            arima_test = np.asarray(forecast)
+
+    model = None
+    if 'lstm' in selected:
+        with Stage() as s:
+            model = api.train_lstm_model(X_train, y_train, lstm_units=args.lstm_units, epochs=args.epochs)
+        out['lstm'] = s.result
+
+    lstm_test = df['Close'].values[-n_test:] * 1.001
+    future_lstm = np.full(days, df['Close'].iloc[-1])
+    if model is not None and 'forecast' in selected:
+        with Stage() as s:
+            future_lstm = api.recursive_lstm_forecast(model, features_scaled[-time_step:], days, target_scaler)
+        out['forecast'] = s.result
+
+    meta_model = None
+    if 'meta' in selected:
+        meta_X = np.column_stack((arima_test, lstm_test))
+        meta_y = df['Close'].values[-n_test:]
+        split = int(n_test * 0.8)
+        with Stage() as s:
+            meta_model = api.train_meta_nn(meta_X[:split], meta_y[:split], meta_X[split:], meta_y[split:])
+        out['meta'] = s.result
+        # every stacking learner on the same rows: fit time and held-out error
+        from meta_learners import META_LEARNERS
+        for name, cls in META_LEARNERS.items():
+            with Stage() as s:
+                learner = cls().fit(meta_X[:split], meta_y[:split], meta_X[split:], meta_y[split:])
+            pred = learner.predict(meta_X[split:])
+            out[f'meta_{name}'] = dict(s.result, rmse=api.rmse(meta_y[split:], pred),
+                                       accuracy_pct=api.accuracy_from_mape(meta_y[split:], pred))
+
+    if 'json' in selected:
+        dates = api.future_business_dates(df, days)
+        meta_future = meta_model.predict(np.column_stack((np.full(days, df['Close'].iloc[-1]), future_lstm)),
+                                         verbose=0).flatten() if meta_model is not None else future_lstm
+        metrics = {'rmse': 1.0, 'mae': 1.0, 'r2': 0.5, 'accuracy_pct': 99.0}
+        historical = [{'date': i.strftime('%Y-%m-%d'), 'value': float(v)} for i, v in df['Close'].tail(60).items()]
+        with Stage() as s:
+            response = dict(api.forecast_context(df, 'synthetic', None), results={
+                name: {'predictions': api.format_predictions(dates, values), 'metrics': metrics,
+                       'historical': historical}
+                for name, values in (('meta', meta_future), ('arima', arima_test[:days]), ('lstm', future_lstm))
+            })
+            payload = json.dumps(response)
+        out['json'] = dict(s.result, bytes=len(payload))
+        from response_format import encode as encode_response
+        with Stage() as s:
+            payload = encode_response(response, 'v2+json', api.RESPONSE_PRECISION)[0]  # ?format=v2
+        out['json_v2'] = dict(s.result, bytes=len(payload))
+    return out
+
+
+def best_of(runs):
+    """Per stage, keep the run with the lowest wall time (least disturbed by noise)."""
+    return {stage: min((r[stage] for r in runs if stage in r), key=lambda m: m['wall_s'])
+            for stage in runs[0]}
+
+
+def run_endpoints(api, df, days):
+    api.load_history = lambda symbol, totp=None, connector=None: (df, 'synthetic', None, None)
+    client = api.app.test_client()
+    body = {'symbol': 'BENCH-EQ', 'forecast_days': days}
+    out = {}
+
+    def timed(name, fn):
+        with Stage() as s:
+            status = fn()
+        out[name] = dict(s.result, status=status)
+
+    timed('GET /health', lambda: client.get('/health').status_code)
+    timed('GET /api/stocks', lambda: client.get('/api/stocks').status_code)
+    timed('POST /api/forecast-mock', lambda: client.post('/api/forecast-mock', json=body).status_code)
+    timed('POST /api/forecast (train)', lambda: client.post('/api/forecast', json=body).status_code)
+    timed('POST /api/forecast (registry hit)', lambda: client.post('/api/forecast', json=body).status_code)
+
+    # the stream always trains (it reports every stage), so also record when the first forecast arrives
+    first = {}
+
+    def stream():
+        t0 = time.perf_counter()
+        resp = client.get(f'/api/forecast/stream?symbol=BENCH-EQ&days={days}', buffered=False)
+        for chunk in resp.response:
+            text = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if text.startswith('event: arima_forecast'):
+                first['arima_forecast_s'] = time.perf_counter() - t0
+        return resp.status_code
+    timed('GET /api/forecast/stream', stream)
+    out['GET /api/forecast/stream'].update(first)
+    return out
+
+
+def load_csv(path):
+    """History exported with a date column first and Close/Volume columns (e.g. a yfinance CSV)."""
+    df = pd.read_csv(path, index_col=0, parse_dates=True)
+    return df[['Close', 'Volume']].apply(pd.to_numeric, errors='coerce').dropna()
+
+
+def compare_modes(api, df, horizon, origins):
+    """
+    For each origin, fit on the bars before it and forecast `horizon` bars; error is measured
+    against the actual bars. Returns {mode: {wall_s, cpu_s, peak_rss_mb, rmse: {...}, mape_pct: {...}}}.
+    """
+    import tensorflow as tf
+    out = {}
+    for mode in api.PIPELINE_MODES:
+        runs, errors = [], {name: [] for name in ('meta', 'arima', 'lstm')}
+        for k in range(origins, 0, -1):
+            cut = len(df) - k * horizon
+            train, actual = df.iloc[:cut], df['Close'].values[cut:cut + horizon]
+            tf.keras.utils.set_random_seed(api.SEED)  # same initialisation for both modes
+            with Stage() as s:
+                result = api.train_and_forecast(train, days=horizon, pipeline_mode=mode)
+            runs.append(s.result)
+            for name in errors:
+                pred = np.array([p['value'] for p in result[name]['predictions']])
+                errors[name].append(pred - actual)
+        err = {name: np.concatenate(e) for name, e in errors.items()}
+        actual_all = np.concatenate([df['Close'].values[len(df) - k * horizon:][:horizon] for k in range(origins, 0, -1)])
+        out[mode] = {
+            'wall_s': sum(r['wall_s'] for r in runs),
+            'cpu_s': sum(r['cpu_s'] for r in runs),
+            'peak_rss_mb': max(r['peak_rss_mb'] for r in runs),
+            'rmse': {name: float(np.sqrt(np.mean(e ** 2))) for name, e in err.items()},
+            'mape_pct': {name: float(np.mean(np.abs(e / actual_all)) * 100) for name, e in err.items()}
+        }
+    return out
+
+
+def compare(results, baseline, threshold, min_delta):
+    """Returns a list of (case, stage, baseline_s, current_s) that regressed."""
+    regressions = []
+    for case, stages in results['cases'].items():
+        for stage, m in stages.items():
+            ref = baseline.get('cases', {}).get(case, {}).get(stage)
+            if ref and m['wall_s'] > ref['wall_s'] * (1 + threshold) and m['wall_s'] - ref['wall_s'] > min_delta:
+                regressions.append((case, stage, ref['wall_s'], m['wall_s']))
+    for name, m in results.get('endpoints', {}).items():
+        ref = baseline.get('endpoints', {}).get(name)
+        if ref and m['wall_s'] > ref['wall_s'] * (1 + threshold) and m['wall_s'] - ref['wall_s'] > min_delta:
+            regressions.append(('endpoints', name, ref['wall_s'], m['wall_s']))
+    return regressions
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=ROOT).stdout.strip() or None
+    except OSError:
+        commit = None
+    import tensorflow as tf
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'pandas': pd.__version__, 'tensorflow': tf.__version__, 'cpu_count': os.cpu_count(),
+            'machine': platform.machine(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the forecasting pipeline stage by stage')
+    parser.add_argument('--rows', type=int, nargs='*', default=[1000, 10_000], help='daily dataset sizes')
+    parser.add_argument('--intraday-rows', type=int, nargs='*', default=[10_000], help='5-minute dataset sizes')
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES,
+                        help='stages to run (scaling, build_sequences and json always run)')
+    parser.add_argument('--epochs', type=int, default=5, help='LSTM epochs (the API uses up to 100)')
+    parser.add_argument('--lstm-units', type=int, default=64)
+    parser.add_argument('--time-step', type=int, default=60)
+    parser.add_argument('--n-test', type=int, default=100)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--repeat', type=int, default=1, help='runs per case; the fastest is kept per stage')
+    parser.add_argument('--skip-endpoints', action='store_true')
+    parser.add_argument('--endpoint-rows', type=int, default=1000)
+    parser.add_argument('--compare-modes', action='store_true', help='compare standard and fast pipeline modes')
+    parser.add_argument('--mode-rows', type=int, default=1500, help='daily rows for --compare-modes')
+    parser.add_argument('--origins', type=int, default=1, help='forecast origins per mode for --compare-modes')
+    parser.add_argument('--data-csv', help='use this history instead of synthetic data for --compare-modes')
+    parser.add_argument('--out', default='bench_pipeline_results.json')
+    parser.add_argument('--baseline', help='results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown per stage')
+    parser.add_argument('--min-delta', type=float, default=0.05, help='ignore slowdowns smaller than this (s)')
+    parser.add_argument('--save-baseline', help='also write the results here as the new baseline')
+    args = parser.parse_args()
+    args.stages = sorted(set(args.stages) | {'scaling', 'build_sequences', 'json'}, key=STAGES.index)
+
+    warnings.filterwarnings('ignore')  # statsmodels frequency warnings on synthetic indexes
+    import stock_forecast_api as api
+    api.ensure_tf()
+
+    results = {'environment': environment(), 'config': vars(args), 'cases': {}, 'endpoints': {}}
+    cases = [('daily', rows, False) for rows in args.rows] + [('intraday', rows, True) for rows in args.intraday_rows]
+    header = f"{'case':<16} " + ' '.join(f"{s:>15}" for s in STAGES) + f" {'peak MB':>9}"
+    print('wall seconds per stage')
+    print(header)
+    print('-' * len(header))
+    for kind, rows, intraday in cases:
+        df = synthetic_ohlcv(rows, intraday=intraday)
+        runs = [run_stages(api, df, args) for _ in range(args.repeat)]
+        stages = best_of(runs)
+        case = f"{kind}-{rows}"
+        results['cases'][case] = stages
+        peak = max(m['peak_rss_mb'] for m in stages.values())
+        cells = ' '.join(f"{stages[s]['wall_s']:>15.3f}" if s in stages else f"{'-':>15}" for s in STAGES)
+        print(f"{case:<16} {cells} {peak:>9.0f}")
+
+    if not args.skip_endpoints:
+        print()
+        print(f"{'endpoint':<36} {'wall s':>9} {'cpu s':>9} {'peak MB':>9} status")
+        results['endpoints'] = run_endpoints(api, synthetic_ohlcv(args.endpoint_rows), args.days)
+        for name, m in results['endpoints'].items():
+            extra = f"  (first ARIMA forecast after {m['arima_forecast_s']:.2f}s)" if 'arima_forecast_s' in m else ''
+            print(f"{name:<36} {m['wall_s']:>9.3f} {m['cpu_s']:>9.3f} {m['peak_rss_mb']:>9.0f} {m['status']}{extra}")
+
+    if args.compare_modes:
+        df = load_csv(args.data_csv) if args.data_csv else synthetic_ohlcv(args.mode_rows)
+        results['modes'] = compare_modes(api, df, args.days, args.origins)
+        print()
+        print(f"{'mode':<10} {'wall s':>9} {'cpu s':>9} {'peak MB':>9} | "
+              f"{'RMSE meta':>10} {'arima':>9} {'lstm':>9} | {'MAPE% meta':>10} {'arima':>7} {'lstm':>7}")
+        for mode, m in results['modes'].items():
+            print(f"{mode:<10} {m['wall_s']:>9.2f} {m['cpu_s']:>9.2f} {m['peak_rss_mb']:>9.0f} | "
+                  f"{m['rmse']['meta']:>10.3f} {m['rmse']['arima']:>9.3f} {m['rmse']['lstm']:>9.3f} | "
+                  f"{m['mape_pct']['meta']:>10.2f} {m['mape_pct']['arima']:>7.2f} {m['mape_pct']['lstm']:>7.2f}")
+        std, fast = results['modes']['standard'], results['modes']['fast']
+        print(f"fast mode uses {fast['cpu_s'] / std['cpu_s']:.0%} of the standard CPU time")
+
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nresults written to {args.out}")
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        if regressions:
+            print(f"FAIL: {len(regressions)} stage(s) slower than baseline by more than {args.threshold:.0%}:")
+            for case, stage, ref, cur in regressions:
+                print(f"  {case} / {stage}: {ref:.3f}s -> {cur:.3f}s ({cur / ref - 1:+.0%})")
+            sys.exit(1)
+        print(f"OK: no stage slower than the baseline by more than {args.threshold:.0%}")
+
+
+if __name__ == '__main__':
+    main()
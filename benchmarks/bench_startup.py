@@ -0,0 +1,93 @@
+# benchmarks/bench_startup.py
+# Measures cold import time of each dependency and of the API module, each in a fresh
+# interpreter, plus the time until /health answers. Fails when the API import exceeds
+# the budget, so heavy imports cannot creep back onto the start-up path unnoticed.
+#
+# Usage: python benchmarks/bench_startup.py [--budget 2.0] [--repeat 3] [--json results.json]
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    'numpy', 'pandas', 'flask', 'flask_cors', 'dotenv', 'pyotp',
+    'sklearn.preprocessing', 'statsmodels.tsa.arima.model', 'yfinance', 'SmartApi', 'tensorflow',
+]
+
+IMPORT_SNIPPET = """
+import sys, time
+sys.path.insert(0, {root!r})
+t0 = time.perf_counter()
+import {module}
+print(time.perf_counter() - t0)
+"""
+
+HEALTH_SNIPPET = """
+import sys, time
+sys.path.insert(0, {root!r})
+t0 = time.perf_counter()
+import stock_forecast_api as api
+t_import = time.perf_counter() - t0
+status = api.app.test_client().get('/health').status_code
+t_health = time.perf_counter() - t0
+heavy = [m for m in ('tensorflow', 'statsmodels', 'sklearn', 'yfinance', 'SmartApi') if m in sys.modules]
+print(t_import, t_health, status, ','.join(heavy))
+"""
+
+
+def run_snippet(code):
+    # warm-up thread disabled: we measure what the import itself costs
+    env = dict(os.environ, WARMUP_ON_START='0', TF_CPP_MIN_LOG_LEVEL='3')
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env, cwd=ROOT)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr else 'failed')
+    return out.stdout.strip().splitlines()[-1].split(' ')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure cold start-up cost of the API')
+    parser.add_argument('--budget', type=float, default=2.0, help='max seconds for importing stock_forecast_api')
+    parser.add_argument('--repeat', type=int, default=3, help='fresh interpreters per measurement (best is kept)')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    results = {'modules': {}, 'api': {}}
+    print(f"{'module':<32} {'import s':>9}")
+    print('-' * 42)
+    for module in MODULES:
+        try:
+            best = min(float(run_snippet(IMPORT_SNIPPET.format(root=ROOT, module=module))[0])
+                       for _ in range(args.repeat))
+            results['modules'][module] = best
+            print(f"{module:<32} {best:>9.3f}")
+        except RuntimeError as e:
+            results['modules'][module] = None
+            print(f"{module:<32} {'n/a':>9}  ({e})")
+
+    runs = [run_snippet(HEALTH_SNIPPET.format(root=ROOT)) for _ in range(args.repeat)]
+    best = min(runs, key=lambda r: float(r[0]))
+    t_import, t_health, status = float(best[0]), float(best[1]), int(best[2])
+    heavy = [m for m in (best[3].split(',') if len(best) > 3 else []) if m]
+    results['api'] = {'import_s': t_import, 'first_health_s': t_health, 'health_status': status,
+                      'heavy_modules_loaded': heavy, 'budget_s': args.budget}
+    print('-' * 42)
+    print(f"{'stock_forecast_api import':<32} {t_import:>9.3f}")
+    print(f"{'first /health response':<32} {t_health:>9.3f}  (status {status})")
+    print(f"heavy modules loaded at import: {heavy or 'none'}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if t_import > args.budget or heavy:
+        print(f"FAIL: import took {t_import:.2f}s (budget {args.budget:.2f}s), heavy modules: {heavy or 'none'}")
+        sys.exit(1)
+    print(f"OK: within the {args.budget:.2f}s import budget")
+
+
+if __name__ == '__main__':
+    main()
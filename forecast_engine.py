@@ -0,0 +1,68 @@
+# forecast_engine.py
+# Recursive multi-step LSTM forecasting as one compiled TensorFlow loop. Every step is a
+# single forward pass (model(x, training=False)) instead of a Keras predict() call, and
+# any number of windows that share a model are rolled out together as one batch.
+# NumPy models from numpy_runtime roll out without TensorFlow.
+
+import weakref
+
+import numpy as np
+
+from numpy_runtime import NumpyLSTM
+
+_rollouts = weakref.WeakKeyDictionary()  # model -> compiled rollout
+
+
+def _compiled_rollout(model):
+    fn = _rollouts.get(model)
+    if fn is not None:
+        return fn
+    import tensorflow as tf
+    # the rollout is the cache value, so it must not hold the model (its key) strongly:
+    # otherwise neither would ever be dropped
+    model_ref = weakref.ref(model)
+
+    @tf.function(reduce_retracing=True)
+    def rollout(windows, steps):
+        # windows: (batch, time_step, features); feature 0 is the (scaled) target, the
+        # remaining features are carried forward from the last observed step.
+        step_model = model_ref()
+        preds = tf.TensorArray(windows.dtype, size=steps)
+        x = windows
+        for i in tf.range(steps):
+            pred = step_model(x, training=False)                  # (batch, 1)
+            preds = preds.write(i, pred[:, 0])
+            new_step = tf.concat([pred[:, None, :], x[:, -1:, 1:]], axis=2)
+            x = tf.concat([x[:, 1:, :], new_step], axis=1)
+        return tf.transpose(preds.stack())                         # (batch, steps)
+
+    _rollouts[model] = rollout
+    return rollout
+
+
+def rollout_scaled(model, windows, steps):
+    """
+    windows: array (batch, time_step, features) in scaled units
+    Returns: array (batch, steps) of scaled predictions
+    """
+    windows = np.asarray(windows, dtype=np.float32)
+    if windows.ndim == 2:
+        windows = windows[None, ...]
+    if steps <= 0:
+        return np.empty((windows.shape[0], 0), dtype=np.float32)
+    if isinstance(model, NumpyLSTM):
+        return model.rollout(windows, int(steps))
+    import tensorflow as tf
+    out = _compiled_rollout(model)(tf.convert_to_tensor(windows), tf.constant(int(steps), dtype=tf.int32))
+    return out.numpy()
+
+
+def batched_recursive_forecast(model, last_sequences, steps, target_scaler):
+    """
+    Batched counterpart of recursive_lstm_forecast for windows that share one model
+    (several scenarios of one symbol, or symbols served by a shared model).
+    Returns: array (batch, steps) in price units
+    """
+    preds_scaled = rollout_scaled(model, last_sequences, steps)
+    return target_scaler.inverse_transform(preds_scaled.reshape(-1, 1)).reshape(preds_scaled.shape)
+
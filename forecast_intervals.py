@@ -0,0 +1,94 @@
+# forecast_intervals.py
+# Forecast bands (p10 / p50 / p90) for the three models of a fitted pipeline state.
+# ARIMA has closed-form intervals (get_forecast); the LSTM has none, so `paths` sample
+# trajectories are simulated as one batch per step (NumpyLSTM.sample_paths, also for Keras
+# models), with either a resampled test residual added to every step before it is fed back
+# ('bootstrap') or a fresh dropout mask per path and step ('mc_dropout'). The meta learner
+# then maps ARIMA x LSTM sample pairs in one predict() call, and every quantile is one
+# np.quantile over the path axis.
+
+import numpy as np
+
+from numpy_runtime import NumpyLSTM
+
+QUANTILES = (0.1, 0.5, 0.9)
+BAND_NAMES = ('p10', 'p50', 'p90')
+INTERVAL_METHODS = ('bootstrap', 'mc_dropout')
+
+
+def arima_paths(arima_model, last_close, days, paths, rng):
+    """
+    Returns: (bands, samples) where bands is a (3, days) array of ARIMA quantiles from
+    get_forecast() (the mean is the median) and samples (paths, days) are draws from the
+    same per-step normal marginals, for the meta learner. Without a usable model the last
+    close is repeated with zero width, like arima_future.
+    """
+    if arima_model is not None:
+        try:
+            fc = arima_model.get_forecast(steps=days)
+            mean = np.asarray(fc.predicted_mean, dtype=np.float64).ravel()
+            se = np.asarray(fc.se_mean, dtype=np.float64).ravel()
+            lower, upper = np.asarray(fc.conf_int(alpha=1 - (QUANTILES[2] - QUANTILES[0])), dtype=np.float64).T
+            samples = mean + se * rng.standard_normal((paths, days))
+            return np.stack([lower, mean, upper]), samples
+        except Exception as e:
+            print("[ARIMA] interval error:", e)
+    flat = np.full(days, float(last_close))
+    return np.stack([flat, flat, flat]), np.broadcast_to(flat, (paths, days))
+
+
+def step_noise(state, paths, days, rng):
+    """
+    Scaled-unit noise (paths, days) for the residual bootstrap: LSTM test residuals
+    (actual - predicted, price units, centred) resampled with replacement. States saved
+    before residuals were stored fall back to a normal with the test RMSE.
+    """
+    scale = float(np.ravel(state['target_scaler'].scale_)[0])
+    residuals = state.get('lstm_residuals')
+    if residuals is not None and len(residuals) > 1:
+        residuals = np.asarray(residuals, dtype=np.float64)
+        draws = rng.choice(residuals - residuals.mean(), size=(paths, days))
+    else:
+        draws = rng.normal(0.0, float(state['metrics']['lstm']['rmse']), size=(paths, days))
+    return (draws * scale).astype(np.float32)
+
+
+def lstm_paths(state, last_window, days, paths, method, rng):
+    """Returns: (paths, days) simulated LSTM price paths."""
+    lstm = state['lstm_model']
+    if not isinstance(lstm, NumpyLSTM):
+        lstm = NumpyLSTM.from_keras(lstm)  # a copy of the current weights; cheap next to the sampling
+    if method == 'mc_dropout':
+        scaled = lstm.sample_paths(last_window, days, paths, dropout_rng=rng)
+    else:
+        scaled = lstm.sample_paths(last_window, days, paths, noise=step_noise(state, paths, days, rng))
+    return state['target_scaler'].inverse_transform(scaled.reshape(-1, 1)).reshape(paths, days)
+
+
+def format_bands(dates, bands):
+    """(3, days) quantile rows -> [{'date', 'p10', 'p50', 'p90'}]"""
+    return [dict({'date': d.strftime('%Y-%m-%d')}, **{name: float(v) for name, v in zip(BAND_NAMES, column)})
+            for d, column in zip(dates, bands.T)]
+
+
+def forecast_bands(state, df, days, dates, paths=500, method='bootstrap', seed=42):
+    """
+    p10/p50/p90 per model for `days` ahead of df (the data the state was fitted on).
+    The generator is seeded, so the same state and data always give the same bands.
+    Returns: {'meta' | 'arima' | 'lstm': [{'date', 'p10', 'p50', 'p90'}]}
+    """
+    if method not in INTERVAL_METHODS:
+        raise ValueError(f"interval method must be one of {list(INTERVAL_METHODS)}")
+    rng = np.random.default_rng(seed)
+    arima_bands, arima_samples = arima_paths(state['arima_model'], df['Close'].iloc[-1], days, paths, rng)
+    last_window = state['feature_scaler'].transform(df[['Close', 'Volume']].iloc[-state['time_step']:])
+    lstm_samples = lstm_paths(state, last_window, days, paths, method, rng)
+    # ARIMA and LSTM draws are independent, so pairing them path by path samples the joint input
+    meta_samples = state['meta_model'].predict(np.column_stack((arima_samples.ravel(), lstm_samples.ravel())))
+    meta_samples = np.asarray(meta_samples, dtype=np.float64).reshape(paths, days)
+    quantiles = np.quantile(np.stack([lstm_samples, meta_samples]), QUANTILES, axis=1)  # (3, 2, days)
+    return {
+        'meta': format_bands(dates, quantiles[:, 1]),
+        'arima': format_bands(dates, arima_bands),
+        'lstm': format_bands(dates, quantiles[:, 0]),
+    }
@@ -0,0 +1,181 @@
+# forecast_jobs.py
+# Background jobs for the forecasting pipeline: a bounded process pool runs the
+# heavy training off the Flask request thread, and identical in-flight requests
+# are collapsed onto a single job.
+
+import os
+import math
+import threading
+import time
+import uuid
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from admission import Rejected
+
+
+def worker_thread_counts(workers, cpu_count=None):
+    """(intra_op, inter_op) thread counts so `workers` concurrent trainings share the cores."""
+    cores = cpu_count or os.cpu_count() or 1
+    intra_op = max(1, cores // max(1, workers))
+    inter_op = 2 if intra_op >= 4 else 1
+    return intra_op, inter_op
+
+
+def configure_worker_threads(intra_op, inter_op):
+    """
+    Process-pool initializer. Runs before the worker imports TensorFlow (the task function
+    is unpickled afterwards), so the env vars below size the TF and BLAS/oneDNN pools.
+    """
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS'):
+        os.environ[var] = str(intra_op)
+    os.environ['TF_NUM_INTEROP_THREADS'] = str(inter_op)
+
+
+class JobManager:
+    """
+    Tracks submitted jobs and their results in memory.
+
+    Jobs are deduplicated by a caller-supplied hashable key: while a job for
+    `key` is queued or running, further submissions with the same key return the
+    existing job instead of starting another run. Finished jobs are kept for
+    `job_ttl` seconds so clients can poll for the result.
+    """
+
+    def __init__(self, max_workers=1, job_ttl=3600, initializer=None, initargs=(), default_latency=60.0):
+        self.max_workers = max(1, int(max_workers))
+        self.job_ttl = job_ttl
+        self._initializer = initializer
+        self._initargs = initargs
+        self._lock = threading.Lock()
+        self._executor = None
+        self._jobs = {}        # job_id -> job record
+        self._inflight = {}    # dedup key -> job_id
+        self._latency = default_latency  # EWMA of submit-to-finish seconds, for Retry-After
+
+    def _get_executor(self):
+        # Created lazily so importing the API (and the workers themselves) never spawns a pool.
+        # 'spawn' keeps TensorFlow's thread state out of the children (fork is not TF-safe).
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=self._initializer,
+                initargs=self._initargs
+            )
+        return self._executor
+
+    def _purge_expired(self):
+        now = time.time()
+        expired = [jid for jid, job in self._jobs.items()
+                   if job['finished_at'] is not None and now - job['finished_at'] > self.job_ttl]
+        for jid in expired:
+            del self._jobs[jid]
+
+    def submit(self, key, fn, *args, context=None, max_queued=None):
+        """
+        Submit fn(*args) unless a job with the same key is already in flight.
+        max_queued: raise admission.Rejected (429) instead of queueing a new job behind this
+          many waiting ones (joining an in-flight job is always allowed)
+        Returns: (job snapshot, created) where created is False for a deduplicated submission
+        """
+        with self._lock:
+            self._purge_expired()
+            existing = self._inflight.get(key)
+            if existing is not None:
+                job = self._jobs[existing]
+                job['dedup_hits'] += 1
+                return self._snapshot(job), False
+            if max_queued is not None:
+                queued = sum(1 for j in self._jobs.values() if self._status(j) == 'queued')
+                if queued >= max_queued:
+                    # recent jobs took this long from submission (queueing included) to finish
+                    raise Rejected(429, f"Forecast job queue is full ({queued} queued)", max(1, math.ceil(self._latency)))
+
+            job_id = uuid.uuid4().hex
+            job = {
+                'job_id': job_id,
+                'key': key,
+                'context': context or {},
+                'submitted_at': time.time(),
+                'finished_at': None,
+                'dedup_hits': 0,
+                'future': None,
+                'result': None,
+                'error': None
+            }
+            try:
+                future = self._get_executor().submit(fn, *args)
+            except BrokenProcessPool:
+                # a worker died (e.g. OOM during training); start a fresh pool once
+                self._executor = None
+                future = self._get_executor().submit(fn, *args)
+            job['future'] = future
+            self._jobs[job_id] = job
+            self._inflight[key] = job_id
+
+        future.add_done_callback(lambda f, jid=job_id: self._on_done(jid, f))
+        return self._snapshot(job), True
+
+    def _on_done(self, job_id, future):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            try:
+                job['result'] = future.result()
+            except BrokenProcessPool as e:
+                job['error'] = f"worker process died: {e}"
+                self._executor = None
+            except Exception as e:
+                job['error'] = str(e)
+            job['finished_at'] = time.time()
+            self._latency = 0.8 * self._latency + 0.2 * (job['finished_at'] - job['submitted_at'])
+            if self._inflight.get(job['key']) == job_id:
+                del self._inflight[job['key']]
+
+    def get(self, job_id):
+        with self._lock:
+            self._purge_expired()
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job is not None else None
+
+    def future(self, job_id):
+        """The concurrent.futures.Future backing a job (shared by deduplicated submissions)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job['future'] if job is not None else None
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for j in self._jobs.values() if self._status(j) == 'running')
+            queued = sum(1 for j in self._jobs.values() if self._status(j) == 'queued')
+            return {'workers': self.max_workers, 'running': running, 'queued': queued,
+                    'tracked': len(self._jobs), 'latency_s': round(self._latency, 3)}
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+                self._executor = None
+
+    @staticmethod
+    def _status(job):
+        if job['finished_at'] is not None:
+            return 'failed' if job['error'] is not None else 'succeeded'
+        if job['future'] is not None and job['future'].running():
+            return 'running'
+        return 'queued'
+
+    def _snapshot(self, job):
+        return {
+            'job_id': job['job_id'],
+            'status': self._status(job),
+            'context': job['context'],
+            'submitted_at': job['submitted_at'],
+            'finished_at': job['finished_at'],
+            'dedup_hits': job['dedup_hits'],
+            'result': job['result'],
+            'error': job['error']
+        }
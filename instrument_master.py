@@ -0,0 +1,330 @@
+# instrument_master.py
+# Index over the broker's scrip master (Angel One's OpenAPIScripMaster.json: every NSE/BSE
+# instrument with its token). The master is compiled once into memory-mapped NumPy files:
+# fixed-width records sorted by symbol (prefix search by binary search), a second sorted
+# name column, and an open-addressing hash table for O(1) exchange:symbol -> token lookups.
+# When a new master file is dropped in, the index is rebuilt in a child process into a new
+# generation directory and swapped in; lookups keep using the previous one until then.
+#
+# Usage: python instrument_master.py build  [--master PATH] [--index-dir DIR]
+#        python instrument_master.py lookup SYMBOL [--exchange NSE]
+#        python instrument_master.py search QUERY [--exchange NSE] [--segment EQ] [--limit 20]
+
+import os
+import csv
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import argparse
+import threading
+import multiprocessing
+
+import numpy as np
+
+RECORD_DTYPE = np.dtype([
+    ('symbol', 'S48'), ('name', 'S32'), ('token', 'S12'), ('exchange', 'S8'),
+    ('segment', 'S8'), ('expiry', 'S12'), ('lotsize', '<i4'), ('tick_size', '<f4'),
+])
+_EMPTY_SLOT = -1
+
+
+def _key_hash(exchange, symbol):
+    # stable across processes (unlike hash()), so the table can be built once and mmapped
+    digest = hashlib.blake2b(f'{exchange}:{symbol}'.upper().encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def _segment(row):
+    """instrumenttype for derivatives/indices, else the cash series suffix (RELIANCE-EQ -> EQ)."""
+    kind = (row.get('instrumenttype') or '').strip()
+    if kind:
+        return kind
+    symbol = row.get('symbol') or ''
+    return symbol.rsplit('-', 1)[1] if '-' in symbol else 'EQ'
+
+
+def read_master(path):
+    """Scrip master rows as dicts, from Angel One's JSON list or a CSV with the same columns."""
+    if path.lower().endswith('.csv'):
+        with open(path, newline='') as f:
+            return list(csv.DictReader(f))
+    with open(path) as f:
+        return json.load(f)
+
+
+def source_signature(path):
+    st = os.stat(path)
+    return {'path': os.path.abspath(path), 'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+
+
+def build_index(rows, directory):
+    """Write records.npy, names.npy, name_order.npy and slots.npy for `rows` into `directory`."""
+    records = np.zeros(len(rows), dtype=RECORD_DTYPE)
+    for i, row in enumerate(rows):
+        records[i] = (
+            (row.get('symbol') or '').upper().encode()[:48], (row.get('name') or '').upper().encode()[:32],
+            str(row.get('token') or '').encode()[:12], (row.get('exch_seg') or '').upper().encode()[:8],
+            _segment(row).upper().encode()[:8], (row.get('expiry') or '').encode()[:12],
+            int(float(row.get('lotsize') or 0)), float(row.get('tick_size') or 0),
+        )
+    records = records[records['symbol'] != b'']
+    records = records[np.lexsort((records['exchange'], records['symbol']))]
+    name_order = np.argsort(records['name'], kind='stable').astype(np.int32)
+
+    # linear probing at load factor <= 0.5; a later duplicate exchange:symbol keeps the first row
+    size = 1 << max(4, int(2 * len(records)).bit_length())
+    slots = np.full(size, _EMPTY_SLOT, dtype=np.int32)
+    mask = size - 1
+    for i, (symbol, exchange) in enumerate(zip(records['symbol'].tolist(), records['exchange'].tolist())):
+        slot = _key_hash(exchange.decode(), symbol.decode()) & mask
+        while slots[slot] != _EMPTY_SLOT:
+            other = records[slots[slot]]
+            if other['symbol'] == symbol and other['exchange'] == exchange:
+                break
+            slot = (slot + 1) & mask
+        else:
+            slots[slot] = i
+
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, 'records.npy'), records)
+    np.save(os.path.join(directory, 'names.npy'), records['name'][name_order])
+    np.save(os.path.join(directory, 'name_order.npy'), name_order)
+    np.save(os.path.join(directory, 'slots.npy'), slots)
+    return len(records)
+
+
+def _read_current(root):
+    try:
+        with open(os.path.join(root, 'CURRENT')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _stale(source, current):
+    try:
+        signature = source_signature(source)
+    except OSError:
+        return False  # no master file (yet): keep whatever is loaded
+    return current is None or current.get('source') != signature
+
+
+def rebuild_generation(source, root):
+    """
+    Index the master file into a new generation directory and point CURRENT at it, unless
+    CURRENT already matches the file. Serialized across processes by a lock file; the
+    previous generation is kept for readers that still have it open.
+    """
+    with open(os.path.join(root, '.build.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        current = _read_current(root)
+        if not _stale(source, current):
+            return
+        t0 = time.perf_counter()
+        signature = source_signature(source)
+        generation = f"gen-{signature['mtime_ns']}-{os.getpid()}"
+        tmp = os.path.join(root, generation + '.tmp')
+        count = build_index(read_master(source), tmp)
+        os.replace(tmp, os.path.join(root, generation))
+        pointer = os.path.join(root, 'CURRENT.tmp')
+        with open(pointer, 'w') as f:
+            json.dump({'generation': generation, 'count': count, 'source': signature, 'built_at': time.time()}, f)
+        os.replace(pointer, os.path.join(root, 'CURRENT'))
+        print(f"[Instruments] indexed {count} instruments in {time.perf_counter() - t0:.2f}s")
+        # open mmaps of removed generations stay valid for readers still holding them
+        previous = current['generation'] if current else None
+        for name in os.listdir(root):
+            if name.startswith('gen-') and name not in (generation, previous):
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+class _Index:
+    """One immutable, memory-mapped generation of the index."""
+
+    def __init__(self, directory, generation):
+        self.generation = generation
+        load = lambda name: np.load(os.path.join(directory, name), mmap_mode='r')
+        self.records = load('records.npy')
+        self.names = load('names.npy')
+        self.name_order = load('name_order.npy')
+        self.slots = load('slots.npy')
+
+    def find(self, symbol, exchange):
+        mask = len(self.slots) - 1
+        slot = _key_hash(exchange, symbol) & mask
+        want = (symbol.upper().encode(), exchange.upper().encode())
+        while True:
+            row = int(self.slots[slot])
+            if row == _EMPTY_SLOT:
+                return None
+            record = self.records[row]
+            if (record['symbol'], record['exchange']) == want:
+                return record
+            slot = (slot + 1) & mask
+
+    @staticmethod
+    def _prefix_range(column, prefix):
+        return (int(np.searchsorted(column, prefix, 'left')),
+                int(np.searchsorted(column, prefix + b'\xff', 'left')))
+
+    def search(self, query, exchange=None, segment=None, limit=20):
+        """Symbol-prefix matches (an exact symbol sorts first), then name-prefix matches."""
+        prefix = query.upper().encode()
+        filters = [(field, value.upper().encode()) for field, value in (('exchange', exchange), ('segment', segment))
+                   if value]
+        found = []
+        for column, order, width in ((self.records['symbol'], None, 48), (self.names, self.name_order, 32)):
+            lo, hi = self._prefix_range(column, prefix[:width])
+            if not filters:
+                hi = min(hi, lo + limit)  # nothing filtered out: the first `limit` rows are enough
+            rows = np.arange(lo, hi) if order is None else np.asarray(order[lo:hi])
+            for field, value in filters:
+                rows = rows[self.records[field][rows] == value]  # reads just these fields from the mmap
+            found.append(rows)
+        rows = np.concatenate(found)
+        rows = rows[np.sort(np.unique(rows, return_index=True)[1])][:limit]  # dedupe, keep order
+        return [record_dict(r) for r in self.records[rows]]
+
+
+def record_dict(record):
+    return {
+        'symbol': record['symbol'].decode(), 'name': record['name'].decode(), 'token': record['token'].decode(),
+        'exchange': record['exchange'].decode(), 'segment': record['segment'].decode(),
+        'expiry': record['expiry'].decode() or None, 'lotsize': int(record['lotsize']),
+        'tick_size': float(record['tick_size']),
+    }
+
+
+class InstrumentMaster:
+    """
+    Lookups over the newest index generation in `root`, built from the master file at
+    `source`. At most every `check_every` seconds a lookup compares the master file with
+    the one the index was built from; a changed file is rebuilt in a child process (one
+    worker builds, under a lock file) and the new generation replaces the old one with a
+    single reference swap. Until an index exists every lookup returns None / [].
+    """
+
+    def __init__(self, source, root, check_every=30.0):
+        self.source = source
+        self.root = root
+        self.check_every = check_every
+        self._index = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._building = False
+        self._last_check = 0.0
+        self.last_error = None
+        os.makedirs(root, exist_ok=True)
+        self._load_current()
+
+    # ---- generations
+    def _load_current(self):
+        with self._load_lock:
+            # re-read under the lock: a caller holding an older CURRENT must not swap back to it
+            current = _read_current(self.root)
+            if current is None or (self._index is not None and self._index.generation == current['generation']):
+                return current
+            try:
+                self._index = _Index(os.path.join(self.root, current['generation']), current['generation'])
+                print(f"[Instruments] loaded {current['count']} instruments ({current['generation']})")
+            except (OSError, ValueError) as e:
+                print("[Instruments] failed to load index:", e)
+            return current
+
+    def rebuild(self):
+        """Build a new generation in this process (unless another one already did) and load it."""
+        rebuild_generation(self.source, self.root)
+        self._load_current()
+
+    def _rebuild_in_background(self):
+        try:
+            # parsing and indexing hold the GIL for seconds: build in a child process so
+            # request threads keep answering from the current generation meanwhile
+            process = multiprocessing.get_context('spawn').Process(
+                target=rebuild_generation, args=(self.source, self.root), name='instrument-index', daemon=True)
+            process.start()
+            process.join()
+            if process.exitcode != 0:
+                raise RuntimeError(f"index build exited with code {process.exitcode}")
+            self._load_current()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            print("[Instruments] rebuild failed:", e)
+        finally:
+            with self._lock:
+                self._building = False
+
+    def refresh(self, wait=False):
+        """Pick up a generation built elsewhere, and start a rebuild when the master file changed."""
+        current = self._load_current()
+        if not _stale(self.source, current):
+            return
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        if wait:
+            try:
+                self.rebuild()
+            finally:
+                with self._lock:
+                    self._building = False
+        else:
+            threading.Thread(target=self._rebuild_in_background, name='instrument-index', daemon=True).start()
+
+    def _current_index(self):
+        now = time.monotonic()
+        if now - self._last_check >= self.check_every:
+            self._last_check = now
+            self.refresh()
+        return self._index
+
+    # ---- lookups
+    def get(self, symbol, exchange='NSE'):
+        index = self._current_index()
+        record = index.find(symbol, exchange) if index is not None else None
+        return record_dict(record) if record is not None else None
+
+    def token(self, symbol, exchange='NSE'):
+        index = self._current_index()
+        record = index.find(symbol, exchange) if index is not None else None
+        return record['token'].decode() if record is not None else None
+
+    def search(self, query, exchange=None, segment=None, limit=20):
+        index = self._current_index()
+        return index.search(query, exchange, segment, limit) if index is not None and query else []
+
+    def stats(self):
+        current = _read_current(self.root) or {}
+        return {'loaded': self._index is not None, 'generation': getattr(self._index, 'generation', None),
+                'count': current.get('count'), 'built_at': current.get('built_at'),
+                'building': self._building, 'error': self.last_error}
+
+
+def main():
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Build and query the instrument master index')
+    parser.add_argument('command', choices=['build', 'lookup', 'search'])
+    parser.add_argument('query', nargs='?')
+    parser.add_argument('--master', default=os.getenv('INSTRUMENT_MASTER_PATH', os.path.join(here, 'data', 'instruments', 'OpenAPIScripMaster.json')))
+    parser.add_argument('--index-dir', default=os.getenv('INSTRUMENT_INDEX_DIR', os.path.join(here, 'data', 'instruments', 'index')))
+    parser.add_argument('--exchange')
+    parser.add_argument('--segment')
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    master = InstrumentMaster(args.master, args.index_dir, check_every=float('inf'))
+    master.refresh(wait=True)
+    if args.command == 'build':
+        print(json.dumps(master.stats(), indent=2))
+    elif args.command == 'lookup':
+        print(json.dumps(master.get(args.query or '', args.exchange or 'NSE'), indent=2))
+    else:
+        print(json.dumps(master.search(args.query or '', args.exchange, args.segment, args.limit), indent=2))
+
+
+if __name__ == '__main__':
+    main()
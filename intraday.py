@@ -0,0 +1,445 @@
+# intraday.py
+# Intraday forecasting on ONE_MINUTE..ONE_HOUR bars. Each (symbol, interval) feed keeps the
+# most recent bars in a fixed-size array-backed ring buffer, ingests new bars as a stream
+# (Angel One candle/quote polling or a replay file) and refreshes its forecast on every bar:
+# only the new bar is scaled, the LSTM input window is a view over the buffer, ARIMA is
+# extended by the new close and the models are refitted in the background every few hundred bars.
+#
+# Usage: python intraday.py --replay bars.csv [--interval ONE_MINUTE] [--speed 0] [--horizon 12]
+
+import os
+import sys
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+import telemetry
+from admission import Rejected
+from forecast_engine import rollout_scaled
+
+INTERVAL_SECONDS = {
+    'ONE_MINUTE': 60, 'THREE_MINUTE': 180, 'FIVE_MINUTE': 300, 'TEN_MINUTE': 600,
+    'FIFTEEN_MINUTE': 900, 'THIRTY_MINUTE': 1800, 'ONE_HOUR': 3600,
+}
+SESSION_MINUTES = 375  # NSE cash session 09:15-15:30
+EXCHANGE_TZ = 'Asia/Kolkata'  # bars are stored as naive exchange wall-clock time
+
+
+def to_epoch(ts):
+    """Naive exchange wall-clock timestamp -> epoch seconds (same convention as the candle store)."""
+    if isinstance(ts, (int, float, np.integer, np.floating)):
+        return float(ts)
+    return pd.Timestamp(ts).tz_localize(None).value / 1e9
+
+
+class BarRing:
+    """
+    Last `capacity` bars as [epoch_seconds, Close, Volume] rows. Every row is written at
+    slot i and i + capacity, so the most recent n bars are always one contiguous slice
+    (a zero-copy view) and a push is O(1). The scaled Close/Volume features are kept
+    alongside; only the pushed bar is scaled, set_scaler() rescales the whole buffer.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.count = 0
+        self._next = 0  # slot the next new bar goes to
+        self._bars = np.zeros((2 * capacity, 3))
+        self._scaled = np.zeros((2 * capacity, 2), dtype=np.float32)
+        self._scale = None  # (scale_, min_) of a fitted MinMaxScaler
+
+    @property
+    def last_ts(self):
+        return self._bars[self._end() - 1, 0] if self.count else None
+
+    def _end(self):
+        return (self._next - 1) % self.capacity + self.capacity + 1
+
+    def push(self, ts, close, volume):
+        """Returns 'new', 'update' (same timestamp as the last bar: it is still forming) or 'stale'."""
+        last = self.last_ts
+        if last is not None and ts < last:
+            return 'stale'
+        if last is not None and ts == last:
+            slot, status = (self._next - 1) % self.capacity, 'update'
+        else:
+            slot, status = self._next, 'new'
+            self._next = (self._next + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+        row = (ts, close, volume)
+        self._bars[slot] = row
+        self._bars[slot + self.capacity] = row
+        if self._scale is not None:
+            scaled = np.array((close, volume)) * self._scale[0] + self._scale[1]
+            self._scaled[slot] = scaled
+            self._scaled[slot + self.capacity] = scaled
+        return status
+
+    def last(self, n=None):
+        """View of the most recent n bars (all buffered bars by default), oldest first."""
+        n = self.count if n is None else min(n, self.count)
+        end = self._end()
+        return self._bars[end - n:end]
+
+    def scaled_last(self, n):
+        end = self._end()
+        return self._scaled[end - min(n, self.count):end]
+
+    def set_scaler(self, feature_scaler):
+        self._scale = (feature_scaler.scale_, feature_scaler.min_)
+        self._scaled[:] = self._bars[:, 1:3] * self._scale[0] + self._scale[1]
+
+    def frame(self):
+        bars = self.last()
+        return pd.DataFrame({'Close': bars[:, 1], 'Volume': bars[:, 2]},
+                            index=pd.to_datetime(bars[:, 0], unit='s'))
+
+
+class IntradayFeed:
+    """
+    One streaming forecaster per (symbol, interval).
+
+    source: callable(stop_event) -> iterable of (timestamp, close, volume); a bar repeated
+      with the same timestamp updates the forming bar in place
+    fit: callable(df) -> pipeline state (fit_pipeline's output) for a Close/Volume frame
+
+    Models are fitted in a background thread, first once `min_bars` bars are buffered (the feed
+    keeps buffering meanwhile) and then every `refit_bars` bars; a finished fit is handed over
+    through `_pending` and swapped in between two bars. Forecast timestamps step by the
+    interval and ignore session breaks.
+    """
+
+    def __init__(self, symbol, interval, source, fit, capacity=3000, horizon=12, refit_bars=SESSION_MINUTES,
+                 min_bars=400):
+        if interval not in INTERVAL_SECONDS:
+            raise ValueError(f"interval must be one of {list(INTERVAL_SECONDS)}")
+        if min_bars > capacity:
+            raise ValueError("min_bars cannot exceed the buffer capacity")
+        self.symbol = symbol
+        self.interval = interval
+        self.step = INTERVAL_SECONDS[interval]
+        self.horizon = horizon
+        self.refit_bars = refit_bars
+        self.min_bars = min_bars
+        self.ring = BarRing(capacity)
+        self._source = source
+        self._fit = fit
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._fit_lock = threading.Lock()  # guards _pending, _refitting and fits (written by the fit thread)
+        self._state = None           # models used for forecasting
+        self._pending = None         # (state, fitted_until_ts) from a background fit
+        self._refitting = False
+        self._arima = None           # ARIMA results covering closes up to _arima_ts
+        self._arima_ts = None
+        self._bars_since_fit = 0
+        self._latencies = deque(maxlen=1000)
+        self.status = 'starting'
+        self.error = None
+        self.updates = 0
+        self.fits = 0
+        self.latest = None
+
+    # ---- lifecycle
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f'intraday-{self.symbol}-{self.interval}', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            self.status = 'buffering'
+            for ts, close, volume in self._source(self._stop):
+                if self._stop.is_set():
+                    break
+                self.on_bar(ts, close, volume)
+            if self.error is None:
+                self.status = 'stopped'
+        except Exception as e:
+            print(f"[Intraday] {self.symbol} {self.interval} feed failed:", e)
+            self.status, self.error = 'failed', str(e)
+        finally:
+            self._publish({'event': 'closed', 'status': self.status, 'error': self.error})
+
+    # ---- subscribers
+    def subscribe(self, maxsize=256):
+        q = queue.Queue(maxsize=maxsize)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def _publish(self, payload):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(payload)
+            except queue.Full:
+                # slow consumer: drop its oldest update rather than stall the feed
+                try:
+                    q.get_nowait()
+                    q.put_nowait(payload)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    # ---- per-bar update
+    def on_bar(self, ts, close, volume):
+        t0 = time.perf_counter()
+        ts = to_epoch(ts)
+        bar_status = self.ring.push(ts, float(close), float(volume))
+        if bar_status == 'stale':
+            return None
+        if bar_status == 'new':
+            self._bars_since_fit += 1
+        with self._fit_lock:
+            pending, self._pending = self._pending, None
+        if pending is not None:
+            self._swap_in(*pending)
+        if self._state is None:
+            # first model: nothing to forecast until it exists
+            if self.ring.count >= self.min_bars:
+                self._fit_in_background()
+            return None
+        if self._bars_since_fit >= self.refit_bars:
+            self._fit_in_background()
+
+        with telemetry.stage('intraday_update'):
+            forecast = self._forecast()
+        latency = time.perf_counter() - t0
+        self._latencies.append(latency)
+        self.updates += 1
+        self.latest = {
+            'event': 'forecast',
+            'symbol': self.symbol,
+            'interval': self.interval,
+            'bar': {'time': _iso(ts), 'close': float(close), 'volume': float(volume), 'status': bar_status},
+            'forecast': forecast,
+            'model_bars_behind': self._bars_since_fit,
+            'latency_ms': round(latency * 1000, 3),
+        }
+        self._publish(self.latest)
+        return self.latest
+
+    def _forecast(self):
+        state = self._state
+        bars = self.ring.last()
+        # ARIMA: commit bars that closed since it was last extended, then extend by the forming bar
+        closed = bars[:-1]
+        closed = closed[closed[:, 0] > self._arima_ts]
+        if self._arima is not None and len(closed):
+            self._arima = self._arima.extend(closed[:, 1])
+            self._arima_ts = closed[-1, 0]
+        arima = _arima_forecast(self._arima, bars[-1, 1], self.horizon)
+
+        window = self.ring.scaled_last(state['time_step'])
+        lstm_scaled = rollout_scaled(state['lstm_model'], window, self.horizon)[0]
+        lstm = state['target_scaler'].inverse_transform(lstm_scaled.reshape(-1, 1)).ravel()
+        meta = state['meta_model'].predict(np.column_stack((arima, lstm)))
+
+        times = [_iso(bars[-1, 0] + self.step * (k + 1)) for k in range(self.horizon)]
+        return {name: [{'time': t, 'value': float(v)} for t, v in zip(times, values)]
+                for name, values in (('meta', meta), ('arima', arima), ('lstm', lstm))}
+
+    # ---- model fitting
+    def _training_frame(self):
+        # the last bar may still be forming, so models are fitted on closed bars only
+        return self.ring.frame().iloc[:-1]
+
+    def _fit_in_background(self):
+        """Returns: False when a fit is already running"""
+        with self._fit_lock:
+            if self._refitting:
+                return False
+            self._refitting = True
+        df = self._training_frame()
+        fitted_until = to_epoch(df.index[-1])
+        first = self._state is None
+        if first:
+            self.status = 'training'
+
+        def fit():
+            state = None
+            try:
+                with telemetry.stage('intraday_fit', rows=len(df)):
+                    state = self._fit(df)
+            except Rejected as e:
+                # turned away by admission control: retried on the next bar
+                print(f"[Intraday] {self.symbol} fit deferred: {e.reason}")
+                if first:
+                    self.status = 'buffering'
+            except Exception as e:
+                if first:
+                    print(f"[Intraday] {self.symbol} {self.interval} first fit failed:", e)
+                    self.status, self.error = 'failed', str(e)
+                    self._stop.set()
+                else:
+                    print(f"[Intraday] {self.symbol} refit failed, keeping the current models:", e)
+            finally:
+                with self._fit_lock:
+                    if state is not None:
+                        self.fits += 1
+                        self._pending = (state, fitted_until)  # picked up by the feed thread before its next forecast
+                    self._refitting = False
+        threading.Thread(target=fit, name=f'intraday-fit-{self.symbol}', daemon=True).start()
+        return True
+
+    def _swap_in(self, state, fitted_until):
+        self._state = state
+        self.status = 'live'
+        self.ring.set_scaler(state['feature_scaler'])
+        self._arima, self._arima_ts = state['arima_model'], fitted_until
+        bars = self.ring.last()
+        self._bars_since_fit = int(np.sum(bars[:, 0] > fitted_until))
+
+    def stats(self):
+        lat = np.array(self._latencies) * 1000 if self._latencies else None
+        with self._fit_lock:
+            fits, refitting = self.fits, self._refitting
+        return {
+            'symbol': self.symbol,
+            'interval': self.interval,
+            'status': self.status,
+            'error': self.error,
+            'bars': self.ring.count,
+            'capacity': self.ring.capacity,
+            'last_bar': _iso(self.ring.last_ts) if self.ring.count else None,
+            'updates': self.updates,
+            'fits': fits,
+            'refitting': refitting,
+            'model_bars_behind': self._bars_since_fit,
+            'latency_ms': None if lat is None else {
+                'p50': round(float(np.percentile(lat, 50)), 3),
+                'p95': round(float(np.percentile(lat, 95)), 3),
+                'max': round(float(lat.max()), 3),
+            },
+        }
+
+
+def _iso(epoch):
+    return pd.Timestamp(epoch, unit='s').isoformat()
+
+
+def _arima_forecast(arima_model, last_close, steps):
+    if arima_model is not None:
+        try:
+            return np.asarray(arima_model.extend([last_close]).forecast(steps=steps), dtype=float).ravel()
+        except Exception as e:
+            print("[Intraday] ARIMA forecast error:", e)
+    return np.full(steps, last_close, dtype=float)
+
+
+# -------------------------
+# Bar sources
+def replay_source(path, interval, speed=0.0):
+    """
+    Bars from a CSV (timestamp column first, Close and Volume columns). speed is a multiple
+    of real time (60: a one-minute bar per second); 0 replays as fast as bars are processed.
+    """
+    df = pd.read_csv(path, index_col=0, parse_dates=True)
+    step = INTERVAL_SECONDS[interval]
+
+    def bars(stop_event):
+        for ts, close, volume in zip(df.index, df['Close'].to_numpy(float), df['Volume'].to_numpy(float)):
+            if stop_event.is_set():
+                return
+            yield ts, close, volume
+            if speed:
+                stop_event.wait(step / speed)
+    return bars
+
+
+def angel_source(fetch_bars, interval, capacity, quote=None, quote_every=5.0):
+    """
+    Live bars from Angel One. fetch_bars(start: datetime) -> OHLCV DataFrame (getCandleData)
+    seeds the buffer with about `capacity` bars and then returns the bars since the last one
+    after each interval closes; between candle polls, quote() (get_live_quote) updates the
+    forming bar every `quote_every` seconds. Its volume is counted from the first quote seen
+    in the bar, and the candle poll replaces it with the exchange's bar.
+    """
+    step = INTERVAL_SECONDS[interval]
+
+    def bars(stop_event):
+        sessions = capacity * step / (SESSION_MINUTES * 60)
+        start = pd.Timestamp.now(tz=EXCHANGE_TZ).tz_localize(None).to_pydatetime() - timedelta(days=int(sessions * 7 / 5) + 4)
+        last_ts = None
+        bucket, bucket_volume = None, None
+        next_poll = 0.0
+        while not stop_event.is_set():
+            now = time.time()
+            if now >= next_poll:
+                df = fetch_bars(last_ts.to_pydatetime() if last_ts is not None else start)
+                if df is not None and len(df):
+                    for ts, row in df[['Close', 'Volume']].iterrows():
+                        yield ts, row['Close'], row['Volume']
+                    last_ts = df.index[-1]
+                # candles are published shortly after the bar closes
+                next_poll = (now // step + 1) * step + 2
+            if quote is not None:
+                q = quote()
+                if q and q.get('ltp') is not None:
+                    wall = pd.Timestamp.now(tz=EXCHANGE_TZ).tz_localize(None).floor(f'{step}s')
+                    if wall != bucket:
+                        bucket, bucket_volume = wall, q.get('volume') or 0.0
+                    yield wall, q['ltp'], max(0.0, (q.get('volume') or 0.0) - bucket_volume)
+            stop_event.wait(min(quote_every if quote is not None else step, max(0.0, next_poll - time.time())))
+    return bars
+
+
+# -------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay intraday bars through a streaming forecaster')
+    parser.add_argument('--replay', required=True, help='CSV with a timestamp column first and Close/Volume columns')
+    parser.add_argument('--symbol', default='REPLAY')
+    parser.add_argument('--interval', choices=list(INTERVAL_SECONDS), default='ONE_MINUTE')
+    parser.add_argument('--speed', type=float, default=0.0, help='multiple of real time; 0 = as fast as possible')
+    parser.add_argument('--capacity', type=int, default=int(os.getenv('INTRADAY_BUFFER_BARS', 3000)))
+    parser.add_argument('--horizon', type=int, default=int(os.getenv('INTRADAY_HORIZON', 12)))
+    parser.add_argument('--refit-bars', type=int, default=int(os.getenv('INTRADAY_REFIT_BARS', SESSION_MINUTES)))
+    parser.add_argument('--min-bars', type=int, default=int(os.getenv('INTRADAY_MIN_BARS', 400)))
+    parser.add_argument('--quiet', action='store_true', help='only print the summary')
+    args = parser.parse_args(argv)
+
+    # imported here so `--help` does not pay for the API start-up
+    import stock_forecast_api as api
+
+    feed = IntradayFeed(args.symbol, args.interval, replay_source(args.replay, args.interval, args.speed),
+                        fit=api.fit_intraday, capacity=args.capacity,
+                        horizon=args.horizon, refit_bars=args.refit_bars, min_bars=args.min_bars)
+    updates = feed.subscribe(maxsize=0)
+    feed.start()
+    while True:
+        msg = updates.get()
+        if msg['event'] == 'closed':
+            break
+        if not args.quiet:
+            print(f"{msg['bar']['time']} close={msg['bar']['close']:.2f} "
+                  f"next={msg['forecast']['meta'][0]['value']:.2f} ({msg['latency_ms']:.1f} ms)")
+    print(feed.stats())
+    return 0 if feed.status == 'stopped' else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,196 @@
+# meta_learners.py
+# Stacking learners that combine the ARIMA and LSTM test-window predictions into the
+# "meta" forecast. The Keras NN is the original learner; the others are closed-form NumPy
+# fits over a handful of rows (constrained least squares, ridge, inverse-error weights)
+# that run in microseconds. All share fit/predict/save, and load_learner() restores any
+# of them from a model-registry entry.
+
+import os
+import json
+import itertools
+
+import numpy as np
+
+
+class MetaLearner:
+    name = None
+
+    def fit(self, X, y, X_val=None, y_val=None):
+        raise NotImplementedError
+
+    def predict(self, X):
+        """Returns: 1-D array with one prediction per row of X."""
+        raise NotImplementedError
+
+    def save(self, directory):
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump({'learner': self.name, 'params': self.get_params()}, f)
+
+    def get_params(self):
+        raise NotImplementedError
+
+    def set_params(self, params):
+        raise NotImplementedError
+
+
+class _LinearLearner(MetaLearner):
+    """y ~ X @ weights + intercept"""
+
+    def __init__(self):
+        self.weights = None
+        self.intercept = 0.0
+
+    def predict(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.weights + self.intercept
+
+    def get_params(self):
+        return {'weights': self.weights.tolist(), 'intercept': float(self.intercept)}
+
+    def set_params(self, params):
+        self.weights = np.asarray(params['weights'], dtype=np.float64)
+        self.intercept = float(params['intercept'])
+        return self
+
+
+class ConstrainedLSLearner(_LinearLearner):
+    """
+    Least-squares weights constrained to the simplex (non-negative, summing to 1), no
+    intercept: a convex blend of the base forecasts. Each support set is solved in closed
+    form through its KKT system and the best feasible one is kept (2^k - 1 tiny solves).
+    """
+    name = 'constrained_ls'
+
+    def fit(self, X, y, X_val=None, y_val=None):
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        k = X.shape[1]
+        gram, xty = X.T @ X, X.T @ y
+        best, best_loss = None, np.inf
+        for size in range(1, k + 1):
+            for support in itertools.combinations(range(k), size):
+                idx = list(support)
+                kkt = np.zeros((size + 1, size + 1))
+                kkt[:size, :size] = gram[np.ix_(idx, idx)]
+                kkt[:size, size] = kkt[size, :size] = 1.0
+                rhs = np.append(xty[idx], 1.0)
+                w_s = np.linalg.lstsq(kkt, rhs, rcond=None)[0][:size]
+                if np.any(w_s < -1e-12):
+                    continue
+                w = np.zeros(k)
+                w[idx] = np.clip(w_s, 0.0, None)
+                loss = np.sum((y - X @ w) ** 2)
+                if loss < best_loss:
+                    best, best_loss = w, loss
+        self.weights = best / best.sum()
+        self.intercept = 0.0
+        return self
+
+
+class RidgeLearner(_LinearLearner):
+    """
+    Ridge regression with an intercept. `alpha` is relative to the mean feature variance,
+    so the penalty means the same for a 100-rupee and a 10,000-rupee stock; it keeps the
+    weights stable when the two base forecasts are nearly collinear.
+    """
+    name = 'ridge'
+
+    def __init__(self, alpha=0.01):
+        super().__init__()
+        self.alpha = alpha
+
+    def fit(self, X, y, X_val=None, y_val=None):
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        x_mean, y_mean = X.mean(axis=0), y.mean()
+        Xc = X - x_mean
+        gram = Xc.T @ Xc
+        penalty = self.alpha * np.trace(gram) / X.shape[1]
+        self.weights = np.linalg.solve(gram + penalty * np.eye(X.shape[1]), Xc.T @ (y - y_mean))
+        self.intercept = float(y_mean - x_mean @ self.weights)
+        return self
+
+    def get_params(self):
+        return dict(super().get_params(), alpha=self.alpha)
+
+    def set_params(self, params):
+        self.alpha = params.get('alpha', self.alpha)
+        return super().set_params(params)
+
+
+class InverseErrorLearner(_LinearLearner):
+    """Weights proportional to 1 / MSE of each base forecast on the fitting rows."""
+    name = 'inverse_error'
+
+    def fit(self, X, y, X_val=None, y_val=None):
+        X = np.asarray(X, dtype=np.float64)
+        mse = np.mean((X - np.asarray(y, dtype=np.float64)[:, None]) ** 2, axis=0)
+        if np.any(mse == 0):
+            inv = (mse == 0).astype(np.float64)  # a perfect base forecast takes all the weight
+        else:
+            inv = 1.0 / mse
+        self.weights = inv / inv.sum()
+        self.intercept = 0.0
+        return self
+
+
+class KerasMetaLearner(MetaLearner):
+    """The original 32-8-1 dense network, early-stopped on the validation rows."""
+    name = 'nn'
+
+    def __init__(self, lr=1e-3, epochs=200, batch_size=16, model=None):
+        self.lr = lr
+        self.epochs = epochs
+        self.batch_size = batch_size
+        self.model = model
+
+    def fit(self, X, y, X_val=None, y_val=None):
+        from tensorflow.keras.models import Sequential
+        from tensorflow.keras.layers import Dense, Dropout
+        from tensorflow.keras.optimizers import Adam
+        from tensorflow.keras.callbacks import EarlyStopping
+        self.model = Sequential([
+            Dense(32, activation='relu', input_shape=(X.shape[1],)),
+            Dropout(0.2),
+            Dense(8, activation='relu'),
+            Dense(1)
+        ])
+        self.model.compile(optimizer=Adam(learning_rate=self.lr, clipnorm=1.0), loss='mse')
+        es = EarlyStopping(monitor='val_loss', patience=10, restore_best_weights=True, verbose=0)
+        self.model.fit(X, y, validation_data=(X_val, y_val), epochs=self.epochs, batch_size=self.batch_size,
+                       callbacks=[es], verbose=0)
+        return self
+
+    def predict(self, X):
+        # direct call: predict() costs more than the network itself for a few dozen rows
+        return np.asarray(self.model(np.asarray(X, dtype=np.float32), training=False)).ravel()
+
+    def save(self, directory):
+        self.model.save(os.path.join(directory, 'meta.keras'))
+
+
+META_LEARNERS = {cls.name: cls for cls in (KerasMetaLearner, ConstrainedLSLearner, RidgeLearner, InverseErrorLearner)}
+
+
+def make_learner(name):
+    if name not in META_LEARNERS:
+        raise ValueError(f"meta_learner must be one of {list(META_LEARNERS)}")
+    return META_LEARNERS[name]()
+
+
+def learner_params(name):
+    """
+    {'meta_learner': name} for registry and backtest params; empty for the original 'nn'
+    learner (or the default), so ids from before meta learners were configurable still match.
+    """
+    return {} if name in (None, 'nn') else {'meta_learner': name}
+
+
+def load_learner(directory):
+    """Learner saved by MetaLearner.save() in `directory` (entries from before this module hold meta.keras)."""
+    path = os.path.join(directory, 'meta.json')
+    if os.path.exists(path):
+        with open(path) as f:
+            saved = json.load(f)
+        return META_LEARNERS[saved['learner']]().set_params(saved['params'])
+    from tensorflow.keras.models import load_model
+    return KerasMetaLearner(model=load_model(os.path.join(directory, 'meta.keras')))
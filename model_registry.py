@@ -0,0 +1,244 @@
+# model_registry.py
+# Persistent registry of fitted pipeline states (Keras LSTM + meta models, scalers,
+# ARIMA results) keyed by symbol, hyperparameters and a fingerprint of the data. Each
+# entry also carries a runtime.npz export, so a registry opened with runtime='numpy'
+# serves its states without importing TensorFlow.
+
+import os
+import json
+import time
+import shutil
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from meta_learners import load_learner
+from numpy_runtime import export_runtime, load_runtime
+
+
+def data_fingerprint(df, n_rows=None):
+    """SHA-1 over the timestamps and Close/Volume values of the first n_rows rows."""
+    part = df if n_rows is None else df.iloc[:n_rows]
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(part.index.asi8).tobytes())
+    h.update(np.ascontiguousarray(part[['Close', 'Volume']].to_numpy(dtype=np.float64)).tobytes())
+    return h.hexdigest()
+
+
+class ModelRegistry:
+    """
+    One stored state per (symbol, hyperparameters); the manifest records the fingerprint
+    and row count of the data it was fitted on, so lookup() can tell apart:
+      'hit'  - same data as the stored state
+      'warm' - the stored data is a prefix of the new data (new bars were appended)
+      'miss' - nothing usable stored
+    Loaded states and rendered results are kept in an in-memory LRU; on disk, least
+    recently used entries are evicted once the registry exceeds `max_bytes`.
+    runtime: 'keras' loads the saved Keras models; 'numpy' loads runtime.npz instead
+    (entries saved before it existed count as a miss).
+    """
+
+    def __init__(self, root, max_bytes=2 * 1024 ** 3, memory_entries=8, result_entries=64, runtime='keras'):
+        if runtime not in ('keras', 'numpy'):
+            raise ValueError(f"runtime must be 'keras' or 'numpy', got {runtime!r}")
+        self.root = root
+        self.runtime = runtime
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.result_entries = result_entries
+        self._lock = threading.Lock()
+        self._states = OrderedDict()    # entry_id -> (fingerprint, state)
+        self._results = OrderedDict()   # (entry_id, fingerprint, days) -> result dict
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def entry_id(symbol, params):
+        blob = json.dumps({'symbol': symbol, 'params': params}, sort_keys=True)
+        return hashlib.sha1(blob.encode()).hexdigest()[:20]
+
+    def _entry_dir(self, entry_id):
+        return os.path.join(self.root, entry_id)
+
+    def _read_manifest(self, entry_id):
+        try:
+            with open(os.path.join(self._entry_dir(entry_id), 'manifest.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remember(self, cache, key, value, limit):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > limit:
+            cache.popitem(last=False)
+
+    # ---- lookup
+    def lookup(self, symbol, params, df):
+        """
+        Returns: (status, state or None). 'warm' states are freshly loaded from disk, so the
+        caller may update them in place before save().
+        """
+        eid = self.entry_id(symbol, params)
+        fingerprint = data_fingerprint(df)
+        with self._lock:
+            mem = self._states.get(eid)
+            if mem is not None and mem[0] == fingerprint:
+                self._states.move_to_end(eid)
+                return 'hit', mem[1]
+
+        manifest = self._read_manifest(eid)
+        if manifest is None or manifest['n_rows'] > len(df):
+            return 'miss', None
+        if manifest['fingerprint'] == fingerprint:
+            status = 'hit'
+        elif data_fingerprint(df, manifest['n_rows']) == manifest['fingerprint']:
+            status = 'warm'
+        else:
+            return 'miss', None
+
+        state = self._load(eid, manifest)
+        if state is None:
+            return 'miss', None
+        os.utime(os.path.join(self._entry_dir(eid), 'manifest.json'))  # LRU clock for disk eviction
+        if status == 'hit':
+            with self._lock:
+                self._remember(self._states, eid, (fingerprint, state), self.memory_entries)
+        return status, state
+
+    def _load(self, eid, manifest):
+        d = self._entry_dir(eid)
+        try:
+            with open(os.path.join(d, 'arima.pkl'), 'rb') as f:
+                arima_model = pickle.load(f)
+            if self.runtime == 'numpy':
+                runtime = load_runtime(d)
+                return {
+                    'metrics': manifest['metrics'],
+                    'meta_model': runtime['meta_model'] or load_learner(d),
+                    'meta_learner': manifest.get('meta_learner'),
+                    'arima_model': arima_model,
+                    'lstm_model': runtime['lstm_model'],
+                    'feature_scaler': runtime['feature_scaler'],
+                    'target_scaler': runtime['target_scaler'],
+                    'time_step': manifest['time_step'],
+                    'n_rows': manifest['n_rows'],
+                    'warm_starts': manifest.get('warm_starts', 0),
+                    'lstm_residuals': manifest.get('lstm_residuals')
+                }
+            from tensorflow.keras.models import load_model
+            with open(os.path.join(d, 'scalers.pkl'), 'rb') as f:
+                scalers = pickle.load(f)
+            return {
+                'metrics': manifest['metrics'],
+                'meta_model': load_learner(d),
+                'meta_learner': manifest.get('meta_learner'),
+                'arima_model': arima_model,
+                'lstm_model': load_model(os.path.join(d, 'lstm.keras')),
+                'feature_scaler': scalers['feature'],
+                'target_scaler': scalers['target'],
+                'time_step': manifest['time_step'],
+                'n_rows': manifest['n_rows'],
+                'warm_starts': manifest.get('warm_starts', 0),
+                'lstm_residuals': manifest.get('lstm_residuals')
+            }
+        except Exception as e:
+            print(f"[Registry] failed to load entry {eid}:", e)
+            return None
+
+    def preload(self, limit):
+        """Load the `limit` most recently used entries into memory (e.g. during warm-up)."""
+        manifests = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name, 'manifest.json')
+            if os.path.isfile(path):
+                manifests.append((os.path.getmtime(path), name))
+        loaded = 0
+        for _, eid in sorted(manifests, reverse=True)[:limit]:
+            manifest = self._read_manifest(eid)
+            state = self._load(eid, manifest) if manifest else None
+            if state is not None:
+                with self._lock:
+                    self._remember(self._states, eid, (manifest['fingerprint'], state), self.memory_entries)
+                loaded += 1
+        return loaded
+
+    # ---- save
+    def save(self, symbol, params, df, state):
+        eid = self.entry_id(symbol, params)
+        fingerprint = data_fingerprint(df)
+        final = self._entry_dir(eid)
+        tmp = f"{final}.tmp-{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(tmp, exist_ok=True)
+        try:
+            state['lstm_model'].save(os.path.join(tmp, 'lstm.keras'))
+            state['meta_model'].save(tmp)
+            export_runtime(state, tmp)
+            with open(os.path.join(tmp, 'arima.pkl'), 'wb') as f:
+                pickle.dump(state['arima_model'], f, protocol=pickle.HIGHEST_PROTOCOL)
+            with open(os.path.join(tmp, 'scalers.pkl'), 'wb') as f:
+                pickle.dump({'feature': state['feature_scaler'], 'target': state['target_scaler']}, f)
+            manifest = {
+                'symbol': symbol,
+                'params': params,
+                'fingerprint': fingerprint,
+                'n_rows': len(df),
+                'last_bar': df.index[-1].isoformat(),
+                'time_step': state['time_step'],
+                'metrics': state['metrics'],
+                'meta_learner': state.get('meta_learner'),
+                'warm_starts': state.get('warm_starts', 0),
+                'lstm_residuals': state.get('lstm_residuals'),
+                'saved_at': time.time()
+            }
+            with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f)
+            # swap directories: a concurrent reader sees either the old or the new entry
+            old = f"{final}.old-{os.getpid()}-{threading.get_ident()}"
+            if os.path.exists(final):
+                os.replace(final, old)
+            os.replace(tmp, final)
+            shutil.rmtree(old, ignore_errors=True)
+        except Exception as e:
+            print(f"[Registry] failed to save entry {eid}:", e)
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        with self._lock:
+            self._remember(self._states, eid, (fingerprint, state), self.memory_entries)
+        self._enforce_budget()
+
+    def _enforce_budget(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            d = os.path.join(self.root, name)
+            manifest = os.path.join(d, 'manifest.json')
+            if not os.path.isfile(manifest):
+                continue
+            size = sum(os.path.getsize(os.path.join(d, f)) for f in os.listdir(d))
+            entries.append((os.path.getmtime(manifest), name, size))
+            total += size
+        for _, name, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+            with self._lock:
+                self._states.pop(name, None)
+            total -= size
+            print(f"[Registry] evicted {name} ({size / 1e6:.1f} MB)")
+
+    # ---- rendered results
+    def cached_result(self, symbol, params, df, days, variant=None):
+        key = (self.entry_id(symbol, params), data_fingerprint(df), days, variant)
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+            return result
+
+    def store_result(self, symbol, params, df, days, result, variant=None):
+        key = (self.entry_id(symbol, params), data_fingerprint(df), days, variant)
+        with self._lock:
+            self._remember(self._results, key, result, self.result_entries)
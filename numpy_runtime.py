@@ -0,0 +1,274 @@
+# numpy_runtime.py
+# TensorFlow-free inference for fitted pipeline states. export_runtime() writes the LSTM
+# weights (LSTM cell + Dense head), the Keras meta NN layers and the MinMax scaler
+# parameters of a state to one runtime.npz; load_runtime() reads them back into NumPy
+# objects that forecast_from_state can use in place of the Keras models, so a read-only
+# replica serving registry entries never imports TensorFlow.
+
+import os
+import json
+
+import numpy as np
+
+RUNTIME_FILE = 'runtime.npz'
+FORMAT_VERSION = 1
+
+_ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0.0),
+    'tanh': np.tanh,
+    'sigmoid': lambda x: 1.0 / (1.0 + np.exp(-x)),
+}
+
+
+def _activation_name(layer):
+    name = layer.get_config().get('activation', 'linear')
+    if name not in _ACTIVATIONS:
+        raise ValueError(f"{layer.name}: activation {name!r} is not supported by the NumPy runtime")
+    return name
+
+
+class AffineScaler:
+    """MinMaxScaler stand-in: transform(X) = X * scale + min (the fitted sklearn attributes)."""
+
+    def __init__(self, scale, min_):
+        self.scale_ = np.asarray(scale, dtype=np.float64)
+        self.min_ = np.asarray(min_, dtype=np.float64)
+
+    @classmethod
+    def from_sklearn(cls, scaler):
+        return cls(scaler.scale_, scaler.min_)
+
+    def transform(self, X):
+        return np.asarray(X, dtype=np.float64) * self.scale_ + self.min_
+
+    def inverse_transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.min_) / self.scale_
+
+
+class DenseStack:
+    """Dense layers as [(kernel, bias, activation)]; Dropout is an identity at inference."""
+
+    def __init__(self, layers):
+        self.layers = layers
+
+    @classmethod
+    def from_keras(cls, layers):
+        stack = []
+        for layer in layers:
+            kind = type(layer).__name__
+            if kind == 'Dropout':
+                continue
+            if kind != 'Dense':
+                raise ValueError(f"{layer.name}: {kind} layers are not supported by the NumPy runtime")
+            kernel, bias = layer.get_weights()
+            stack.append((kernel, bias, _activation_name(layer)))
+        return cls(stack)
+
+    def __call__(self, x):
+        for kernel, bias, activation in self.layers:
+            x = _ACTIVATIONS[activation](x @ kernel + bias)
+        return x
+
+    def predict(self, X):
+        """Meta-learner interface: 1-D array with one prediction per row of X."""
+        return self(np.asarray(X, dtype=np.float64)).ravel()
+
+    def arrays(self, prefix):
+        out = {}
+        for i, (kernel, bias, _) in enumerate(self.layers):
+            out[f'{prefix}/{i}/kernel'] = kernel
+            out[f'{prefix}/{i}/bias'] = bias
+        return out
+
+    @classmethod
+    def from_arrays(cls, data, prefix, activations):
+        return cls([(data[f'{prefix}/{i}/kernel'], data[f'{prefix}/{i}/bias'], activation)
+                    for i, activation in enumerate(activations)])
+
+
+class NumpyLSTM:
+    """
+    Forward pass of the train_lstm_model network: one Keras LSTM layer (gates i, f, c, o;
+    tanh / sigmoid) returning its last hidden state, then the Dense head. Computes in
+    float32 like Keras (float64 is about twice as slow and no closer in practice).
+    `dropout` is the rate of the Dropout layer between the two, used only for MC dropout
+    sampling (None when unknown or when the network drops out anywhere else).
+    """
+
+    def __init__(self, kernel, recurrent_kernel, bias, head, dtype=np.float32, dropout=None):
+        self.kernel = np.asarray(kernel, dtype=np.float64)                  # (features, 4 * units)
+        self.recurrent_kernel = np.asarray(recurrent_kernel, dtype=np.float64)  # (units, 4 * units)
+        self.bias = np.asarray(bias, dtype=np.float64)                      # (4 * units,)
+        self.units = self.recurrent_kernel.shape[0]
+        self.head = head
+        self.dropout = dropout
+        # columns regrouped as (i, f, o, c) and the sigmoid gates pre-scaled by 0.5, so one tanh
+        # covers all four gates: sigmoid(x) = 0.5 * tanh(0.5 * x) + 0.5
+        u = self.units
+        order = np.r_[0:2 * u, 3 * u:4 * u, 2 * u:3 * u]
+        scale = np.r_[np.full(3 * u, 0.5), np.ones(u)]
+        self.dtype = dtype
+        self._kernel = (self.kernel[:, order] * scale).astype(dtype)
+        self._recurrent = (self.recurrent_kernel[:, order] * scale).astype(dtype)
+        self._bias = (self.bias[order] * scale).astype(dtype)
+
+    @classmethod
+    def from_keras(cls, model):
+        lstm, rest = model.layers[0], model.layers[1:]
+        if type(lstm).__name__ != 'LSTM':
+            raise ValueError(f"first layer must be an LSTM, got {type(lstm).__name__}")
+        config = lstm.get_config()
+        if config.get('activation') != 'tanh' or config.get('recurrent_activation') != 'sigmoid' \
+                or config.get('return_sequences') or config.get('go_backwards') or not config.get('use_bias', True):
+            raise ValueError("only a tanh/sigmoid LSTM with bias returning its last state is supported")
+        kernel, recurrent_kernel, bias = lstm.get_weights()
+        dropouts = [i for i, layer in enumerate(rest) if type(layer).__name__ == 'Dropout']
+        dropout = None
+        if not config.get('dropout') and not config.get('recurrent_dropout') and dropouts in ([], [0]):
+            dropout = rest[0].rate if dropouts else 0.0
+        return cls(kernel, recurrent_kernel, bias, DenseStack.from_keras(rest), dropout=dropout)
+
+    def _cell(self, projected_t, h, c, z):
+        """One LSTM step for a batch; z is a (batch, 4 * units) scratch buffer. Returns: (h, c)"""
+        units = self.units
+        np.matmul(h, self._recurrent, out=z)
+        z += projected_t
+        np.tanh(z, out=z)
+        sig = z[:, :3 * units] * 0.5 + 0.5
+        c = sig[:, units:2 * units] * c + sig[:, :units] * z[:, 3 * units:]
+        return sig[:, 2 * units:] * np.tanh(c), c
+
+    def _last_hidden(self, projected, h=None, c=None):
+        """projected: (batch, time_step, 4 * units) = inputs @ _kernel + _bias; h, c: initial state (zeros)"""
+        batch, units = projected.shape[0], self.units
+        if h is None:
+            h = np.zeros((batch, units), dtype=self.dtype)
+            c = np.zeros((batch, units), dtype=self.dtype)
+        z = np.empty((batch, 4 * units), dtype=self.dtype)
+        for t in range(projected.shape[1]):
+            h, c = self._cell(projected[:, t], h, c, z)
+        return h
+
+    def __call__(self, windows):
+        """windows: (batch, time_step, features) -> (batch, 1)"""
+        windows = np.asarray(windows, dtype=self.dtype)
+        return self.head(self._last_hidden(windows @ self._kernel + self._bias))
+
+    def rollout(self, windows, steps):
+        """
+        Recursive forecast of forecast_engine.rollout_scaled: feature 0 of each new step is
+        the prediction, the others are carried forward. Input projections are computed once
+        per step into one buffer that the window slides over.
+        Returns: array (batch, steps) of scaled predictions
+        """
+        windows = np.asarray(windows, dtype=self.dtype)
+        if windows.ndim == 2:
+            windows = windows[None, ...]
+        batch, time_step = windows.shape[:2]
+        projected = np.empty((batch, time_step + steps, 4 * self.units), dtype=self.dtype)
+        projected[:, :time_step] = windows @ self._kernel + self._bias
+        carried = windows[:, -1, 1:] @ self._kernel[1:] + self._bias  # constant part of every new step
+        preds = np.empty((batch, steps))
+        for s in range(steps):
+            pred = self.head(self._last_hidden(projected[:, s:s + time_step]))[:, 0]
+            preds[:, s] = pred
+            projected[:, time_step + s] = pred[:, None] * self._kernel[0] + carried
+        return preds
+
+    def sample_paths(self, window, steps, paths, noise=None, dropout_rng=None):
+        """
+        Monte Carlo rollout() of one window: `paths` recursions that differ by noise[:, s]
+        added to step s before it is fed back (residual bootstrap) and/or, with dropout_rng,
+        a fresh dropout mask on the LSTM output per path and step (MC dropout). The paths
+        share the observed part of every sliding window, so the LSTM state over it is run
+        once (all steps in one batch) and only the fed-back suffix runs at batch `paths`.
+        window: (time_step, features) scaled; noise: (paths, steps) scaled
+        Returns: array (paths, steps) of scaled predictions
+        """
+        if dropout_rng is not None and self.dropout is None:
+            raise ValueError("MC dropout needs the dropout rate, which this model does not record")
+        window = np.asarray(window, dtype=self.dtype)
+        time_step, units = window.shape[0], self.units
+        observed = window @ self._kernel + self._bias
+        carried = window[-1, 1:] @ self._kernel[1:] + self._bias
+        # row s: state after observed[s:], i.e. the shared head of the window at step s
+        shared = min(steps, time_step)
+        h = np.zeros((shared, units), dtype=self.dtype)
+        c = np.zeros((shared, units), dtype=self.dtype)
+        z = np.empty((shared, 4 * units), dtype=self.dtype)
+        for t in range(time_step):
+            h, c = self._cell(observed[t], h, c, z)
+            h[t + 1:] = 0.0  # rows that start later stay at the zero state
+            c[t + 1:] = 0.0
+        fed = np.empty((paths, steps, 4 * units), dtype=self.dtype)  # projections of fed-back steps
+        preds = np.empty((paths, steps))
+        for s in range(steps):
+            if s < time_step:
+                out = self._last_hidden(fed[:, :s], np.broadcast_to(h[s], (paths, units)),
+                                        np.broadcast_to(c[s], (paths, units)))
+            else:
+                out = self._last_hidden(fed[:, s - time_step:s])
+            if dropout_rng is not None and self.dropout:
+                keep = 1.0 - self.dropout
+                out = out * (dropout_rng.random(out.shape, dtype=np.float32) < keep) / np.float32(keep)
+            pred = self.head(out)[:, 0]
+            if noise is not None:
+                pred = pred + noise[:, s]
+            preds[:, s] = pred
+            fed[:, s] = pred[:, None] * self._kernel[0] + carried
+        return preds
+
+    def arrays(self, prefix):
+        return dict({f'{prefix}/kernel': self.kernel, f'{prefix}/recurrent_kernel': self.recurrent_kernel,
+                     f'{prefix}/bias': self.bias}, **self.head.arrays(f'{prefix}/head'))
+
+    @classmethod
+    def from_arrays(cls, data, prefix, head_activations, dropout=None):
+        return cls(data[f'{prefix}/kernel'], data[f'{prefix}/recurrent_kernel'], data[f'{prefix}/bias'],
+                   DenseStack.from_arrays(data, f'{prefix}/head', head_activations), dropout=dropout)
+
+
+def export_runtime(state, directory):
+    """
+    Write runtime.npz for a fitted state (fit_pipeline or the registry) into `directory`.
+    The meta model is included when it is the Keras NN; the NumPy meta learners already
+    save themselves as meta.json.
+    """
+    lstm = state['lstm_model']
+    lstm = lstm if isinstance(lstm, NumpyLSTM) else NumpyLSTM.from_keras(lstm)
+    config = {'version': FORMAT_VERSION, 'time_step': state['time_step'],
+              'lstm_head': [a for _, _, a in lstm.head.layers], 'lstm_dropout': lstm.dropout, 'meta': None}
+    arrays = lstm.arrays('lstm')
+    for name in ('feature', 'target'):
+        scaler = state[f'{name}_scaler']
+        arrays[f'{name}_scaler/scale'] = scaler.scale_
+        arrays[f'{name}_scaler/min'] = scaler.min_
+    meta = state['meta_model']
+    meta = getattr(meta, 'model', meta)  # KerasMetaLearner wraps the network
+    if isinstance(meta, DenseStack) or hasattr(meta, 'layers'):
+        stack = meta if isinstance(meta, DenseStack) else DenseStack.from_keras(meta.layers)
+        config['meta'] = [a for _, _, a in stack.layers]
+        arrays.update(stack.arrays('meta'))
+    path = os.path.join(directory, RUNTIME_FILE)
+    np.savez(path, config=np.array(json.dumps(config)), **arrays)
+    return path
+
+
+def load_runtime(directory):
+    """
+    Returns: dict with 'time_step', 'lstm_model' (NumpyLSTM), 'feature_scaler' and
+    'target_scaler' (AffineScaler), and 'meta_model' (DenseStack, or None when the meta
+    learner is stored separately). Raises OSError when the directory has no runtime.npz.
+    """
+    with np.load(os.path.join(directory, RUNTIME_FILE), allow_pickle=False) as data:
+        config = json.loads(str(data['config']))
+        if config['version'] != FORMAT_VERSION:
+            raise ValueError(f"unsupported runtime format {config['version']}")
+        return {
+            'time_step': config['time_step'],
+            'lstm_model': NumpyLSTM.from_arrays(data, 'lstm', config['lstm_head'], config.get('lstm_dropout')),
+            'feature_scaler': AffineScaler(data['feature_scaler/scale'], data['feature_scaler/min']),
+            'target_scaler': AffineScaler(data['target_scaler/scale'], data['target_scaler/min']),
+            'meta_model': DenseStack.from_arrays(data, 'meta', config['meta']) if config['meta'] else None,
+        }
@@ -0,0 +1,167 @@
+# ohlcv_store.py
+# Local on-disk candle store. One memory-mapped .npy file per (source, symbol, interval)
+# holds [epoch_seconds, Open, High, Low, Close, Volume] rows; only bars newer than the
+# last stored timestamp are fetched from the network and merged in.
+
+import os
+import json
+import time
+import fcntl
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+_COL_OFFSET = 1  # column 0 of the stored array is the timestamp
+
+
+class OHLCVStore:
+    """
+    Incrementally updated candle cache.
+
+    get() serves the cached frame without touching the network while the last sync is
+    younger than `max_age` seconds (or always, when `offline` is set); otherwise it asks
+    `fetch(start)` for bars from the last stored timestamp onward, merges them and
+    atomically replaces the file. Frames returned by read()/get() are read-only views
+    over the memory-mapped file.
+    """
+
+    def __init__(self, root, max_age=6 * 3600, offline=False):
+        self.root = root
+        self.max_age = max_age
+        self.offline = offline
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    # ---- paths & locking
+    def _dir(self, source, symbol, interval):
+        safe = symbol.replace('/', '_')
+        return os.path.join(self.root, source, interval, safe)
+
+    def _lock(self, key):
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _read_meta(self, d):
+        try:
+            with open(os.path.join(d, 'meta.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    # ---- reads
+    def read(self, source, symbol, interval, columns=None):
+        """
+        Returns: DataFrame indexed by timestamp (naive, exchange wall-clock) or None.
+        `columns` must be a contiguous run of OHLCV_COLUMNS for the result to stay zero-copy.
+        """
+        path = os.path.join(self._dir(source, symbol, interval), 'bars.npy')
+        if not os.path.exists(path):
+            return None
+        bars = np.load(path, mmap_mode='r')
+        if bars.shape[0] == 0:
+            return None
+        columns = list(columns or OHLCV_COLUMNS)
+        first = OHLCV_COLUMNS.index(columns[0])
+        if columns == OHLCV_COLUMNS[first:first + len(columns)]:
+            values = bars[:, _COL_OFFSET + first:_COL_OFFSET + first + len(columns)]
+        else:
+            values = bars[:, [_COL_OFFSET + OHLCV_COLUMNS.index(c) for c in columns]]
+        index = pd.DatetimeIndex(bars[:, 0].astype('int64') * 10**9, name='timestamp')
+        return pd.DataFrame(values, index=index, columns=columns, copy=False)
+
+    def last_timestamp(self, source, symbol, interval):
+        path = os.path.join(self._dir(source, symbol, interval), 'bars.npy')
+        if not os.path.exists(path):
+            return None
+        bars = np.load(path, mmap_mode='r')
+        if bars.shape[0] == 0:
+            return None
+        return pd.Timestamp(int(bars[-1, 0]), unit='s')
+
+    def is_fresh(self, source, symbol, interval):
+        meta = self._read_meta(self._dir(source, symbol, interval))
+        synced_at = meta.get('synced_at')
+        return synced_at is not None and time.time() - synced_at < self.max_age
+
+    # ---- writes
+    @staticmethod
+    def _to_rows(df):
+        df = df.copy()
+        if isinstance(df.columns, pd.MultiIndex):
+            # yfinance >= 0.2.5x returns (field, ticker) columns for single tickers
+            df.columns = df.columns.get_level_values(0)
+        idx = pd.DatetimeIndex(df.index)
+        if idx.tz is not None:
+            idx = idx.tz_localize(None)
+        rows = np.full((len(df), 1 + len(OHLCV_COLUMNS)), np.nan, dtype=np.float64)
+        rows[:, 0] = idx.asi8 // 10**9
+        for i, col in enumerate(OHLCV_COLUMNS):
+            if col in df.columns:
+                rows[:, _COL_OFFSET + i] = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64)
+        keep = ~np.isnan(rows[:, _COL_OFFSET + 3]) & ~np.isnan(rows[:, _COL_OFFSET + 4])
+        rows = rows[keep]
+        rows = rows[np.argsort(rows[:, 0], kind='stable')]
+        # duplicate timestamps inside one fetch: keep the last (most recent) bar
+        return rows[np.append(rows[1:, 0] != rows[:-1, 0], True)]
+
+    def merge(self, source, symbol, interval, df_new):
+        """Merge fetched bars into the store; bars at or after the first new timestamp are replaced."""
+        d = self._dir(source, symbol, interval)
+        os.makedirs(d, exist_ok=True)
+        path = os.path.join(d, 'bars.npy')
+        with open(os.path.join(d, '.lock'), 'w') as lock_file:
+            # cross-process lock: several API workers may share the same store directory
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            new_rows = self._to_rows(df_new) if df_new is not None and len(df_new) else None
+            if new_rows is not None and len(new_rows):
+                if os.path.exists(path):
+                    old = np.load(path, mmap_mode='r')
+                    cut = np.searchsorted(old[:, 0], new_rows[0, 0], side='left')
+                    merged = np.concatenate([old[:cut], new_rows])
+                else:
+                    merged = new_rows
+                tmp = path + f'.{os.getpid()}.tmp'
+                with open(tmp, 'wb') as f:
+                    np.save(f, np.ascontiguousarray(merged))
+                os.replace(tmp, path)  # readers holding the old mmap keep the old inode
+            meta = {'synced_at': time.time(), 'source': source, 'symbol': symbol, 'interval': interval}
+            tmp_meta = os.path.join(d, f'meta.json.{os.getpid()}.tmp')
+            with open(tmp_meta, 'w') as f:
+                json.dump(meta, f)
+            os.replace(tmp_meta, os.path.join(d, 'meta.json'))
+
+    # ---- read-through
+    def get(self, source, symbol, interval, fetch, start, columns=None):
+        """
+        fetch: callable(start: datetime) -> DataFrame of OHLCV bars (or None on failure)
+        start: first timestamp to request when the store is empty
+        Returns: (DataFrame or None, cache_status) with cache_status in {'hit', 'offline', 'updated', 'stale', 'miss'}
+        """
+        key = (source, symbol, interval)
+        with self._lock(key):
+            cached = self.read(source, symbol, interval, columns)
+            if self.offline:
+                return cached, 'offline'
+            if cached is not None and self.is_fresh(source, symbol, interval):
+                return cached, 'hit'
+
+            last = self.last_timestamp(source, symbol, interval)
+            fetch_from = last.to_pydatetime() if last is not None else start
+            try:
+                df_new = fetch(fetch_from)
+            except Exception as e:
+                print(f"[OHLCVStore] fetch failed for {symbol} ({source}):", e)
+                df_new = None
+            if df_new is None:
+                # network failure: serve what we have rather than nothing
+                return cached, 'stale' if cached is not None else 'miss'
+            self.merge(source, symbol, interval, df_new)
+            return self.read(source, symbol, interval, columns), 'updated'
+
+
+def default_start(years=15, now=None):
+    now = now or datetime.now()
+    return (now - timedelta(days=365 * years)).replace(hour=9, minute=15, second=0, microsecond=0)
@@ -0,0 +1,197 @@
+# response_cache.py
+# HTTP-level cache of rendered /api/forecast responses. A daily forecast cannot change
+# until a new candle closes, so a response is keyed by the request (symbol, forecast_days,
+# pipeline hyperparameters) and the latest bar of the data it was computed from. Entries
+# live in a bounded in-memory LRU and, optionally, in a directory shared by every API
+# worker process; concurrent misses for one key wait for a single computation.
+
+import os
+import json
+import time
+import fcntl
+import hashlib
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+
+
+def cache_key(**parts):
+    """Stable hex key over JSON-serialisable request parts."""
+    blob = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode()).hexdigest()
+
+
+def etag_for(key):
+    # weak: a recomputed response for the same key is equivalent, not byte-identical
+    return f'W/"{key[:32]}"'
+
+
+def http_date(ts):
+    return formatdate(ts, usegmt=True)
+
+
+def not_modified(etag, last_modified, if_none_match=None, if_modified_since=None):
+    """
+    True when a conditional request can be answered with 304. If-None-Match wins over
+    If-Modified-Since (RFC 9110); ETags are compared weakly.
+    """
+    if if_none_match:
+        if if_none_match.strip() == '*':
+            return True
+        strip = lambda tag: tag.strip().removeprefix('W/')
+        return strip(etag) in {strip(tag) for tag in if_none_match.split(',')}
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+class ResponseCache:
+    """
+    Entries are {'body': bytes, 'created_at': epoch seconds}.
+
+    get_or_compute(key, compute) returns (entry, status) with status in
+      'hit'    - served from memory
+      'disk'   - served from the shared directory (and promoted to memory)
+      'shared' - another thread or process computed it while this request waited
+      'miss'   - computed by this request
+    `compute()` returns the body bytes; exceptions propagate and nothing is cached.
+    Disk entries older than `disk_max_age` seconds are swept at most once per `sweep_every`.
+    """
+
+    def __init__(self, root=None, memory_entries=256, disk_max_age=3 * 86400, sweep_every=3600):
+        self.root = root or None
+        self.memory_entries = memory_entries
+        self.disk_max_age = disk_max_age
+        self.sweep_every = sweep_every
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> entry
+        self._inflight = {}           # key -> [lock, users]
+        self._last_sweep = 0.0
+        if self.root:
+            os.makedirs(self.root, exist_ok=True)
+
+    # ---- tiers
+    def _path(self, key, suffix='.body'):
+        return os.path.join(self.root, key[:2], key + suffix)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _read_disk(self, key):
+        if not self.root:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+            created_at = os.path.getmtime(path)
+        except OSError:
+            return None
+        if time.time() - created_at > self.disk_max_age:
+            return None
+        return {'body': body, 'created_at': created_at}
+
+    def _write_disk(self, key, entry):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(entry['body'])
+        os.utime(tmp, (entry['created_at'], entry['created_at']))
+        os.replace(tmp, path)
+
+    def lookup(self, key):
+        """Returns: (entry, 'hit' | 'disk') from either tier, or (None, None); never computes."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry, 'hit'
+        entry = self._read_disk(key)
+        if entry is not None:
+            self._remember(key, entry)
+            return entry, 'disk'
+        return None, None
+
+    def put(self, key, body, created_at=None):
+        entry = {'body': body, 'created_at': created_at or time.time()}
+        self._remember(key, entry)
+        if self.root:
+            try:
+                self._write_disk(key, entry)
+            except OSError as e:
+                print("[ResponseCache] disk write failed:", e)
+            self._maybe_sweep()
+        return entry
+
+    def _maybe_sweep(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < self.sweep_every:
+                return
+            self._last_sweep = now
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                try:
+                    if now - os.path.getmtime(path) > self.disk_max_age:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    # ---- single flight
+    def _acquire_slot(self, key):
+        with self._lock:
+            slot = self._inflight.setdefault(key, [threading.Lock(), 0])
+            slot[1] += 1
+        return slot
+
+    def _release_slot(self, key, slot):
+        with self._lock:
+            slot[1] -= 1
+            if slot[1] == 0:
+                self._inflight.pop(key, None)
+
+    def get_or_compute(self, key, compute):
+        entry, status = self.lookup(key)
+        if entry is not None:
+            return entry, status
+
+        slot = self._acquire_slot(key)
+        try:
+            waited = not slot[0].acquire(blocking=False)
+            if waited:
+                slot[0].acquire()  # another thread of this process is computing the same key
+            try:
+                if waited:
+                    entry = self.lookup(key)[0]
+                    if entry is not None:
+                        return entry, 'shared'
+                if not self.root:
+                    return self.put(key, compute()), 'miss'
+                # cross-process: the first worker computes, the others block on the lock file and then read its entry
+                lock_path = self._path(key, '.lock')
+                os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+                with open(lock_path, 'w') as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)  # released when the file is closed
+                    entry = self._read_disk(key)
+                    if entry is not None:
+                        self._remember(key, entry)
+                        return entry, 'shared'
+                    return self.put(key, compute()), 'miss'
+            finally:
+                slot[0].release()
+        finally:
+            self._release_slot(key, slot)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
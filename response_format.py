@@ -0,0 +1,143 @@
+# response_format.py
+# Opt-in v2 encoding of forecast responses. v1 (the default) repeats the history snippet
+# under every model as {'date', 'value'} dicts; v2 is column-oriented: dates are sent once
+# per section, each model is one float array rounded to `precision` decimals, and the body
+# is encoded with orjson (float32 arrays) or, when installed, as MessagePack or Arrow IPC.
+
+import json
+import importlib.util
+
+import numpy as np
+
+V2_JSON = 'application/vnd.stockforecast.v2+json'
+V2_MSGPACK = 'application/vnd.stockforecast.v2+msgpack'
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+
+# ?format= value / Accept media type -> encoding
+FORMAT_ALIASES = {'v1': 'v1', 'json': 'v1', 'v2': 'v2+json', 'v2+json': 'v2+json',
+                  'msgpack': 'v2+msgpack', 'v2+msgpack': 'v2+msgpack', 'arrow': 'v2+arrow', 'v2+arrow': 'v2+arrow'}
+MEDIA_TYPES = {V2_JSON: 'v2+json', V2_MSGPACK: 'v2+msgpack', 'application/msgpack': 'v2+msgpack',
+               'application/x-msgpack': 'v2+msgpack', ARROW_STREAM: 'v2+arrow'}
+CONTENT_TYPES = {'v1': 'application/json', 'v2+json': V2_JSON, 'v2+msgpack': V2_MSGPACK, 'v2+arrow': ARROW_STREAM}
+_ENCODER_MODULES = {'v2+msgpack': 'msgpack', 'v2+arrow': 'pyarrow'}
+
+try:
+    import orjson  # optional: several times faster than json.dumps and serializes NumPy arrays directly
+except ImportError:
+    orjson = None
+MODELS = ('meta', 'arima', 'lstm')
+INTERVAL_BANDS = ('p10', 'p50', 'p90')
+
+
+def negotiate(format_arg=None, accept=None):
+    """
+    Pick the encoding from ?format= (wins) or the Accept header; v1 when neither asks for v2.
+    Returns: (encoding, error) with encoding in CONTENT_TYPES
+    """
+    if format_arg:
+        encoding = FORMAT_ALIASES.get(format_arg.lower())
+        if encoding is None:
+            return None, f"format must be one of {sorted(set(FORMAT_ALIASES))}"
+    else:
+        encoding = 'v1'
+        for part in (accept or '').split(','):
+            media = part.split(';')[0].strip().lower()
+            if media in MEDIA_TYPES:
+                encoding = MEDIA_TYPES[media]
+                break
+    module = _ENCODER_MODULES.get(encoding)
+    if module and importlib.util.find_spec(module) is None:
+        return None, f"{encoding} needs the optional '{module}' package, which is not installed"
+    return encoding, None
+
+
+def _column(values, precision):
+    return np.round(np.asarray(values, dtype=np.float64), precision)
+
+
+def to_v2(response, precision=4):
+    """
+    v1 forecast response dict -> v2 dict with NumPy float columns:
+      historical: {dates, close}; forecast: {dates, meta, arima, lstm} plus <model>_p10/_p50/_p90
+      columns when the forecast has intervals; metrics: {model: {...}};
+      meta_learner: the stacking learner's name and fit time
+    Other top-level fields (data_source, live_quote, data_range, ...) are kept as they are.
+    """
+    results = response['results']
+    first = results[MODELS[0]]
+    out = {k: v for k, v in response.items() if k not in ('results', 'historical')}
+    out['version'] = 2
+    out['precision'] = precision
+    history = first['historical']
+    out['historical'] = {'dates': [p['date'] for p in history],
+                         'close': _column([p['value'] for p in history], precision)}
+    out['forecast'] = {'dates': [p['date'] for p in first['predictions']]}
+    out['forecast'].update({name: _column([p['value'] for p in results[name]['predictions']], precision)
+                            for name in MODELS})
+    for name in MODELS:
+        bands = results[name].get('intervals')
+        if bands:
+            out['forecast'].update({f'{name}_{band}': _column([p[band] for p in bands], precision)
+                                    for band in INTERVAL_BANDS})
+    out['metrics'] = {name: results[name]['metrics'] for name in MODELS}
+    out['meta_learner'] = results['meta'].get('learner')
+    return out
+
+
+def _plain(obj):
+    """NumPy arrays and scalars -> plain Python values, for encoders without NumPy support."""
+    if isinstance(obj, dict):
+        return {k: _plain(v) for k, v in obj.items()}
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (np.floating, np.integer)):
+        return obj.item()
+    return obj
+
+
+def encode(response, encoding, precision=4):
+    """Returns: (body bytes, content type) of a v1 forecast response dict in a v2 encoding."""
+    v2 = to_v2(response, precision)
+    if encoding == 'v2+json':
+        if orjson is not None:
+            # float32 columns are written with the shortest float32 repr (no 1493.2800000000002 tails)
+            columns = {section: {k: v.astype(np.float32) if isinstance(v, np.ndarray) else v
+                                 for k, v in v2[section].items()} for section in ('historical', 'forecast')}
+            return orjson.dumps(dict(v2, **columns), option=orjson.OPT_SERIALIZE_NUMPY), V2_JSON
+        return json.dumps(_plain(v2), separators=(',', ':')).encode(), V2_JSON
+    if encoding == 'v2+msgpack':
+        import msgpack
+        return msgpack.packb(_plain(v2), use_single_float=True), V2_MSGPACK
+    if encoding == 'v2+arrow':
+        return _arrow_stream(v2), ARROW_STREAM
+    raise ValueError(f"unknown encoding {encoding!r}")
+
+
+def _arrow_stream(v2):
+    """
+    One record batch with a row per date: section ('historical' | 'forecast'), date, close,
+    meta, arima, lstm and any <model>_p10/_p50/_p90 columns (nulls where a column does not
+    apply); the remaining fields travel as JSON in the schema metadata under b'forecast'.
+    """
+    import pyarrow as pa
+    hist, fc = v2['historical'], v2['forecast']
+    n_hist, n_fc = len(hist['dates']), len(fc['dates'])
+    nulls = lambda n: pa.nulls(n, pa.float32())
+
+    def column(hist_values, fc_values):
+        parts = [pa.array(hist_values, pa.float32()) if hist_values is not None else nulls(n_hist),
+                 pa.array(fc_values, pa.float32()) if fc_values is not None else nulls(n_fc)]
+        return pa.concat_arrays(parts)
+
+    batch = pa.record_batch({
+        'section': pa.array(['historical'] * n_hist + ['forecast'] * n_fc).dictionary_encode(),
+        'date': pa.array(hist['dates'] + fc['dates']),
+        'close': column(hist['close'], None),
+        **{name: column(None, values) for name, values in fc.items() if name != 'dates'},
+    })
+    meta = {k: v for k, v in v2.items() if k not in ('historical', 'forecast')}
+    batch = batch.replace_schema_metadata({b'forecast': json.dumps(_plain(meta)).encode()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,70 @@
+# sequence_windows.py
+# Zero-copy sliding windows over the scaled feature matrix, plus a batched Keras
+# feeder so training never materializes the full (samples, time_step, features) tensor.
+
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def sliding_windows(features_scaled, target_scaled, time_step):
+    """
+    Strided, read-only equivalent of the notebook's sequence loop:
+      X[i] = features_scaled[i:i + time_step, :]   shape (n - time_step, time_step, features)
+      y[i] = target_scaled[i + time_step, 0]       shape (n - time_step, 1)
+    Both are views into the inputs; nothing is copied.
+    """
+    features = np.asarray(features_scaled)
+    target = np.asarray(target_scaled)
+    n_samples = max(0, len(features) - time_step)
+    if n_samples == 0:
+        X = np.empty((0, time_step, features.shape[1]), dtype=features.dtype)
+        y = np.empty((0, 1), dtype=target.dtype)
+    else:
+        # (n - time_step + 1, features, time_step) -> drop the last window, put time before features
+        X = sliding_window_view(features, time_step, axis=0)[:n_samples].transpose(0, 2, 1)
+        y = target[time_step:, :1].view()
+    y.flags.writeable = False
+    return X, y
+
+
+def validation_split_index(n_samples, val_split):
+    # same rule Keras uses for `validation_split` on arrays (tail of the data is validation)
+    if not val_split:
+        return n_samples
+    return int(math.floor(n_samples * (1.0 - val_split)))
+
+
+_window_batches_cls = None
+
+
+def window_batches(X, y, batch_size=32):
+    """
+    Keras PyDataset that feeds windowed views one batch at a time, in order, copying only
+    `batch_size` windows per step into a contiguous float32 block. Pass shuffle=False to
+    fit(): Keras shuffles PyDataset batches by default.
+    """
+    global _window_batches_cls
+    if _window_batches_cls is None:
+        # defined on first use so importing this module does not import TensorFlow
+        from tensorflow.keras.utils import PyDataset
+
+        class WindowBatches(PyDataset):
+            def __init__(self, X, y, batch_size=32, **kwargs):
+                super().__init__(**kwargs)
+                self.X = X
+                self.y = y
+                self.batch_size = batch_size
+
+            def __len__(self):
+                return math.ceil(len(self.X) / self.batch_size)
+
+            def __getitem__(self, idx):
+                start = idx * self.batch_size
+                stop = min(start + self.batch_size, len(self.X))
+                return (np.ascontiguousarray(self.X[start:stop], dtype=np.float32),
+                        np.ascontiguousarray(self.y[start:stop], dtype=np.float32))
+
+        _window_batches_cls = WindowBatches
+    return _window_batches_cls(X, y, batch_size=batch_size)
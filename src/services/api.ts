@@ -1,7 +1,14 @@
 import { z } from 'zod';
 
 // API schemas
-const StockSchema = z.object({ symbol: z.string(), name: z.string() });
+const StockSchema = z.object({
+  symbol: z.string(),
+  name: z.string(),
+  // present on /api/stocks?q= search results
+  token: z.string().optional(),
+  exchange: z.string().optional(),
+  segment: z.string().optional(),
+});
 
 const ModelResultSchema = z.object({
   predictions: z.array(z.object({ date: z.string(), value: z.number() })),
@@ -12,6 +19,10 @@ const ModelResultSchema = z.object({
     accuracy_pct: z.number(),
   }),
   historical: z.array(z.object({ date: z.string(), value: z.number() })),
+  // fitted (p, d, q), on the ARIMA result only
+  order: z.array(z.number()).nullable().optional(),
+  // present when the request sets `intervals`
+  intervals: z.array(z.object({ date: z.string(), p10: z.number(), p50: z.number(), p90: z.number() })).optional(),
 });
 
 const ForecastResponseSchema = z.object({
@@ -31,11 +42,36 @@ export type ForecastResponse = z.infer<typeof ForecastResponseSchema>;
 export type StocksResponse = z.infer<typeof StocksResponseSchema>;
 export type HealthResponse = z.infer<typeof HealthResponseSchema>;
 
+export type ForecastStreamEvent =
+  | 'started'
+  | 'queued'
+  | 'data_loaded'
+  | 'arima_test'
+  | 'arima_forecast'
+  | 'lstm_epoch'
+  | 'lstm_test'
+  | 'meta_test'
+  | 'lstm_forecast'
+  | 'meta'
+  | 'complete'
+  | 'error';
+
+export interface ForecastStreamHandlers {
+  // called for every stage event with its parsed payload
+  onEvent?: (event: ForecastStreamEvent, payload: any) => void;
+  onComplete?: (response: ForecastResponse) => void;
+  onError?: (message: string) => void;
+}
+
 export interface ForecastRequestParams {
   symbol: string;
   totp?: string;
   use_angelone?: boolean;
   forecast_days?: number;
+  // p10/p50/p90 bands from simulated paths (server defaults: 500 paths, residual bootstrap)
+  intervals?: boolean;
+  interval_paths?: number;
+  interval_method?: 'bootstrap' | 'mc_dropout';
 }
 
 // Runtime / build-time base URL resolution:
@@ -59,7 +95,16 @@ export class StockForecastAPI {
     this.baseURL = url;
   }
 
-  private async request<T>(endpoint: string, options: RequestInit = {}, responseSchema: z.ZodSchema<T>): Promise<T> {
+  // Last forecast and its ETag per request: refreshes are answered with 304 until a new bar arrives
+  private forecastCache = new Map<string, { etag: string; data: ForecastResponse }>();
+
+  private async request<T>(
+    endpoint: string,
+    options: RequestInit = {},
+    responseSchema: z.ZodSchema<T>,
+    cached?: { etag: string; data: T },
+    onETag?: (etag: string, data: T) => void
+  ): Promise<T> {
     const url = `${this.baseURL}${endpoint}`;
     console.log(`API Request: ${options.method || 'GET'} ${url}`);
 
@@ -74,6 +119,11 @@ export class StockForecastAPI {
       throw new Error('Network error while calling API');
     }
 
+    if (response.status === 304 && cached) {
+      console.log('API Response: not modified');
+      return cached.data;
+    }
+
     if (!response.ok) {
       const text = await response.text().catch(() => '');
       console.error('API request failed', response.status, response.statusText, text);
@@ -84,7 +134,10 @@ export class StockForecastAPI {
     console.log('API Response:', data);
 
     try {
-      return responseSchema.parse(data);
+      const parsed = responseSchema.parse(data);
+      const etag = response.headers.get('ETag');
+      if (etag && onETag) onETag(etag, parsed);
+      return parsed;
     } catch (error) {
       console.error('API response validation failed:', error);
       throw new Error('Invalid API response format');
@@ -99,11 +152,69 @@ export class StockForecastAPI {
     return this.request('/api/stocks', {}, StocksResponseSchema);
   }
 
+  // Prefix search over the instrument master (symbol or company name), e.g. for autocomplete
+  async searchStocks(
+    query: string,
+    options: { exchange?: string; segment?: string; limit?: number } = {}
+  ): Promise<StocksResponse> {
+    const params = new URLSearchParams({ q: query });
+    if (options.exchange) params.set('exchange', options.exchange);
+    if (options.segment) params.set('segment', options.segment);
+    if (options.limit) params.set('limit', String(options.limit));
+    return this.request(`/api/stocks?${params}`, {}, StocksResponseSchema);
+  }
+
   async getForecast(params: ForecastRequestParams): Promise<ForecastResponse> {
     const payload: any = { symbol: params.symbol, forecast_days: params.forecast_days || 7 };
     if (params.totp) payload.totp = params.totp;
     if (params.use_angelone !== undefined) payload.use_angelone = params.use_angelone;
-    return this.request('/api/forecast', { method: 'POST', body: JSON.stringify(payload) }, ForecastResponseSchema);
+    if (params.intervals) {
+      payload.intervals = true;
+      if (params.interval_paths) payload.interval_paths = params.interval_paths;
+      if (params.interval_method) payload.interval_method = params.interval_method;
+    }
+    const cacheKey = JSON.stringify([params.symbol, payload.forecast_days, payload.use_angelone, payload.intervals,
+                                     payload.interval_paths, payload.interval_method]);
+    const cached = this.forecastCache.get(cacheKey);
+    const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+    if (cached) headers['If-None-Match'] = cached.etag;
+    return this.request(
+      '/api/forecast',
+      { method: 'POST', body: JSON.stringify(payload), headers },
+      ForecastResponseSchema,
+      cached,
+      (etag, data) => this.forecastCache.set(cacheKey, { etag, data })
+    );
+  }
+
+  // Server-sent events: partial results (ARIMA first, then LSTM epochs/forecast, then the meta ensemble).
+  // Returns a function that closes the stream.
+  streamForecast(params: ForecastRequestParams, handlers: ForecastStreamHandlers): () => void {
+    const query = new URLSearchParams({ symbol: params.symbol, days: String(params.forecast_days || 7) });
+    if (params.totp) query.set('totp', params.totp);
+    const source = new EventSource(`${this.baseURL}/api/forecast/stream?${query.toString()}`);
+    const events: ForecastStreamEvent[] = [
+      'started', 'queued', 'data_loaded', 'arima_test', 'arima_forecast', 'lstm_epoch',
+      'lstm_test', 'meta_test', 'lstm_forecast', 'meta',
+    ];
+    events.forEach((name) =>
+      source.addEventListener(name, (e) => handlers.onEvent?.(name, JSON.parse((e as MessageEvent).data)))
+    );
+    source.addEventListener('complete', (e) => {
+      source.close();
+      try {
+        handlers.onComplete?.(ForecastResponseSchema.parse(JSON.parse((e as MessageEvent).data)));
+      } catch (error) {
+        console.error('Stream response validation failed:', error);
+        handlers.onError?.('Invalid API response format');
+      }
+    });
+    source.addEventListener('error', (e) => {
+      source.close();
+      const data = (e as MessageEvent).data;
+      handlers.onError?.(data ? JSON.parse(data).error : 'Forecast stream interrupted');
+    });
+    return () => source.close();
   }
 
   async getMockForecast(params: ForecastRequestParams): Promise<ForecastResponse> {
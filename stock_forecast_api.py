@@ -4,60 +4,86 @@
 
 import os
 import sys
-import importlib
+import json
+import time
+import importlib.util
+import multiprocessing
 import warnings
 import math
+import threading
+import queue
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
 import numpy as np
 import pandas as pd
-import yfinance as yf
-import pyotp
 
 from dotenv import load_dotenv
 
-# Try to detect optional modules and warn if missing (SmartApi may be optional)
-_required = ['flask', 'flask_cors', 'tensorflow', 'statsmodels', 'SmartApi']
-_missing = []
-for _m in _required:
-    try:
-        importlib.import_module(_m)
-    except Exception:
-        _missing.append(_m)
+# Detect optional modules without importing them (importing TF/statsmodels here would cost seconds)
+_required = ['flask', 'flask_cors', 'tensorflow', 'statsmodels', 'sklearn', 'yfinance', 'SmartApi']
+_missing = [_m for _m in _required if importlib.util.find_spec(_m) is None]
 if _missing:
     print(f"Warning: optional modules might be missing: {_missing}")
 
 # Load environment variables
 load_dotenv()
 
-# ML and stats imports
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
-from sklearn.model_selection import train_test_split
-from statsmodels.tsa.arima.model import ARIMA
-
-import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, Dense, Dropout
-from tensorflow.keras.optimizers import Adam
-from tensorflow.keras.callbacks import EarlyStopping
-
-# SmartAPI (Angel One)
-from SmartApi import SmartConnect
+# ML and stats libraries (TensorFlow, statsmodels, sklearn, yfinance) are imported lazily
+# inside the functions that use them, or ahead of time by the warm-up thread below.
 
 # Flask
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, make_response, g
 from flask_cors import CORS
 
+from admission import AdmissionController, Rejected, configure_serving_threads
+from arima_selection import ArimaOrderCache, DEFAULT_ORDER, select_order
+from forecast_jobs import JobManager, worker_thread_counts, configure_worker_threads
+from ohlcv_store import OHLCVStore, default_start
+from model_registry import ModelRegistry
+from backtest import Backtest, load_report
+from meta_learners import META_LEARNERS, KerasMetaLearner, learner_params, make_learner
+from instrument_master import InstrumentMaster
+from intraday import IntradayFeed, INTERVAL_SECONDS, angel_source, replay_source
+from response_format import CONTENT_TYPES, negotiate, encode as encode_response
+from response_cache import ResponseCache, cache_key, etag_for, http_date, not_modified
+from sequence_windows import sliding_windows, validation_split_index, window_batches
+from forecast_engine import batched_recursive_forecast, rollout_scaled
+from forecast_intervals import INTERVAL_METHODS, forecast_bands
+from numpy_runtime import NumpyLSTM
+from angel_session import (AngelAuthError, AngelSessionManager, TokenBucket, checked_call, fetch_candles,
+                           parse_angel_date)
+import telemetry
+
 # -------------------------
 # Globals & reproducibility
 warnings.filterwarnings("ignore")
 SEED = 42
 np.random.seed(SEED)
-tf.random.set_seed(SEED)
 
-from flask import Flask, request, jsonify, make_response
-from flask_cors import CORS
+_tf_lock = threading.Lock()
+_tf_configured = False
+
+def ensure_tf():
+    """Import TensorFlow on first use, apply thread caps and the global seed once; returns the module."""
+    global _tf_configured
+    if _tf_configured:
+        return sys.modules['tensorflow']
+    with _tf_lock:
+        import tensorflow as tf
+        if not _tf_configured:
+            # honour per-worker thread caps (set by configure_worker_threads) before TF creates its pools
+            try:
+                if os.getenv('TF_NUM_INTRAOP_THREADS'):
+                    tf.config.threading.set_intra_op_parallelism_threads(int(os.environ['TF_NUM_INTRAOP_THREADS']))
+                if os.getenv('TF_NUM_INTEROP_THREADS'):
+                    tf.config.threading.set_inter_op_parallelism_threads(int(os.environ['TF_NUM_INTEROP_THREADS']))
+            except RuntimeError as e:
+                print("TF thread configuration skipped:", e)
+            tf.random.set_seed(SEED)
+            _tf_configured = True
+        return tf
 
 app = Flask(__name__, static_folder='frontend', static_url_path='/')
 
@@ -66,7 +92,8 @@ CORS(app, resources={
     r"/*": {
         "origins": "*",
         "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
+        "allow_headers": ["Content-Type", "Authorization", "If-None-Match", "If-Modified-Since"],
+        "expose_headers": ["ETag", "Last-Modified", "X-Cache", "Server-Timing", "Retry-After"]
     }
 })
 
@@ -75,17 +102,43 @@ def handle_options():
     if request.method == "OPTIONS":
         response = make_response('', 204)
         response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,If-None-Match,If-Modified-Since')
         response.headers.add('Access-Control-Allow-Methods', 'GET,POST,OPTIONS')
         return response
 
 @app.after_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,If-None-Match,If-Modified-Since')
     response.headers.add('Access-Control-Allow-Methods', 'GET,POST,OPTIONS')
     return response
 
+# Request latency metrics and the opt-in profiler (PROFILE_REQUESTS=1, then ?profile=1 or X-Profile: 1)
+PROFILE_REQUESTS = os.getenv('PROFILE_REQUESTS', '0').lower() in ('1', 'true', 'yes')
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'profiles'))
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    telemetry.HTTP_IN_FLIGHT.inc()
+    if PROFILE_REQUESTS and '1' in (request.args.get('profile'), request.headers.get('X-Profile')):
+        g.profiler = telemetry.start_profile()
+
+@app.after_request
+def record_request_metrics(response):
+    # streamed responses (batch, SSE) are timed until their first byte, not until the stream ends
+    started = g.pop('request_started', None)
+    if started is not None:
+        telemetry.HTTP_IN_FLIGHT.dec()
+        telemetry.HTTP_SECONDS.observe(time.perf_counter() - started,
+                                       endpoint=request.url_rule.rule if request.url_rule else 'unmatched',
+                                       method=request.method, status=response.status_code)
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        path = telemetry.finish_profile(profiler, PROFILE_DIR, request.endpoint or 'request')
+        response.headers['X-Profile-File'] = os.path.basename(path)
+    return response
+
 
 # Load Angel One credentials from env (do NOT print these)
 ANGEL_API_KEY = os.getenv('ANGEL_API_KEY')
@@ -99,7 +152,141 @@ else:
     if ANGEL_TOTP_SECRET:
         print("Angel One TOTP secret detected; will auto-generate codes when available.")
 
-# Small token mapping used for live quotes (expand as needed)
+# Shared Angel One session (SmartConnect is created lazily on first login) and candle rate limit
+angel_sessions = AngelSessionManager(
+    ANGEL_API_KEY, ANGEL_CLIENT_ID, ANGEL_PASSWORD, totp_secret=ANGEL_TOTP_SECRET,
+    root=os.getenv('ANGEL_API_ROOT')  # e.g. a local fake SmartAPI server for testing
+)
+candle_rate_limiter = TokenBucket(rate=float(os.getenv('ANGEL_CANDLE_RATE', 3)))
+ANGEL_FETCH_THREADS = int(os.getenv('ANGEL_FETCH_THREADS', 3))
+
+# Background forecast jobs (bounded process pool, deduplicated by request key)
+def init_forecast_worker(intra_op, inter_op, metrics_queue):
+    configure_worker_threads(intra_op, inter_op)
+    if metrics_queue is not None:
+        telemetry.forward_to(metrics_queue)  # stage timings from workers show up on the parent's /metrics
+
+# only the serving process owns the queue (pool workers import this module too)
+metrics_queue = multiprocessing.get_context('spawn').Queue() if multiprocessing.parent_process() is None else None
+if metrics_queue is not None:
+    telemetry.start_drain(metrics_queue)
+
+FORECAST_WORKERS = int(os.getenv('FORECAST_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+forecast_jobs = JobManager(
+    max_workers=FORECAST_WORKERS,
+    job_ttl=int(os.getenv('FORECAST_JOB_TTL', 3600)),
+    initializer=init_forecast_worker,
+    initargs=worker_thread_counts(FORECAST_WORKERS) + (metrics_queue,)
+)
+telemetry.REGISTRY.add_collector(
+    lambda: [telemetry.JOBS.set(forecast_jobs.stats()[status], status=status) for status in ('queued', 'running')])
+FORECAST_JOB_MAX_QUEUE = int(os.getenv('FORECAST_JOB_MAX_QUEUE', 32))  # /api/forecast/jobs answers 429 beyond this
+
+# Admission control for trainings run in this process (/api/forecast, /api/forecast/stream, intraday fits):
+# MAX_CONCURRENT_TRAININGS at once, TRAINING_QUEUE_SIZE more waiting up to TRAINING_QUEUE_TIMEOUT
+# seconds, 429/503 with Retry-After beyond that. TF and BLAS thread pools are sized to match.
+MAX_CONCURRENT_TRAININGS = int(os.getenv('MAX_CONCURRENT_TRAININGS', max(1, (os.cpu_count() or 2) // 4)))
+TRAINING_QUEUE_SIZE = int(os.getenv('TRAINING_QUEUE_SIZE', 8))
+TRAINING_QUEUE_TIMEOUT = float(os.getenv('TRAINING_QUEUE_TIMEOUT', 120))
+if multiprocessing.parent_process() is None:
+    serving_threads = configure_serving_threads(MAX_CONCURRENT_TRAININGS)
+    training_admission = AdmissionController(MAX_CONCURRENT_TRAININGS, TRAINING_QUEUE_SIZE, TRAINING_QUEUE_TIMEOUT)
+    telemetry.REGISTRY.add_collector(
+        lambda: [telemetry.TRAININGS.set(training_admission.stats()[state], state=state) for state in ('active', 'queued')])
+else:
+    serving_threads = training_admission = None  # pool workers run one job at a time with their own thread caps
+BATCH_FETCH_THREADS = int(os.getenv('BATCH_FETCH_THREADS', 4))
+SSE_KEEPALIVE_SECONDS = float(os.getenv('SSE_KEEPALIVE_SECONDS', 15))  # idle gap before /api/forecast/stream sends a comment
+
+# Local candle store: only bars newer than the last stored one are downloaded
+ohlcv_store = OHLCVStore(
+    root=os.getenv('OHLCV_STORE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ohlcv')),
+    max_age=int(os.getenv('OHLCV_MAX_AGE', 6 * 3600)),
+    offline=os.getenv('OHLCV_OFFLINE', '0').lower() in ('1', 'true', 'yes')
+)
+
+# Inference runtime for registry entries: 'keras', or 'numpy' for read-only replicas that
+# serve stored models from their runtime.npz export without importing TensorFlow
+INFERENCE_RUNTIME = os.getenv('INFERENCE_RUNTIME', 'keras')
+
+# Trained-model registry (set MODEL_REGISTRY_DIR to an empty string to disable)
+_registry_dir = os.getenv('MODEL_REGISTRY_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'models'))
+model_registry = ModelRegistry(
+    root=_registry_dir,
+    max_bytes=int(float(os.getenv('MODEL_REGISTRY_MAX_MB', 2048)) * 1024 * 1024),
+    memory_entries=int(os.getenv('MODEL_REGISTRY_MEMORY_ENTRIES', 8)),
+    runtime=INFERENCE_RUNTIME
+) if _registry_dir else None
+REGISTRY_WARM_EPOCHS = int(os.getenv('MODEL_REGISTRY_WARM_EPOCHS', 5))
+REGISTRY_WARM_MAX_NEW_BARS = int(os.getenv('MODEL_REGISTRY_WARM_MAX_NEW_BARS', 20))
+REGISTRY_WARM_MAX_UPDATES = int(os.getenv('MODEL_REGISTRY_WARM_MAX_UPDATES', 20))
+
+# Walk-forward backtests: fold checkpoints live here, folds run in the forecast job pool
+BACKTEST_DIR = os.getenv('BACKTEST_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'backtests'))
+backtest_runs = {}  # run_id -> progress record of backtests started by this process
+backtest_lock = threading.Lock()
+
+# Intraday feeds: a ring buffer of recent bars and a streaming forecaster per (symbol, interval)
+INTRADAY_BUFFER_BARS = int(os.getenv('INTRADAY_BUFFER_BARS', 3000))
+INTRADAY_HORIZON = int(os.getenv('INTRADAY_HORIZON', 12))             # bars ahead
+INTRADAY_REFIT_BARS = int(os.getenv('INTRADAY_REFIT_BARS', 375))      # background refit every N new bars
+INTRADAY_MIN_BARS = int(os.getenv('INTRADAY_MIN_BARS', 400))          # bars buffered before the first fit
+INTRADAY_QUOTE_SECONDS = float(os.getenv('INTRADAY_QUOTE_SECONDS', 5))  # live quote poll for the forming bar
+INTRADAY_REPLAY_DIR = os.getenv('INTRADAY_REPLAY_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'replay'))
+intraday_feeds = {}  # (symbol, interval) -> IntradayFeed
+intraday_lock = threading.Lock()
+
+# HTTP cache of /api/forecast responses, keyed by request and latest bar (RESPONSE_CACHE_ENTRIES=0 disables it).
+# RESPONSE_CACHE_DIR adds a disk tier shared by all API worker processes.
+RESPONSE_CACHE_ENTRIES = int(os.getenv('RESPONSE_CACHE_ENTRIES', 256))
+response_cache = ResponseCache(
+    root=os.getenv('RESPONSE_CACHE_DIR', ''),
+    memory_entries=RESPONSE_CACHE_ENTRIES,
+    disk_max_age=int(os.getenv('RESPONSE_CACHE_MAX_AGE', 3 * 86400))
+) if RESPONSE_CACHE_ENTRIES > 0 else None
+
+# Decimals kept in v2 (?format=v2, msgpack, arrow) responses unless the request sets `precision`
+RESPONSE_PRECISION = int(os.getenv('RESPONSE_PRECISION', 4))
+
+# ARIMA order: 'auto' searches (p, d, q) per symbol on the training rows (see arima_selection.py) and
+# caches the choice in ARIMA_ORDER_CACHE for ARIMA_ORDER_MAX_AGE days; or a fixed order such as '5,1,0'
+ARIMA_ORDER = os.getenv('ARIMA_ORDER', 'auto')
+ARIMA_ORDER = 'auto' if ARIMA_ORDER == 'auto' else tuple(int(x) for x in ARIMA_ORDER.split(','))
+ARIMA_SEARCH = {
+    'max_p': int(os.getenv('ARIMA_MAX_P', 5)),
+    'max_q': int(os.getenv('ARIMA_MAX_Q', 2)),
+    'max_d': int(os.getenv('ARIMA_MAX_D', 2)),
+    'max_rows': int(os.getenv('ARIMA_SEARCH_ROWS', 2000)) or None,  # most recent rows the search looks at
+    # processes per search; by default a training slot's share of the cores (serving_threads['omp']).
+    # The search runs inside the caller's training slot, and inline in job/backtest pool workers.
+    'workers': int(os.getenv('ARIMA_SEARCH_WORKERS', serving_threads['omp'] if serving_threads else 1)),
+}
+arima_order_cache = ArimaOrderCache(
+    os.getenv('ARIMA_ORDER_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'arima_orders.json')),
+    max_age=float(os.getenv('ARIMA_ORDER_MAX_AGE', 30)) * 86400
+)
+
+# Hyperparameters /api/forecast runs the pipeline with (part of the response cache key)
+FORECAST_PARAMS = {'n_test': 100, 'time_step': 60, 'lstm_units': 64, 'arima_order': ARIMA_ORDER}
+
+# Pipeline mode: 'standard' refits ARIMA and trains a fresh LSTM on the full data after evaluation;
+# 'fast' extends the evaluated ARIMA with the test window and keeps training the evaluated LSTM on it
+PIPELINE_MODES = ('standard', 'fast')
+PIPELINE_MODE = os.getenv('PIPELINE_MODE', 'standard')
+FAST_MODE_EPOCHS = int(os.getenv('FAST_MODE_EPOCHS', 10))
+FAST_MODE_REPLAY_WINDOWS = int(os.getenv('FAST_MODE_REPLAY_WINDOWS', 256))
+
+# Forecast intervals (`intervals: true` on /api/forecast): p10/p50/p90 bands from this many simulated
+# paths per model; 'bootstrap' resamples LSTM test residuals, 'mc_dropout' samples the LSTM's dropout masks
+FORECAST_INTERVAL_PATHS = int(os.getenv('FORECAST_INTERVAL_PATHS', 500))
+FORECAST_INTERVAL_MAX_PATHS = int(os.getenv('FORECAST_INTERVAL_MAX_PATHS', 5000))
+FORECAST_INTERVAL_METHOD = os.getenv('FORECAST_INTERVAL_METHOD', 'bootstrap')
+
+# Stacking learner for the meta forecast: 'nn' (Keras) or a closed-form NumPy learner
+# ('constrained_ls', 'ridge', 'inverse_error'); see meta_learners.py
+META_LEARNER = os.getenv('META_LEARNER', 'nn')
+
+# Built-in tokens, used until the instrument master index (below) is available
 STOCK_TOKENS = {
     "RELIANCE-EQ": "2885",
     "TCS-EQ": "11536",
@@ -113,9 +300,40 @@ STOCK_TOKENS = {
     "BHARTIARTL-EQ": "10604"
 }
 
+# Default /api/stocks list (no ?q=)
+DEFAULT_STOCKS = [
+    {'symbol': 'RELIANCE-EQ', 'name': 'Reliance Industries'},
+    {'symbol': 'TCS-EQ', 'name': 'Tata Consultancy Services'},
+    {'symbol': 'INFY-EQ', 'name': 'Infosys'},
+    {'symbol': 'HDFCBANK-EQ', 'name': 'HDFC Bank'},
+    {'symbol': 'ICICIBANK-EQ', 'name': 'ICICI Bank'},
+    {'symbol': 'SBIN-EQ', 'name': 'State Bank of India'},
+    {'symbol': 'TATAMOTORS-EQ', 'name': 'Tata Motors'},
+    {'symbol': 'WIPRO-EQ', 'name': 'Wipro'},
+    {'symbol': 'ITC-EQ', 'name': 'ITC'},
+    {'symbol': 'BHARTIARTL-EQ', 'name': 'Bharti Airtel'}
+]
+
+# Full NSE/BSE universe from the broker's scrip master file (drop a new file in place to reload)
+_instrument_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'instruments')
+instrument_master = InstrumentMaster(
+    source=os.getenv('INSTRUMENT_MASTER_PATH', os.path.join(_instrument_dir, 'OpenAPIScripMaster.json')),
+    root=os.getenv('INSTRUMENT_INDEX_DIR', os.path.join(_instrument_dir, 'index')),
+    check_every=float(os.getenv('INSTRUMENT_MASTER_CHECK_SECONDS', 30))
+)
+STOCK_SEARCH_MAX_RESULTS = int(os.getenv('STOCK_SEARCH_MAX_RESULTS', 100))
+
+def instrument_token(symbol, exchange="NSE"):
+    """Broker token for `symbol` from the instrument master, else the built-in map; None when unknown."""
+    token = instrument_master.token(symbol, exchange)
+    if token is None and exchange == "NSE":
+        token = STOCK_TOKENS.get(symbol)
+    return token
+
 # -------------------------
 # Utility functions
 def rmse(a, b):
+    from sklearn.metrics import mean_squared_error
     return math.sqrt(mean_squared_error(a, b))
 
 def mape(actual, pred):
@@ -136,55 +354,74 @@ def safe_float(x):
 
 # -------------------------
 # Angel One helpers
-def connect_angelone(totp_code):
+def connect_angelone(totp_code=None):
+    # reuses the shared session; the TOTP is only consumed when a fresh login is needed
+    return angel_sessions.get(totp_code)
+
+def with_angel_session(obj, call):
+    """
+    call(obj) for a SmartConnect session. When the broker rejects the session's token
+    (AngelAuthError), the shared session is renewed and the call retried once with it.
+    """
+    started = time.time()
     try:
-        obj = SmartConnect(api_key=ANGEL_API_KEY)
-        data = obj.generateSession(ANGEL_CLIENT_ID, ANGEL_PASSWORD, totp_code)
-        if data and data.get('status'):
-            return obj, None
-        return None, data.get('message') if isinstance(data, dict) else "unknown error"
-    except Exception as e:
-        return None, str(e)
+        return call(obj)
+    except AngelAuthError as e:
+        print("Angel One rejected the session token, renewing:", e)
+        angel_sessions.invalidate(issued_before=started)
+        obj, err = angel_sessions.get()
+        if not obj:
+            print("Angel One session renewal failed:", err)
+            raise
+        return call(obj)
 
 def get_angelone_data(obj, symbol, from_date=None, to_date=None, exchange="NSE", interval="ONE_DAY"):
     """
     Returns: DataFrame with timestamp index and numeric OHLCV columns or None
     """
-    token = STOCK_TOKENS.get(symbol)
+    token = instrument_token(symbol, exchange)
     if not token:
         return None
     if to_date is None:
         to_date = datetime.now().strftime("%Y-%m-%d %H:%M")
     if from_date is None:
         from_date = (datetime.now() - timedelta(days=365 * 15)).strftime("%Y-%m-%d 09:15")
-    param = {
-        "exchange": exchange,
-        "symboltoken": token,
-        "interval": interval,
-        "fromdate": from_date,
-        "todate": to_date
-    }
     try:
-        hist = obj.getCandleData(param)
-        if hist and hist.get('status') and 'data' in hist:
-            df = pd.DataFrame(hist['data'], columns=['timestamp', 'Open', 'High', 'Low', 'Close', 'Volume'])
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df.set_index('timestamp', inplace=True)
-            # numeric conversion
-            for col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-            df = df.dropna()
-            return df
+        # the broker truncates long ranges per interval, so fetch in rate-limited chunks
+        # any failed chunk fails the fetch (None), so the store never keeps a range with a hole
+        with telemetry.stage('fetch_angel_one'):
+            df = with_angel_session(obj, lambda session: fetch_candles(
+                session, token, parse_angel_date(from_date), parse_angel_date(to_date), interval=interval,
+                exchange=exchange, limiter=candle_rate_limiter, max_workers=ANGEL_FETCH_THREADS))
+        if df is not None:
+            telemetry.ROWS.inc(len(df), stage='fetch_angel_one')
+        return df
     except Exception as e:
         print("get_angelone_data error:", e)
     return None
 
+def get_yfinance_data(sym_yf, start):
+    """
+    Returns: DataFrame with OHLCV columns from yfinance starting at `start`, or None
+    """
+    import yfinance as yf
+    print(f"Downloading {sym_yf} from yfinance (from {start:%Y-%m-%d})...")
+    with telemetry.stage('fetch_yfinance'):
+        df = yf.download(sym_yf, start=start.strftime('%Y-%m-%d'), progress=False)
+    if df is None or df.empty:
+        return None
+    telemetry.ROWS.inc(len(df), stage='fetch_yfinance')
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    return df
+
 def get_live_quote(obj, symbol, exchange="NSE"):
     try:
-        token = STOCK_TOKENS.get(symbol)
+        token = instrument_token(symbol, exchange)
         if not token:
             return None
-        q = obj.getMarketData({"mode": "FULL", "exchangeTokens": {exchange: [token]}})
+        with telemetry.stage('live_quote'):
+            q = with_angel_session(obj, lambda session: checked_call(session.getMarketData, "FULL", {exchange: [token]}))
         if q and q.get('status') and 'data' in q:
             d = q['data']['fetched'][0]
             return {
@@ -205,16 +442,11 @@ def get_live_quote(obj, symbol, exchange="NSE"):
 # -------------------------
 # Model helper functions (aligned with the reference notebook)
 def build_sequences(features_scaled, target_scaled, time_step):
-    X, y = [], []
-    n = len(features_scaled)
-    for i in range(time_step, n):
-        X.append(features_scaled[i-time_step:i, :])
-        y.append(target_scaled[i, 0])
-    X = np.array(X)
-    y = np.array(y).reshape(-1, 1)
-    return X, y
+    # read-only strided views (no copy); same values as stacking each [i-time_step, i) slice
+    return sliding_windows(features_scaled, target_scaled, time_step)
 
 def train_arima_on_series(series, steps, order=(5,1,0)):
+    from statsmodels.tsa.arima.model import ARIMA
     try:
         model = ARIMA(series, order=order).fit()
         forecast = model.forecast(steps=steps)
@@ -223,7 +455,36 @@ def train_arima_on_series(series, steps, order=(5,1,0)):
         print("[ARIMA] error:", e)
         return None, None
 
-def train_lstm_model(X_train, y_train, lstm_units=64, lr=1e-3, epochs=100, batch_size=32, val_split=0.1):
+def fit_arima(series, order=(5,1,0)):
+    from statsmodels.tsa.arima.model import ARIMA
+    try:
+        return ARIMA(series, order=order).fit()
+    except Exception as e:
+        print("[ARIMA] error:", e)
+        return None
+
+def resolve_arima_order(arima_order, series, symbol=None):
+    """
+    (p, d, q) to fit: arima_order itself, or for 'auto' the order cached for `symbol` or
+    searched on `series` (DEFAULT_ORDER when the search fails). Without a symbol nothing is cached.
+    """
+    if arima_order != 'auto':
+        return tuple(arima_order)
+    try:
+        with telemetry.stage('arima_order', rows=len(series)):
+            order, source = select_order(series, symbol, arima_order_cache if symbol else None, **ARIMA_SEARCH)
+    except Exception as e:
+        print(f"[ARIMA] order search failed, using {DEFAULT_ORDER}:", e)
+        return DEFAULT_ORDER
+    telemetry.CACHE.inc(cache='arima_order', result='hit' if source == 'cache' else 'miss')
+    return order
+
+def train_lstm_model(X_train, y_train, lstm_units=64, lr=1e-3, epochs=100, batch_size=32, val_split=0.1, callbacks=None):
+    ensure_tf()
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import LSTM, Dense, Dropout
+    from tensorflow.keras.optimizers import Adam
+    from tensorflow.keras.callbacks import EarlyStopping
     model = Sequential([
         LSTM(lstm_units, input_shape=(X_train.shape[1], X_train.shape[2])),
         Dropout(0.2),
@@ -231,68 +492,115 @@ def train_lstm_model(X_train, y_train, lstm_units=64, lr=1e-3, epochs=100, batch
     ])
     model.compile(loss='mse', optimizer=Adam(learning_rate=lr, clipnorm=1.0))
     es = EarlyStopping(monitor='val_loss', patience=8, restore_best_weights=True, verbose=0)
-    model.fit(X_train, y_train, validation_split=val_split, epochs=epochs, batch_size=batch_size,
-              shuffle=False, callbacks=[es], verbose=0)
+    # windows are views, so batches are materialized lazily instead of copying all of X up front
+    split_at = validation_split_index(len(X_train), val_split)
+    train_batches = window_batches(X_train[:split_at], y_train[:split_at], batch_size=batch_size)
+    val_batches = window_batches(X_train[split_at:], y_train[split_at:], batch_size=batch_size) \
+        if split_at < len(X_train) else None
+    history = model.fit(train_batches, validation_data=val_batches, epochs=epochs, shuffle=False,
+                        callbacks=[es] + list(callbacks or []), verbose=0)
+    telemetry.LSTM_EPOCHS.observe(len(history.epoch), phase=telemetry.current_stage() or 'lstm')
     return model
 
 def recursive_lstm_forecast(lstm_model, last_sequence, steps, target_scaler):
-    cur_input = last_sequence.reshape(1, last_sequence.shape[0], last_sequence.shape[1]).astype(np.float32)
-    preds_scaled = []
-    for _ in range(steps):
-        pred_scaled = float(lstm_model.predict(cur_input, verbose=0)[0, 0])
-        preds_scaled.append(pred_scaled)
-        last_vol = cur_input[0, -1, 1]
-        new_step = np.array([[pred_scaled, last_vol]])
-        cur_input = np.concatenate([cur_input[:, 1:, :], new_step.reshape(1, 1, -1)], axis=1)
-    preds = target_scaler.inverse_transform(np.array(preds_scaled).reshape(-1, 1)).flatten()
-    return preds
+    # one compiled loop with a forward pass per step (see forecast_engine) instead of predict() per day
+    return batched_recursive_forecast(lstm_model, last_sequence[None, ...], steps, target_scaler)[0]
 
 def train_meta_nn(meta_X_train, meta_y_train, meta_X_val, meta_y_val, lr=1e-3, epochs=200, batch_size=16):
-    meta_model = Sequential([
-        Dense(32, activation='relu', input_shape=(meta_X_train.shape[1],)),
-        Dropout(0.2),
-        Dense(8, activation='relu'),
-        Dense(1)
-    ])
-    meta_model.compile(optimizer=Adam(learning_rate=lr, clipnorm=1.0), loss='mse')
-    es = EarlyStopping(monitor='val_loss', patience=10, restore_best_weights=True, verbose=0)
-    meta_model.fit(meta_X_train, meta_y_train, validation_data=(meta_X_val, meta_y_val),
-                   epochs=epochs, batch_size=batch_size, callbacks=[es], verbose=0)
-    return meta_model
+    ensure_tf()
+    learner = KerasMetaLearner(lr=lr, epochs=epochs, batch_size=batch_size)
+    return learner.fit(meta_X_train, meta_y_train, meta_X_val, meta_y_val).model
 
 # -------------------------
-# Main pipeline (runs synchronously inside the request)
-def train_and_forecast(df, days=7, n_test=100, time_step=60, lstm_units=64, arima_order=(5,1,0)):
+# Main pipeline (runs inside the request or a job worker process)
+def train_and_forecast(df, days=7, n_test=100, time_step=60, lstm_units=64, arima_order=(5,1,0), progress=None,
+                       pipeline_mode='standard', meta_learner=None, intervals=None, symbol=None):
     """
     Input:
       df: DataFrame with 'Close' and 'Volume' columns indexed by datetime
       days: forecast horizon
+      progress: optional callable(event, payload) told about each stage as it finishes (see fit_pipeline)
+      pipeline_mode: 'standard' or 'fast' (see fit_pipeline)
+      meta_learner: name in META_LEARNERS (default: META_LEARNER)
+      intervals: optional {'paths', 'method'} for p10/p50/p90 bands (see forecast_from_state)
+      symbol: caches the order picked for arima_order='auto' (see fit_pipeline)
     Returns:
       dict with 'meta', 'arima', 'lstm' objects containing predictions, metrics, historical snippet
     """
+    state = fit_pipeline(df, n_test=n_test, time_step=time_step, lstm_units=lstm_units, arima_order=arima_order,
+                         progress=progress, days=days, pipeline_mode=pipeline_mode, meta_learner=meta_learner,
+                         symbol=symbol)
+    with telemetry.stage('forecast'):
+        result = forecast_from_state(state, df, days, intervals=intervals, future_lstm=state.pop('lstm_forecast', None))
+    emit_meta(progress, result)
+    return result
+
+def emit_meta(progress, result):
+    """Tell `progress` (see fit_pipeline) about the meta ensemble of a finished forecast."""
+    if progress is not None:
+        progress('meta', {'predictions': result['meta']['predictions'], 'metrics': result['meta']['metrics']})
+
+def fit_pipeline(df, n_test=100, time_step=60, lstm_units=64, arima_order=(5,1,0), progress=None, days=None,
+                 pipeline_mode='standard', meta_learner=None, symbol=None):
+    """
+    Runs the evaluation phase and fits the final models on the full dataset.
+    pipeline_mode: 'standard' refits ARIMA and trains a new LSTM (with new scalers) on the full data;
+      'fast' extends the evaluated ARIMA with the test observations and continues training the
+      evaluated LSTM on the test tail, keeping its train-fitted scalers
+    meta_learner: stacking learner name (default: META_LEARNER); its fit time is kept in state['meta_learner']
+    arima_order: (p, d, q), or 'auto' to pick it on the training rows (cached per `symbol` when given)
+    progress: optional callable(event, payload), called as stages finish:
+      arima_test, arima_forecast (needs `days`), lstm_epoch, lstm_test, meta_test, lstm_forecast (needs `days`)
+    Returns:
+      state dict with the fitted models, scalers and test metrics (see forecast_from_state); when the
+      lstm_forecast event was sent, its rollout is kept as 'lstm_forecast' (pop it before saving the state)
+    """
+    from sklearn.preprocessing import MinMaxScaler
+    from sklearn.metrics import mean_absolute_error, r2_score
+    from sklearn.model_selection import train_test_split
+    ensure_tf()
+
+    def emit(event, **payload):
+        if progress is not None:
+            progress(event, payload)
+
+    def epoch_callback(phase, epochs):
+        if progress is None:
+            return []
+        from tensorflow.keras.callbacks import LambdaCallback
+        return [LambdaCallback(on_epoch_end=lambda epoch, logs: emit(
+            'lstm_epoch', phase=phase, epoch=epoch + 1, epochs=epochs,
+            **{k: float(v) for k, v in (logs or {}).items() if k in ('loss', 'val_loss')}))]
+
     # Basic checks
     if 'Close' not in df.columns or 'Volume' not in df.columns:
         raise ValueError("DataFrame must contain 'Close' and 'Volume' columns")
     if len(df) <= (time_step + 10):
         raise ValueError("Not enough data for the configured time_step")
+    if pipeline_mode not in PIPELINE_MODES:
+        raise ValueError(f"pipeline_mode must be one of {PIPELINE_MODES}")
+    meta_learner = meta_learner or META_LEARNER
+    learner = make_learner(meta_learner)
 
     # 1) Train/test split (reserve n_test rows for meta training)
     train_size = len(df) - n_test
     train_df = df.iloc[:train_size].copy()
     test_df = df.iloc[train_size:].copy()
 
-    # 2) Scalers fit on train only (no leakage)
-    feature_scaler = MinMaxScaler()
-    target_scaler = MinMaxScaler()
-    feature_scaler.fit(train_df[['Close', 'Volume']])
-    target_scaler.fit(train_df[['Close']].values.reshape(-1, 1))
+    with telemetry.stage('scaling', rows=len(df)):
+        # 2) Scalers fit on train only (no leakage)
+        feature_scaler = MinMaxScaler()
+        target_scaler = MinMaxScaler()
+        feature_scaler.fit(train_df[['Close', 'Volume']])
+        target_scaler.fit(train_df[['Close']].values.reshape(-1, 1))
 
-    # 3) Transform full dataset
-    features_scaled = feature_scaler.transform(df[['Close', 'Volume']])
-    target_scaled = target_scaler.transform(df[['Close']].values.reshape(-1, 1))
+        # 3) Transform full dataset
+        features_scaled = feature_scaler.transform(df[['Close', 'Volume']])
+        target_scaled = target_scaler.transform(df[['Close']].values.reshape(-1, 1))
 
     # 4) Build sequences
-    X_all, y_all = build_sequences(features_scaled, target_scaled, time_step)
+    with telemetry.stage('build_sequences', rows=len(df)):
+        X_all, y_all = build_sequences(features_scaled, target_scaled, time_step)
     assert X_all.shape[0] == len(df) - time_step
 
     if n_test >= X_all.shape[0]:
@@ -304,18 +612,14 @@ def train_and_forecast(df, days=7, n_test=100, time_step=60, lstm_units=64, arim
     y_test = y_all[-n_test:]
 
     # ---------------- ARIMA on train -> forecast for test window
-    arima_model, arima_test_forecast = train_arima_on_series(train_df['Close'], steps=len(test_df), order=arima_order)
+    arima_order = resolve_arima_order(arima_order, train_df['Close'], symbol)
+    with telemetry.stage('arima_test', rows=len(train_df)):
+        arima_model, arima_test_forecast = train_arima_on_series(train_df['Close'], steps=len(test_df), order=arima_order)
     if arima_test_forecast is None:
         arima_test_forecast = np.array([train_df['Close'].iloc[-1]] * len(test_df))
         arima_model = None
     arima_test_series = pd.Series(arima_test_forecast, index=test_df.index)
 
-    # ---------------- LSTM train -> predict test window
-    lstm_model = train_lstm_model(X_train, y_train, lstm_units=lstm_units)
-    lstm_test_pred_scaled = lstm_model.predict(X_test, verbose=0)
-    lstm_test_pred = target_scaler.inverse_transform(lstm_test_pred_scaled).flatten()
-    lstm_test_series = pd.Series(lstm_test_pred, index=test_df.index)
-
     # ---------------- Evaluation metrics on test
     y_test_prices = test_df['Close'].values
     valid_arima_idx = ~np.isnan(arima_test_series.values)
@@ -326,82 +630,494 @@ def train_and_forecast(df, days=7, n_test=100, time_step=60, lstm_units=64, arim
         mae_arima = mean_absolute_error(y_test_prices[valid_arima_idx], arima_test_series.values[valid_arima_idx])
         r2_arima  = r2_score(y_test_prices[valid_arima_idx], arima_test_series.values[valid_arima_idx])
         acc_arima = accuracy_from_mape(y_test_prices[valid_arima_idx], arima_test_series.values[valid_arima_idx])
+    metrics = {'arima': {'rmse': rmse_arima, 'mae': mae_arima, 'r2': r2_arima, 'accuracy_pct': acc_arima}}
+    emit('arima_test', metrics=metrics['arima'])
+
+    # ARIMA on full (fitted here, not after the LSTMs, so its forecast can be reported right away)
+    if pipeline_mode == 'fast' and arima_model is not None:
+        with telemetry.stage('arima_update', rows=len(test_df)):
+            arima_full_model = extend_arima(arima_model, df, train_size)
+    else:
+        with telemetry.stage('arima_full', rows=len(df)):
+            arima_full_model = fit_arima(df['Close'], order=arima_order)
+    if progress is not None and days:
+        future_dates = future_business_dates(df, days)
+        emit('arima_forecast', predictions=format_predictions(future_dates, arima_future(arima_full_model, df, days)))
+
+    # ---------------- LSTM train -> predict test window
+    with telemetry.stage('lstm_test', rows=len(X_train)):
+        lstm_model = train_lstm_model(X_train, y_train, lstm_units=lstm_units, callbacks=epoch_callback('test', 100))
+        lstm_test_pred_scaled = lstm_model.predict(X_test, verbose=0)
+    lstm_test_pred = target_scaler.inverse_transform(lstm_test_pred_scaled).flatten()
+    lstm_test_series = pd.Series(lstm_test_pred, index=test_df.index)
 
     rmse_lstm = rmse(y_test_prices, lstm_test_series.values)
     mae_lstm = mean_absolute_error(y_test_prices, lstm_test_series.values)
     r2_lstm = r2_score(y_test_prices, lstm_test_series.values)
     acc_lstm = accuracy_from_mape(y_test_prices, lstm_test_series.values)
 
-    metrics = {
-        'arima': {'rmse': rmse_arima, 'mae': mae_arima, 'r2': r2_arima, 'accuracy_pct': acc_arima},
-        'lstm': {'rmse': rmse_lstm, 'mae': mae_lstm, 'r2': r2_lstm, 'accuracy_pct': acc_lstm}
-    }
+    metrics['lstm'] = {'rmse': rmse_lstm, 'mae': mae_lstm, 'r2': r2_lstm, 'accuracy_pct': acc_lstm}
+    emit('lstm_test', metrics=metrics['lstm'])
 
     # ---------------- Meta learner (train on reserved test-set)
     meta_X = np.column_stack((arima_test_series.values, lstm_test_series.values))
     meta_y = test_df['Close'].values
     # small train/val split for meta model
     meta_X_train, meta_X_val, meta_y_train, meta_y_val = train_test_split(meta_X, meta_y, test_size=0.2, random_state=SEED)
-    meta_model = train_meta_nn(meta_X_train, meta_y_train, meta_X_val, meta_y_val)
-    meta_val_pred = meta_model.predict(meta_X_val).flatten()
+    t0 = time.perf_counter()
+    with telemetry.stage(f'meta_{meta_learner}', rows=len(meta_X)):
+        meta_model = learner.fit(meta_X_train, meta_y_train, meta_X_val, meta_y_val)
+    meta_fit_ms = (time.perf_counter() - t0) * 1000
+    meta_val_pred = meta_model.predict(meta_X_val)
     rmse_meta_val = rmse(meta_y_val, meta_val_pred)
     mae_meta_val = mean_absolute_error(meta_y_val, meta_val_pred)
 
-    meta_test_pred = meta_model.predict(meta_X).flatten()
+    meta_test_pred = meta_model.predict(meta_X)
     rmse_meta = rmse(meta_y, meta_test_pred)
     mae_meta = mean_absolute_error(meta_y, meta_test_pred)
     r2_meta = r2_score(meta_y, meta_test_pred)
     acc_meta = accuracy_from_mape(meta_y, meta_test_pred)
 
     metrics['meta'] = {'rmse': rmse_meta, 'mae': mae_meta, 'r2': r2_meta, 'accuracy_pct': acc_meta}
+    meta_info = {'name': meta_learner, 'fit_ms': round(meta_fit_ms, 3), 'val_rmse': float(rmse_meta_val),
+                 'val_mae': float(mae_meta_val)}
+    emit('meta_test', metrics=metrics['meta'], learner=meta_info)
+
+    # ---------------- FINAL MODELS: retrain on full dataset (ARIMA was refitted above)
+    if pipeline_mode == 'fast':
+        # continue from the evaluated weights on the held-out tail (plus replayed history); the
+        # train-fitted scalers stay, so the model keeps seeing inputs on the scale it learned
+        with telemetry.stage('lstm_continue', rows=n_test + FAST_MODE_REPLAY_WINDOWS):
+            lstm_full = continue_lstm(lstm_model, df, feature_scaler, target_scaler, time_step,
+                                      epochs=FAST_MODE_EPOCHS, replay_windows=n_test + FAST_MODE_REPLAY_WINDOWS,
+                                      callbacks=epoch_callback('full', FAST_MODE_EPOCHS))
+        feature_scaler_full, target_scaler_full = feature_scaler, target_scaler
+    else:
+        # LSTM retrain on full
+        with telemetry.stage('lstm_full', rows=len(df)):
+            feature_scaler_full = MinMaxScaler(); target_scaler_full = MinMaxScaler()
+            feature_scaler_full.fit(df[['Close', 'Volume']])
+            target_scaler_full.fit(df[['Close']].values.reshape(-1, 1))
+            features_scaled_full = feature_scaler_full.transform(df[['Close', 'Volume']])
+            target_scaled_full = target_scaler_full.transform(df[['Close']].values.reshape(-1, 1))
+            X_full, y_full = build_sequences(features_scaled_full, target_scaled_full, time_step)
+            lstm_full = train_lstm_model(X_full, y_full, lstm_units=lstm_units, lr=1e-3, epochs=50, batch_size=32,
+                                         val_split=0.0, callbacks=epoch_callback('full', 50))
+    future_lstm = None
+    if progress is not None and days:
+        last_seq = feature_scaler_full.transform(df[['Close', 'Volume']].iloc[-time_step:])
+        future_lstm = recursive_lstm_forecast(lstm_full, last_seq, steps=days, target_scaler=target_scaler_full)
+        emit('lstm_forecast', predictions=format_predictions(future_business_dates(df, days), future_lstm))
+
+    state = {
+        'metrics': metrics,
+        'meta_model': meta_model,
+        'meta_learner': meta_info,
+        'arima_model': arima_full_model,
+        'lstm_model': lstm_full,
+        'feature_scaler': feature_scaler_full,
+        'target_scaler': target_scaler_full,
+        'time_step': time_step,
+        'n_rows': len(df),
+        'pipeline_mode': pipeline_mode,
+        # one-step LSTM errors on the test window (price units), resampled for forecast intervals
+        'lstm_residuals': (y_test_prices - lstm_test_pred).tolist()
+    }
+    if future_lstm is not None:
+        state['lstm_forecast'] = future_lstm
+    return state
+
+def future_business_dates(df, days):
+    return pd.date_range(start=df.index[-1] + timedelta(days=1), periods=days + 10, freq='B')[:days]
+
+def format_predictions(dates, arr):
+    return [{'date': d.strftime('%Y-%m-%d'), 'value': float(v)} for d, v in zip(dates, arr)]
+
+def arima_future(arima_model, df, days):
+    """ARIMA forecast for `days` ahead, or the last close repeated when there is no usable model."""
+    if arima_model is not None:
+        try:
+            return np.asarray(arima_model.forecast(steps=days)).flatten()
+        except Exception as e:
+            print("[ARIMA] forecast error:", e)
+    return np.array([df['Close'].iloc[-1]] * days)
+
+def forecast_from_state(state, df, days, intervals=None, future_lstm=None):
+    """
+    Forecast `days` ahead from a fitted pipeline state (fit_pipeline or the model registry).
+    df must be the data the state was fitted/updated on.
+    intervals: optional {'paths', 'method'}; adds p10/p50/p90 bands as 'intervals' to
+    every model (see forecast_intervals)
+    future_lstm: the LSTM rollout when it was already computed (fit_pipeline's 'lstm_forecast')
+    """
+    if not isinstance(state['lstm_model'], NumpyLSTM):
+        ensure_tf()
+    time_step = state['time_step']
+
+    # ARIMA
+    future_arima = arima_future(state['arima_model'], df, days)
 
-    # ---------------- FINAL FORECAST: retrain on full dataset & forecast `days`
-    # ARIMA on full
-    arima_full_model, future_arima = train_arima_on_series(df['Close'], steps=days, order=arima_order)
-    if future_arima is None:
-        future_arima = np.array([df['Close'].iloc[-1]] * days)
-
-    # LSTM retrain on full
-    feature_scaler_full = MinMaxScaler(); target_scaler_full = MinMaxScaler()
-    feature_scaler_full.fit(df[['Close', 'Volume']])
-    target_scaler_full.fit(df[['Close']].values.reshape(-1, 1))
-    features_scaled_full = feature_scaler_full.transform(df[['Close', 'Volume']])
-    target_scaled_full = target_scaler_full.transform(df[['Close']].values.reshape(-1, 1))
-    X_full, y_full = build_sequences(features_scaled_full, target_scaled_full, time_step)
-    lstm_full = train_lstm_model(X_full, y_full, lstm_units=lstm_units, lr=1e-3, epochs=50, batch_size=32, val_split=0.0)
-    last_seq = features_scaled_full[-time_step:]
-    future_lstm = recursive_lstm_forecast(lstm_full, last_seq, steps=days, target_scaler=target_scaler_full)
+    # LSTM
+    if future_lstm is None or len(future_lstm) != days:
+        last_seq = state['feature_scaler'].transform(df[['Close', 'Volume']].iloc[-time_step:])
+        future_lstm = recursive_lstm_forecast(state['lstm_model'], last_seq, steps=days, target_scaler=state['target_scaler'])
 
     # Meta ensemble for future
     meta_input_future = np.column_stack((future_arima, future_lstm))
-    meta_final_future = meta_model.predict(meta_input_future).flatten()
+    meta_final_future = state['meta_model'].predict(meta_input_future)
+    metrics = state['metrics']
 
     # Build business-day dates
-    future_dates = pd.date_range(start=df.index[-1] + timedelta(days=1), periods=days + 10, freq='B')[:days]
+    future_dates = future_business_dates(df, days)
 
-    # Historical snippet (last 60 days)
-    historical_data = df.tail(60)
+    # Historical snippet (last 60 days), shared by the three models
+    historical = [{'date': i.strftime('%Y-%m-%d'), 'value': float(v)} for i, v in df['Close'].tail(60).items()]
 
-    def format_predictions(dates, arr):
-        return [{'date': d.strftime('%Y-%m-%d'), 'value': float(v)} for d, v in zip(dates, arr)]
-
-    return {
+    result = {
         'meta': {
             'predictions': format_predictions(future_dates, meta_final_future),
             'metrics': metrics['meta'],
-            'historical': [{'date': i.strftime('%Y-%m-%d'), 'value': float(v)} for i, v in historical_data['Close'].items()]
+            'learner': state.get('meta_learner') or {'name': 'nn'},
+            'historical': historical
         },
         'arima': {
             'predictions': format_predictions(future_dates, future_arima),
             'metrics': metrics['arima'],
-            'historical': [{'date': i.strftime('%Y-%m-%d'), 'value': float(v)} for i, v in historical_data['Close'].items()]
+            'order': list(state['arima_model'].model.order) if state['arima_model'] is not None else None,
+            'historical': historical
         },
         'lstm': {
             'predictions': format_predictions(future_dates, future_lstm),
             'metrics': metrics['lstm'],
-            'historical': [{'date': i.strftime('%Y-%m-%d'), 'value': float(v)} for i, v in historical_data['Close'].items()]
+            'historical': historical
         }
     }
+    if intervals:
+        with telemetry.stage('intervals', rows=intervals['paths']):
+            bands = forecast_bands(state, df, days, future_dates, paths=intervals['paths'],
+                                   method=intervals['method'], seed=SEED)
+        for name, rows in bands.items():
+            result[name]['intervals'] = rows
+    return result
+
+def warm_start_pipeline(state, df, epochs=5, replay_windows=256):
+    """
+    Bring a stored pipeline state up to date with bars appended since it was fitted:
+    ARIMA is extended with the new observations (no refit) and the LSTM continues
+    training from its stored weights on the most recent windows for a few epochs.
+    Scalers, meta model and test metrics are kept from the last full fit.
+    """
+    state['arima_model'] = extend_arima(state['arima_model'], df, state['n_rows'])
+    state['lstm_model'] = continue_lstm(state['lstm_model'], df, state['feature_scaler'], state['target_scaler'],
+                                        state['time_step'], epochs=epochs, replay_windows=replay_windows)
+    state['n_rows'] = len(df)
+    state['warm_starts'] = state.get('warm_starts', 0) + 1
+    return state
+
+def extend_arima(arima_model, df, n_rows):
+    """ARIMA fitted on the first n_rows of df, extended with the remaining closes (no refit); refits on failure."""
+    if arima_model is None:
+        return None
+    try:
+        return arima_model.append(np.asarray(df['Close'].values[n_rows:], dtype=float))
+    except Exception as e:
+        print("[ARIMA] append error, refitting:", e)
+        return fit_arima(df['Close'], order=arima_model.model.order)
+
+def continue_lstm(lstm_model, df, feature_scaler, target_scaler, time_step, epochs=5, replay_windows=256, callbacks=None):
+    """Keep training lstm_model on the last `replay_windows` windows of df (scaled with the model's own scalers)."""
+    # windows covering the new bars plus some replayed history to limit drift
+    tail = df.iloc[-(time_step + replay_windows):]
+    features_scaled = feature_scaler.transform(tail[['Close', 'Volume']])
+    target_scaled = target_scaler.transform(tail[['Close']].values.reshape(-1, 1))
+    X_tail, y_tail = build_sequences(features_scaled, target_scaled, time_step)
+    history = lstm_model.fit(window_batches(X_tail, y_tail, batch_size=32), epochs=epochs, shuffle=False,
+                             callbacks=list(callbacks or []), verbose=0)
+    telemetry.LSTM_EPOCHS.observe(len(history.epoch), phase=telemetry.current_stage() or 'lstm')
+    return lstm_model
+
+@contextmanager
+def training_slot(progress=None):
+    """
+    Hold an admission slot around an in-process training; the wait is timed as the 'queue_wait' stage.
+    progress: optional callable(event, payload) (see fit_pipeline), told 'queued' when the training has to wait
+    """
+    if training_admission is None:
+        yield
+        return
+    if progress is not None:
+        stats = training_admission.stats()
+        if stats['active'] >= stats['max_concurrent']:
+            progress('queued', {'queued': stats['queued'] + 1, 'retry_after': stats['retry_after_s']})
+    with telemetry.stage('queue_wait'):
+        ticket = training_admission.acquire()
+    telemetry.QUEUE_WAIT.observe(ticket['waited'])
+    try:
+        yield
+    finally:
+        training_admission.release(ticket)
+
+def rejection_response(e, queue):
+    """429/503 JSON response for an admission.Rejected, with Retry-After."""
+    telemetry.REJECTED.inc(queue=queue, reason='queue_full' if e.status == 429 else 'timeout')
+    body = {'success': False, 'error': e.reason, 'retry_after': e.retry_after}
+    body['capacity'] = training_admission.stats() if queue == 'training' else forecast_jobs.stats()
+    response = jsonify(body)
+    response.status_code = e.status
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def forecast_with_registry(symbol, df, days=7, n_test=100, time_step=60, lstm_units=64, arima_order=(5,1,0),
+                           pipeline_mode=None, meta_learner=None, intervals=None, progress=None):
+    """
+    train_and_forecast backed by the model registry: exact data matches reuse the stored
+    models, appended bars warm-start them, anything else trains from scratch.
+    pipeline_mode: 'standard' or 'fast' (default: PIPELINE_MODE)
+    meta_learner: stacking learner name (default: META_LEARNER)
+    intervals: optional {'paths', 'method'} for p10/p50/p90 bands (see forecast_from_state)
+    progress: optional callable(event, payload) (see train_and_forecast); a full fit reports every
+      stage, a registry hit or warm start only 'meta'
+    With INFERENCE_RUNTIME=numpy, stored states forecast through NumPy: appended bars extend
+    ARIMA only (the LSTM is not retrained and nothing is saved), and only a miss loads TensorFlow.
+    """
+    pipeline_mode = pipeline_mode or PIPELINE_MODE
+    meta_learner = meta_learner or META_LEARNER
+    params = {'n_test': n_test, 'time_step': time_step, 'lstm_units': lstm_units,
+              'arima_order': arima_order if arima_order == 'auto' else list(arima_order)}
+    if pipeline_mode != 'standard':
+        params['pipeline_mode'] = pipeline_mode  # standard-mode entries keep their original ids
+    params.update(learner_params(meta_learner))
+    if model_registry is None:
+        with training_slot(progress):
+            return train_and_forecast(df, days=days, n_test=n_test, time_step=time_step, lstm_units=lstm_units,
+                                      arima_order=arima_order, pipeline_mode=pipeline_mode, meta_learner=meta_learner,
+                                      intervals=intervals, symbol=symbol, progress=progress)
+    variant = (intervals['paths'], intervals['method']) if intervals else None
+
+    with telemetry.stage('registry_lookup'):
+        status, state = model_registry.lookup(symbol, params, df)
+    telemetry.CACHE.inc(cache='model_registry', result=status)
+    if status == 'hit':
+        cached = model_registry.cached_result(symbol, params, df, days, variant)
+        telemetry.CACHE.inc(cache='forecast_result', result='hit' if cached is not None else 'miss')
+        if cached is not None:
+            emit_meta(progress, cached)
+            return cached
+    elif status == 'warm' and isinstance(state['lstm_model'], NumpyLSTM):
+        state['arima_model'] = extend_arima(state['arima_model'], df, state['n_rows'])
+    elif status == 'warm' and len(df) - state['n_rows'] <= REGISTRY_WARM_MAX_NEW_BARS \
+            and state.get('warm_starts', 0) < REGISTRY_WARM_MAX_UPDATES:
+        print(f"[Registry] warm-starting {symbol} with {len(df) - state['n_rows']} new bars")
+        with training_slot(progress), telemetry.stage('warm_start', rows=len(df) - state['n_rows']):
+            state = warm_start_pipeline(state, df, epochs=REGISTRY_WARM_EPOCHS)
+        with telemetry.stage('registry_save'):
+            model_registry.save(symbol, params, df, state)
+    else:
+        print(f"[Registry] full fit for {symbol} ({status})")
+        with training_slot(progress):
+            state = fit_pipeline(df, n_test=n_test, time_step=time_step, lstm_units=lstm_units, arima_order=arima_order,
+                                 pipeline_mode=pipeline_mode, meta_learner=meta_learner, symbol=symbol,
+                                 progress=progress, days=days)
+        future_lstm = state.pop('lstm_forecast', None)
+        with telemetry.stage('registry_save'):
+            model_registry.save(symbol, params, df, state)
+
+    with telemetry.stage('forecast'):
+        result = forecast_from_state(state, df, days, intervals=intervals, future_lstm=future_lstm)
+    model_registry.store_result(symbol, params, df, days, result, variant)
+    emit_meta(progress, result)
+    return result
+
+# -------------------------
+# Request helpers shared by the synchronous, job and batch endpoints
+def angel_connector(totp):
+    """Returns a callable that logs in on first use and hands the same session to every later caller."""
+    lock = threading.Lock()
+    session = {}
+
+    def connect():
+        with lock:
+            if 'obj' not in session:
+                obj, err = connect_angelone(totp)
+                if not obj:
+                    print("Angel One connection failed:", err)
+                session['obj'] = obj
+            return session['obj']
+    return connect
+
+def load_history(symbol, totp=None, connector=None):
+    """
+    Fetch daily history for `symbol`, Angel One first and yfinance as fallback.
+    connector: optional angel_connector() shared between several symbols (one login)
+    Returns: (df, source, live, error) where error is None or a (message, http_status) tuple
+    """
+    df = None
+    source = 'yfinance'
+    live = None
+
+    # Try Angel One if creds exist (a TOTP is generated from ANGEL_TOTP_SECRET only if a login is needed)
+    can_try_angel = angel_sessions.configured
+
+    if can_try_angel:
+        connector = connector or angel_connector(totp)
+        session = {}
+
+        def fetch_angel(start):
+            # only logs in when the local store actually needs new bars
+            obj = connector()
+            if not obj:
+                return None
+            session['obj'] = obj
+            return get_angelone_data(obj, symbol, from_date=start.strftime("%Y-%m-%d %H:%M"),
+                                     to_date=datetime.now().strftime("%Y-%m-%d %H:%M"))
+
+        df_a, cache_status = ohlcv_store.get('angel_one', symbol, 'ONE_DAY', fetch_angel,
+                                             start=default_start(), columns=['Close', 'Volume'])
+        telemetry.CACHE.inc(cache='ohlcv_angel_one', result=cache_status)
+        if df_a is not None and len(df_a) > 200:
+            df = df_a
+            source = 'angel_one'
+            print(f"Angel One history for {symbol}: {len(df_a)} rows (store {cache_status})")
+            # try to fetch live quote
+            if 'obj' in session:
+                live = get_live_quote(session['obj'], symbol)
+        else:
+            print("Angel One returned insufficient historical data; falling back to yfinance.")
+
+    # fallback: yfinance
+    if df is None or len(df) < 200:
+        sym_yf = symbol.replace('-EQ', '.NS')
+        df, cache_status = ohlcv_store.get('yfinance', sym_yf, 'ONE_DAY', lambda start: get_yfinance_data(sym_yf, start),
+                                           start=datetime(2010, 1, 1), columns=['Close', 'Volume'])
+        telemetry.CACHE.inc(cache='ohlcv_yfinance', result=cache_status)
+        if df is None or df.empty:
+            return None, source, live, ('Failed to download data from yfinance', 500)
+        print(f"yfinance history for {sym_yf}: {len(df)} rows (store {cache_status})")
+
+    if len(df) < 200:
+        return None, source, live, ('Insufficient historical data (need >200 rows)', 400)
+    return df, source, live, None
+
+def forecast_context(df, source, live):
+    """Response fields that depend only on the loaded data (everything except 'results')."""
+    historical_df = df.tail(60)
+    historical_data = {
+        'dates': historical_df.index.strftime('%Y-%m-%d').tolist(),
+        'prices': [float(x) for x in historical_df['Close'].tolist()]
+    }
+    return {
+        'success': True,
+        'data_source': source,
+        'live_quote': live,
+        'latest_close': float(df['Close'].iloc[-1]),
+        'data_range': {
+            'start': df.index[0].strftime('%Y-%m-%d'),
+            'end': df.index[-1].strftime('%Y-%m-%d'),
+            'records': len(df)
+        },
+        'historical': historical_data
+    }
+
+def parse_pipeline_mode(value):
+    """Returns: (mode, error) for a request's pipeline_mode (None -> PIPELINE_MODE)"""
+    mode = value or PIPELINE_MODE
+    if mode not in PIPELINE_MODES:
+        return None, f"pipeline_mode must be one of {list(PIPELINE_MODES)}"
+    return mode, None
+
+def parse_meta_learner(value):
+    """Returns: (name, error) for a request's meta_learner (None -> META_LEARNER)"""
+    name = value or META_LEARNER
+    if name not in META_LEARNERS:
+        return None, f"meta_learner must be one of {list(META_LEARNERS)}"
+    return name, None
+
+def parse_intervals(data):
+    """Returns: (intervals, error) for a request's intervals / interval_paths / interval_method (None when off)"""
+    if not data.get('intervals'):
+        return None, None
+    method = data.get('interval_method') or FORECAST_INTERVAL_METHOD
+    if method not in INTERVAL_METHODS:
+        return None, f"interval_method must be one of {list(INTERVAL_METHODS)}"
+    try:
+        paths = int(data.get('interval_paths') or FORECAST_INTERVAL_PATHS)
+    except (TypeError, ValueError):
+        return None, "interval_paths must be an integer"
+    if not 10 <= paths <= FORECAST_INTERVAL_MAX_PATHS:
+        return None, f"interval_paths must be between 10 and {FORECAST_INTERVAL_MAX_PATHS}"
+    return {'paths': paths, 'method': method}, None
+
+def parse_precision(value):
+    """Returns: (decimals, error) for a request's v2 precision (None -> RESPONSE_PRECISION), clamped to 0..10"""
+    if value is None or value == '':
+        return RESPONSE_PRECISION, None
+    try:
+        return min(max(int(value), 0), 10), None
+    except (TypeError, ValueError):
+        return None, "precision must be an integer"
+
+def forecast_job_key(symbol, days, df, pipeline_mode=None, meta_learner=None):
+    """Dedup key for forecast jobs: identical requests (symbol, horizon, last bar, mode, learner) share one run."""
+    return (symbol, days, df.index[-1].isoformat(), pipeline_mode or PIPELINE_MODE, meta_learner or META_LEARNER)
+
+def run_forecast_job(symbol, df, days, pipeline_mode=None, meta_learner=None):
+    """Entry point executed inside a job worker process."""
+    return forecast_with_registry(symbol, df, days=days, pipeline_mode=pipeline_mode, meta_learner=meta_learner,
+                                  arima_order=ARIMA_ORDER)
+
+def fit_intraday(df):
+    """
+    Models for an intraday feed; fast mode, since feeds refit every INTRADAY_REFIT_BARS bars.
+    Holds a training slot like the request paths. Raises: Rejected when none frees up in time
+    """
+    ensure_tf()
+    with training_slot():
+        return fit_pipeline(df, pipeline_mode='fast')
+
+def iter_batch_forecast(symbols, days=7, totp=None, pipeline_mode=None, meta_learner=None):
+    """
+    Forecast several symbols: candles are fetched concurrently over one Angel One session,
+    each pipeline runs in the job process pool, and a result dict is yielded per symbol
+    as soon as it finishes (failures are yielded per symbol and never abort the batch).
+    Symbols beyond FORECAST_JOB_MAX_QUEUE waiting jobs get a 'queue' failure with retry_after.
+    Fetches and jobs are waited on together, so a finished forecast never waits for the
+    slowest download.
+    """
+    connector = angel_connector(totp)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(BATCH_FETCH_THREADS, len(symbols)))) as io:
+        # future -> symbol for a fetch, or [(symbol, context)] for a job (shared by deduplicated symbols)
+        pending = {io.submit(load_history, sym, totp, connector): sym for sym in symbols}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                waiting = pending.pop(fut)
+                if isinstance(waiting, list):
+                    for symbol, context in waiting:
+                        try:
+                            yield dict(context, symbol=symbol, results=fut.result())
+                        except Exception as e:
+                            yield {'symbol': symbol, 'success': False, 'stage': 'forecast', 'error': str(e)}
+                    continue
+                symbol = waiting
+                try:
+                    df, source, live, err = fut.result()
+                except Exception as e:
+                    df, err = None, (str(e), 500)
+                if err:
+                    yield {'symbol': symbol, 'success': False, 'stage': 'data', 'error': err[0]}
+                    continue
+                key = forecast_job_key(symbol, days, df, pipeline_mode, meta_learner)
+                context = forecast_context(df, source, live)
+                try:
+                    job, _ = forecast_jobs.submit(key, run_forecast_job, symbol, df, days, pipeline_mode, meta_learner,
+                                                  context=context, max_queued=FORECAST_JOB_MAX_QUEUE)
+                except Rejected as e:
+                    telemetry.REJECTED.inc(queue='jobs', reason='queue_full')
+                    yield {'symbol': symbol, 'success': False, 'stage': 'queue', 'error': e.reason,
+                           'retry_after': e.retry_after}
+                    continue
+                pending.setdefault(forecast_jobs.future(job['job_id']), []).append((symbol, context))
 
 # -------------------------
 # Flask endpoints (mirrors original)
@@ -418,98 +1134,477 @@ def forecast():
         totp = data.get('totp')
         symbol = data.get('symbol', 'RELIANCE-EQ')
         days = int(data.get('forecast_days', 7) or 7)
+        pipeline_mode, err = parse_pipeline_mode(data.get('pipeline_mode'))
+        if not err:
+            meta_learner, err = parse_meta_learner(data.get('meta_learner'))
+        if not err:
+            intervals, err = parse_intervals(data)
+        if err:
+            return jsonify({'success': False, 'error': err}), 400
+        want_timings = bool(data.get('timings')) or request.args.get('timings') == '1'
+        encoding, err = negotiate(request.args.get('format') or data.get('format'), request.headers.get('Accept'))
+        if err:
+            return jsonify({'success': False, 'error': err}), 406
+        precision, err = parse_precision(request.args.get('precision', data.get('precision')))
+        if err:
+            return jsonify({'success': False, 'error': err}), 400
+
+        t0 = time.perf_counter()
+        with telemetry.recording() as timings:
+            df, source, live, err = load_history(symbol, totp)
+            if err:
+                return jsonify({'success': False, 'error': err[0]}), err[1]
+
+            def compute():
+                # Run the heavy pipeline (synchronous); the pipeline never mutates df, so the read-only store view is passed as is
+                response = forecast_context(df, source, live)
+                response['results'] = forecast_with_registry(symbol, df, days=days, pipeline_mode=pipeline_mode,
+                                                             meta_learner=meta_learner, intervals=intervals,
+                                                             **FORECAST_PARAMS)
+                if encoding == 'v1':
+                    return app.json.dumps(response).encode()
+                return encode_response(response, encoding, precision)[0]
+
+            if response_cache is None:
+                body, status, entry = compute(), 'disabled', None
+            else:
+                # the forecast only changes when a new bar arrives (or the latest, still open bar is updated)
+                key = cache_key(symbol=symbol, source=source, days=days, pipeline_mode=pipeline_mode,
+                                meta_learner=meta_learner, params=FORECAST_PARAMS, encoding=encoding,
+                                precision=precision if encoding != 'v1' else None, last_bar=[df.index[-1].isoformat(),
+                                                                  float(df['Close'].iloc[-1]),
+                                                                  float(df['Volume'].iloc[-1])],
+                                **({'intervals': intervals} if intervals else {}))  # point-only keys unchanged
+                etag = etag_for(key)
+                entry, status = response_cache.lookup(key)
+                if not_modified(etag, entry['created_at'] if entry else None,
+                                request.headers.get('If-None-Match'), request.headers.get('If-Modified-Since')):
+                    telemetry.CACHE.inc(cache='forecast_response', result='not_modified')
+                    response = make_response('', 304)
+                    response.headers['ETag'] = etag
+                    if entry:
+                        response.headers['Last-Modified'] = http_date(entry['created_at'])
+                    return response
+                if entry is None:
+                    entry, status = response_cache.get_or_compute(key, compute)
+                telemetry.CACHE.inc(cache='forecast_response', result=status)
+                body = entry['body']
+
+        # seconds per stage run for this request (stages skipped thanks to caches are absent)
+        timings = dict({k: round(v, 4) for k, v in timings.items()}, total=round(time.perf_counter() - t0, 4))
+        if want_timings and encoding == 'v1':
+            payload = json.loads(body)
+            payload['timings'] = timings
+            response = jsonify(payload)
+        else:
+            response = Response(body, content_type=CONTENT_TYPES[encoding])
+            if want_timings:
+                # v2 bodies stay cacheable as they are: the breakdown goes in a header (milliseconds)
+                response.headers['Server-Timing'] = ', '.join(f"{k};dur={v * 1000:.1f}" for k, v in timings.items())
+        response.headers['X-Cache'] = status
+        response.headers['Vary'] = 'Accept'
+        if entry is not None:
+            response.headers['ETag'] = etag
+            response.headers['Last-Modified'] = http_date(entry['created_at'])
+            response.headers['Cache-Control'] = 'no-cache'  # clients may keep it but must revalidate
+        return response
+    except Rejected as e:
+        print(f"Forecast for {symbol} rejected: {e.reason}")
+        return rejection_response(e, 'training')
+    except Exception as e:
+        print("Forecast API error:", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        df = None
-        source = 'yfinance'
-        live = None
-
-        # Try Angel One if creds exist
-        can_try_angel = all([ANGEL_API_KEY, ANGEL_CLIENT_ID, ANGEL_PASSWORD])
+@app.route('/api/forecast/jobs', methods=['POST', 'OPTIONS'])
+def submit_forecast_job():
+    try:
+        data = request.get_json(force=True, silent=True) or {}
+        totp = data.get('totp')
+        symbol = data.get('symbol', 'RELIANCE-EQ')
+        days = int(data.get('forecast_days', 7) or 7)
+        pipeline_mode, err = parse_pipeline_mode(data.get('pipeline_mode'))
+        if not err:
+            meta_learner, err = parse_meta_learner(data.get('meta_learner'))
+        if err:
+            return jsonify({'success': False, 'error': err}), 400
+
+        df, source, live, err = load_history(symbol, totp)
+        if err:
+            return jsonify({'success': False, 'error': err[0]}), err[1]
+
+        key = forecast_job_key(symbol, days, df, pipeline_mode, meta_learner)
+        job, created = forecast_jobs.submit(key, run_forecast_job, symbol, df, days, pipeline_mode, meta_learner,
+                                            context=forecast_context(df, source, live), max_queued=FORECAST_JOB_MAX_QUEUE)
+        print(f"Forecast job {job['job_id']} for {symbol}: {'queued' if created else 'joined in-flight job'}")
+        response = jsonify({'success': True, 'job_id': job['job_id'], 'status': job['status'],
+                            'deduplicated': not created})
+        response.headers['Location'] = f"/api/forecast/jobs/{job['job_id']}"
+        return response, 202
+    except Rejected as e:
+        return rejection_response(e, 'jobs')
+    except Exception as e:
+        print("Forecast job submit error:", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        # Auto-generate TOTP if secret present and totp not supplied
-        if can_try_angel and not totp and ANGEL_TOTP_SECRET:
+@app.route('/api/forecast/batch', methods=['POST', 'OPTIONS'])
+def forecast_batch():
+    data = request.get_json(force=True, silent=True) or {}
+    symbols = data.get('symbols') or list(STOCK_TOKENS.keys())
+    if not isinstance(symbols, list) or not all(isinstance(s, str) for s in symbols):
+        return jsonify({'success': False, 'error': "'symbols' must be a list of strings"}), 400
+    days = int(data.get('forecast_days', 7) or 7)
+    totp = data.get('totp')
+    pipeline_mode, err = parse_pipeline_mode(data.get('pipeline_mode'))
+    if not err:
+        meta_learner, err = parse_meta_learner(data.get('meta_learner'))
+    if err:
+        return jsonify({'success': False, 'error': err}), 400
+    print(f"Batch forecast for {len(symbols)} symbols, {days} days ({pipeline_mode} mode, {meta_learner} meta learner)")
+
+    def generate():
+        # newline-delimited JSON, one object per symbol in completion order
+        for item in iter_batch_forecast(list(dict.fromkeys(symbols)), days=days, totp=totp,
+                                        pipeline_mode=pipeline_mode, meta_learner=meta_learner):
+            yield json.dumps(item) + '\n'
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.route('/api/forecast/stream', methods=['GET'])
+def forecast_stream():
+    """
+    Server-sent events for one forecast: each pipeline stage is pushed as soon as it finishes
+    (data_loaded, arima_test, arima_forecast, lstm_epoch..., lstm_test, meta_test, lstm_forecast,
+    meta) and the last event, 'complete', carries the same body as POST /api/forecast. A 'queued'
+    event is sent first when the training has to wait for an admission slot.
+    """
+    symbol = request.args.get('symbol', 'RELIANCE-EQ')
+    days = int(request.args.get('days', 7) or 7)
+    totp = request.args.get('totp')
+    pipeline_mode, err = parse_pipeline_mode(request.args.get('pipeline_mode'))
+    if not err:
+        meta_learner, err = parse_meta_learner(request.args.get('meta_learner'))
+    if err:
+        return jsonify({'success': False, 'error': err}), 400
+    capacity = training_admission.stats() if training_admission is not None else None
+    if capacity and capacity['queued'] >= capacity['max_queue'] and capacity['active'] >= capacity['max_concurrent']:
+        return rejection_response(Rejected(429, f"Too many forecasts in progress ({capacity['queued']} queued)",
+                                           capacity['retry_after_s']), 'training')
+    print(f"Forecast stream for {symbol}, {days} days ({pipeline_mode} mode)")
+
+    def generate():
+        yield sse_event('started', {'symbol': symbol, 'days': days})
+        df, source, live, err = load_history(symbol, totp)
+        if err:
+            yield sse_event('error', {'success': False, 'stage': 'data', 'error': err[0]})
+            return
+        context = forecast_context(df, source, live)
+        yield sse_event('data_loaded', context)
+
+        events = queue.Queue()
+        cancelled = threading.Event()
+
+        def progress(event, payload):
+            if cancelled.is_set():
+                raise RuntimeError('client disconnected')
+            events.put((event, payload))
+
+        def run():
             try:
-                totp = pyotp.TOTP(ANGEL_TOTP_SECRET).now()
-                print("Auto-generated TOTP using ANGEL_TOTP_SECRET")
+                # same registry entry as POST /api/forecast: a stream then a POST (or the reverse) trains once
+                results = forecast_with_registry(symbol, df, days=days, pipeline_mode=pipeline_mode,
+                                                 meta_learner=meta_learner, progress=progress, **FORECAST_PARAMS)
+                events.put(('complete', dict(context, results=results)))
+            except Rejected as e:
+                events.put(('error', {'success': False, 'stage': 'queue', 'error': e.reason, 'retry_after': e.retry_after}))
             except Exception as e:
-                print("TOTP generation error:", e)
-
-        if can_try_angel and totp:
-            obj, err = connect_angelone(totp)
-            if obj:
-                # request historical in Angel One format
-                from_date = (datetime.now() - timedelta(days=365 * 15)).strftime("%Y-%m-%d 09:15")
-                to_date = datetime.now().strftime("%Y-%m-%d %H:%M")
-                df_a = get_angelone_data(obj, symbol, from_date=from_date, to_date=to_date)
-                if df_a is not None and len(df_a) > 200:
-                    df = df_a[['Close', 'Volume']].dropna()
-                    source = 'angel_one'
-                    # try to fetch live quote
-                    live = get_live_quote(obj, symbol)
-                else:
-                    print("Angel One returned insufficient historical data; falling back to yfinance.")
-            else:
-                print("Angel One connection failed:", err)
-
-        # fallback: yfinance
-        if df is None or len(df) < 200:
-            sym_yf = symbol.replace('-EQ', '.NS')
-            print(f"Downloading {sym_yf} from yfinance...")
-            df = yf.download(sym_yf, start='2010-01-01', progress=False)
-            if df is None or df.empty:
-                return jsonify({'success': False, 'error': 'Failed to download data from yfinance'}), 500
-            df = df[['Close', 'Volume']].dropna()
-
-        if len(df) < 200:
-            return jsonify({'success': False, 'error': 'Insufficient historical data (need >200 rows)'}), 400
-
-        # Run the heavy pipeline (synchronous)
-        results = train_and_forecast(df.copy(), days=days)
-
-        historical_df = df.tail(60)
-        historical_data = {
-            'dates': historical_df.index.strftime('%Y-%m-%d').tolist(),
-            'prices': [float(x) for x in historical_df['Close'].tolist()]
-        }
+                print("Forecast stream error:", e)
+                events.put(('error', {'success': False, 'stage': 'forecast', 'error': str(e)}))
+
+        threading.Thread(target=run, name=f'forecast-stream-{symbol}', daemon=True).start()
+        try:
+            while True:
+                try:
+                    event, payload = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'  # comment line so proxies do not drop an idle stream
+                    continue
+                yield sse_event(event, payload)
+                if event in ('complete', 'error'):
+                    return
+        finally:
+            # the client went away (or we are done): stop training at the next progress callback
+            cancelled.set()
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: do not buffer the stream
+    return response
 
-        response = {
-            'success': True,
-            'data_source': source,
-            'live_quote': live,
-            'results': results,
-            'latest_close': float(df['Close'].iloc[-1]),
-            'data_range': {
-                'start': df.index[0].strftime('%Y-%m-%d'),
-                'end': df.index[-1].strftime('%Y-%m-%d'),
-                'records': len(df)
-            },
-            'historical': historical_data
-        }
-        return jsonify(response)
+@app.route('/api/backtest', methods=['POST', 'OPTIONS'])
+def start_backtest():
+    try:
+        data = request.get_json(force=True, silent=True) or {}
+        symbol = data.get('symbol', 'RELIANCE-EQ')
+        pipeline_mode, err = parse_pipeline_mode(data.get('pipeline_mode'))
+        if not err:
+            meta_learner, err = parse_meta_learner(data.get('meta_learner'))
+        if err:
+            return jsonify({'success': False, 'error': err}), 400
+
+        df, source, live, err = load_history(symbol, data.get('totp'))
+        if err:
+            return jsonify({'success': False, 'error': err[0]}), err[1]
+        params = {k: data.get(k) for k in ('n_test', 'time_step', 'lstm_units')}
+        params['arima_order'] = data.get('arima_order') or ARIMA_ORDER  # 'auto' searches on each fold's training rows
+        params['pipeline_mode'] = pipeline_mode
+        params.update(learner_params(meta_learner))
+        try:
+            bt = Backtest(symbol, df, horizon=int(data.get('horizon', 7)), folds=int(data.get('folds', 10)),
+                          scheme=data.get('scheme', 'expanding'), window=data.get('window'), step=data.get('step'),
+                          params=params, root=BACKTEST_DIR)
+        except (ValueError, TypeError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        with backtest_lock:
+            run = backtest_runs.get(bt.run_id)
+            created = run is None or run['status'] in ('finished', 'failed')
+            if created:
+                run = backtest_runs[bt.run_id] = {'status': 'running', 'folds_total': len(bt.schedule),
+                                                  'folds_done': len(bt.completed()), 'folds_failed': 0,
+                                                  'started_at': time.time(), 'finished_at': None, 'error': None}
+
+        if created:
+            def submit(fn, train, *args):
+                # each fold is a regular forecast job: shared pool, dedup, worker metrics
+                job, _ = forecast_jobs.submit(('backtest', bt.run_id, train.index[-1].isoformat()), fn, train, *args)
+                return forecast_jobs.future(job['job_id'])
+
+            def on_fold(record, error):
+                with backtest_lock:
+                    run['folds_done' if record is not None else 'folds_failed'] += 1
+
+            def coordinate():
+                try:
+                    report = bt.run(submit, on_fold=on_fold)
+                    run['status'] = 'finished' if report['folds_done'] == report['folds_total'] else 'failed'
+                    if run['status'] == 'failed':
+                        run['error'] = f"{len(report['failed_folds'])} fold(s) failed; POST again to retry them"
+                except Exception as e:
+                    print("Backtest error:", e)
+                    run['status'], run['error'] = 'failed', str(e)
+                run['finished_at'] = time.time()
+
+            threading.Thread(target=coordinate, name=f'backtest-{bt.run_id}', daemon=True).start()
+            print(f"Backtest {bt.run_id} for {symbol}: {len(bt.schedule)} folds ({run['folds_done']} checkpointed)")
+
+        response = jsonify({'success': True, 'backtest_id': bt.run_id, 'status': run['status'],
+                            'folds_total': run['folds_total'], 'folds_done': run['folds_done'],
+                            'deduplicated': not created})
+        response.headers['Location'] = f"/api/backtest/{bt.run_id}"
+        return response, 202
     except Exception as e:
-        print("Forecast API error:", e)
+        print("Backtest submit error:", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/backtest/<run_id>', methods=['GET'])
+def get_backtest(run_id):
+    # the checkpoint holds every finished fold, so partial reports (and runs from before a restart) are served too
+    report = load_report(BACKTEST_DIR, run_id) if run_id.isalnum() else None
+    if report is None:
+        return jsonify({'success': False, 'error': 'Unknown backtest id'}), 404
+    with backtest_lock:
+        run = dict(backtest_runs.get(run_id) or {})
+    status = run.get('status') or ('finished' if report['folds_done'] == report['folds_total'] else 'stopped')
+    return jsonify({'success': status != 'failed', 'backtest_id': run_id, 'status': status,
+                    'error': run.get('error'), 'folds_failed': run.get('folds_failed', 0), 'report': report})
+
+def intraday_feed_key(data):
+    """Returns: ((symbol, interval), error) from request args or a JSON body"""
+    symbol = data.get('symbol', 'RELIANCE-EQ')
+    interval = data.get('interval', 'ONE_MINUTE')
+    if interval not in INTERVAL_SECONDS:
+        return None, f"interval must be one of {list(INTERVAL_SECONDS)}"
+    return (symbol, interval), None
+
+@app.route('/api/intraday/feeds', methods=['GET', 'POST', 'OPTIONS'])
+def intraday_feeds_endpoint():
+    if request.method == 'GET':
+        with intraday_lock:
+            feeds = list(intraday_feeds.values())
+        return jsonify({'success': True, 'feeds': [feed.stats() for feed in feeds]})
+    try:
+        data = request.get_json(force=True, silent=True) or {}
+        key, err = intraday_feed_key(data)
+        if err:
+            return jsonify({'success': False, 'error': err}), 400
+        symbol, interval = key
+        source_name = data.get('source', 'angel')
+
+        if source_name == 'replay':
+            # replay files are only read from INTRADAY_REPLAY_DIR
+            name = os.path.basename(str(data.get('replay', '')))
+            path = os.path.join(INTRADAY_REPLAY_DIR, name)
+            if not name or not os.path.isfile(path):
+                return jsonify({'success': False, 'error': f"Replay file '{name}' not found"}), 400
+            source = replay_source(path, interval, speed=float(data.get('speed', 0) or 0))
+        elif source_name == 'angel':
+            if not angel_sessions.configured or instrument_token(symbol) is None:
+                return jsonify({'success': False, 'error': 'Live intraday feeds need Angel One credentials and a known symbol'}), 400
+            connector = angel_connector(data.get('totp'))
+
+            def fetch_bars(start):
+                obj = connector()
+                return get_angelone_data(obj, symbol, from_date=start.strftime("%Y-%m-%d %H:%M"),
+                                         interval=interval) if obj else None
+
+            def quote():
+                obj = connector()
+                return get_live_quote(obj, symbol) if obj else None
+
+            source = angel_source(fetch_bars, interval, INTRADAY_BUFFER_BARS, quote=quote,
+                                  quote_every=INTRADAY_QUOTE_SECONDS)
+        else:
+            return jsonify({'success': False, 'error': "source must be 'angel' or 'replay'"}), 400
+
+        with intraday_lock:
+            feed = intraday_feeds.get(key)
+            if feed is not None and feed.running:
+                return jsonify({'success': True, 'deduplicated': True, 'feed': feed.stats()}), 200
+            feed = intraday_feeds[key] = IntradayFeed(
+                symbol, interval, source, fit=fit_intraday, capacity=INTRADAY_BUFFER_BARS,
+                horizon=int(data.get('horizon', INTRADAY_HORIZON)), refit_bars=INTRADAY_REFIT_BARS,
+                min_bars=INTRADAY_MIN_BARS).start()
+        print(f"Intraday feed started for {symbol} {interval} ({source_name})")
+        return jsonify({'success': True, 'deduplicated': False, 'feed': feed.stats()}), 202
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print("Intraday feed error:", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/intraday/feeds/stop', methods=['POST', 'OPTIONS'])
+def stop_intraday_feed():
+    key, err = intraday_feed_key(request.get_json(force=True, silent=True) or {})
+    if err:
+        return jsonify({'success': False, 'error': err}), 400
+    with intraday_lock:
+        feed = intraday_feeds.pop(key, None)
+    if feed is None:
+        return jsonify({'success': False, 'error': 'No such intraday feed'}), 404
+    feed.stop()
+    return jsonify({'success': True, 'feed': feed.stats()})
+
+@app.route('/api/intraday/forecast', methods=['GET'])
+def intraday_forecast():
+    key, err = intraday_feed_key(request.args)
+    if err:
+        return jsonify({'success': False, 'error': err}), 400
+    with intraday_lock:
+        feed = intraday_feeds.get(key)
+    if feed is None:
+        return jsonify({'success': False, 'error': 'No such intraday feed'}), 404
+    if feed.latest is None:
+        return jsonify({'success': False, 'error': f"No forecast yet (feed is {feed.status})", 'feed': feed.stats()}), 409
+    return jsonify(dict(feed.latest, success=True))
+
+@app.route('/api/intraday/stream', methods=['GET'])
+def intraday_stream():
+    """Server-sent events: the latest forecast, then a 'forecast' event per bar until the feed stops."""
+    key, err = intraday_feed_key(request.args)
+    if err:
+        return jsonify({'success': False, 'error': err}), 400
+    with intraday_lock:
+        feed = intraday_feeds.get(key)
+    if feed is None:
+        return jsonify({'success': False, 'error': 'No such intraday feed'}), 404
+    updates = feed.subscribe()
+
+    def generate():
+        try:
+            if feed.latest is not None:
+                yield sse_event('forecast', feed.latest)
+            while feed.running or not updates.empty():
+                try:
+                    payload = updates.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield sse_event(payload['event'], payload)
+                if payload['event'] == 'closed':
+                    return
+        finally:
+            feed.unsubscribe(updates)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/forecast/jobs/<job_id>', methods=['GET'])
+def get_forecast_job(job_id):
+    job = forecast_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown or expired job id'}), 404
+    body = {'success': job['status'] != 'failed', 'job_id': job_id, 'status': job['status'],
+            'submitted_at': job['submitted_at'], 'finished_at': job['finished_at']}
+    if job['status'] == 'succeeded':
+        body['result'] = dict(job['context'], results=job['result'])
+    elif job['status'] == 'failed':
+        body['error'] = job['error']
+    return jsonify(body)
+
+@app.route('/api/capacity', methods=['GET'])
+def capacity():
+    """Training slots, queue depth and recent queue waits, plus the background job pool, so clients can back off."""
+    return jsonify({'success': True, 'training': training_admission.stats() if training_admission else None,
+                    'jobs': dict(forecast_jobs.stats(), max_queue=FORECAST_JOB_MAX_QUEUE),
+                    'threads': serving_threads})
+
 @app.route('/api/stocks', methods=['GET'])
 def get_stocks():
-    stocks = [
-        {'symbol': 'RELIANCE-EQ', 'name': 'Reliance Industries'},
-        {'symbol': 'TCS-EQ', 'name': 'Tata Consultancy Services'},
-        {'symbol': 'INFY-EQ', 'name': 'Infosys'},
-        {'symbol': 'HDFCBANK-EQ', 'name': 'HDFC Bank'},
-        {'symbol': 'ICICIBANK-EQ', 'name': 'ICICI Bank'},
-        {'symbol': 'SBIN-EQ', 'name': 'State Bank of India'},
-        {'symbol': 'TATAMOTORS-EQ', 'name': 'Tata Motors'},
-        {'symbol': 'WIPRO-EQ', 'name': 'Wipro'},
-        {'symbol': 'ITC-EQ', 'name': 'ITC'},
-        {'symbol': 'BHARTIARTL-EQ', 'name': 'Bharti Airtel'}
-    ]
-    return jsonify({'success': True, 'stocks': stocks})
+    """
+    Without ?q=: the default list. With ?q=: symbol/name prefix search over the instrument
+    master (or the built-in list until it is indexed), optionally filtered by ?exchange=
+    (NSE, BSE, NFO, ...) and ?segment= (EQ, BE, FUTSTK, OPTIDX, ...); ?limit= caps the results.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': True, 'stocks': DEFAULT_STOCKS})
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), STOCK_SEARCH_MAX_RESULTS)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit must be an integer'}), 400
+    exchange, segment = request.args.get('exchange'), request.args.get('segment')
+    stocks = instrument_master.search(query, exchange=exchange, segment=segment, limit=limit)
+    stats = instrument_master.stats()
+    source = 'instrument_master'
+    if not stats['loaded']:
+        q = query.upper()
+        stocks = [dict(s, token=STOCK_TOKENS[s['symbol']], exchange='NSE', segment='EQ') for s in DEFAULT_STOCKS
+                  if (s['symbol'].startswith(q) or s['name'].upper().startswith(q))
+                  and (not exchange or exchange.upper() == 'NSE') and (not segment or segment.upper() == 'EQ')][:limit]
+        source = 'builtin'
+    return jsonify({'success': True, 'stocks': stocks, 'source': source, 'instruments': stats['count']})
 
 @app.route('/health', methods=['GET'])
 def health():
+    # liveness only: never touches TensorFlow, answers as soon as Flask is up
     return jsonify({'status': 'healthy'})
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(telemetry.REGISTRY.render(), content_type=telemetry.CONTENT_TYPE)
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    if not WARMUP_ON_START:
+        return jsonify({'status': 'ready', 'warmup': 'disabled'})
+    status = 'ready' if warmup_state['ready'] else ('failed' if warmup_state['error'] else 'warming')
+    body = {'status': status, 'stages': warmup_state['stages'], 'error': warmup_state['error']}
+    return jsonify(body), 200 if warmup_state['ready'] else 503
+
 @app.route('/api/forecast-mock', methods=['POST'])
 def forecast_mock():
     try:
@@ -546,6 +1641,62 @@ def forecast_mock():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# -------------------------
+# Warm-up: import the ML stack and trace a tiny LSTM in a background thread so the first
+# forecast does not pay for it; /health answers immediately, /ready once this has finished.
+WARMUP_ON_START = os.getenv('WARMUP_ON_START', '1').lower() in ('1', 'true', 'yes')
+WARMUP_REGISTRY_ENTRIES = int(os.getenv('WARMUP_REGISTRY_ENTRIES', 4))
+warmup_state = {'started': False, 'ready': False, 'error': None, 'stages': {}}
+
+def _warm_lstm_runtime():
+    ensure_tf()
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Input, LSTM, Dense
+    model = Sequential([Input(shape=(60, 2)), LSTM(8), Dense(1)])
+    rollout_scaled(model, np.zeros((1, 60, 2), dtype=np.float32), 2)  # initializes kernels and tf.function tracing
+
+def warm_up():
+    if INFERENCE_RUNTIME == 'numpy':
+        # serving stored models only needs statsmodels (the pickled ARIMA results)
+        stages = [('statsmodels', lambda: importlib.import_module('statsmodels.tsa.arima.model'))]
+    else:
+        stages = [
+            ('tensorflow', ensure_tf),
+            ('sklearn', lambda: importlib.import_module('sklearn.preprocessing')),
+            ('statsmodels', lambda: importlib.import_module('statsmodels.tsa.arima.model')),
+            ('yfinance', lambda: importlib.import_module('yfinance')),
+            ('lstm_runtime', _warm_lstm_runtime),
+        ]
+    stages.append(('instruments', lambda: instrument_master.refresh(wait=True)))
+    if model_registry is not None:
+        stages.append(('registry', lambda: model_registry.preload(WARMUP_REGISTRY_ENTRIES)))
+    try:
+        for name, fn in stages:
+            t0 = time.perf_counter()
+            fn()
+            warmup_state['stages'][name] = round(time.perf_counter() - t0, 3)
+        warmup_state['ready'] = True
+        print(f"Warm-up finished: {warmup_state['stages']}")
+    except Exception as e:
+        warmup_state['error'] = str(e)
+        print("Warm-up failed:", e)
+
+_warmup_lock = threading.Lock()
+
+@app.before_request
+def start_warm_up():
+    """
+    Start the warm-up thread once per serving process: from the server entry point, or on
+    the first request under a WSGI server (e.g. the /ready probe). Importing this module
+    (CLI tools, job-pool workers) never starts it.
+    """
+    with _warmup_lock:
+        if not WARMUP_ON_START or warmup_state['started']:
+            return
+        warmup_state['started'] = True
+    threading.Thread(target=warm_up, name='ml-warmup', daemon=True).start()
+
 # -------------------------
 if __name__ == '__main__':
+    start_warm_up()
     app.run(debug=True, host='0.0.0.0', port=int(os.getenv('PORT', 5000)))
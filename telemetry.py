@@ -0,0 +1,278 @@
+# telemetry.py
+# In-process metrics for the forecasting API, exported in the Prometheus text format
+# (no client library needed): stage duration histograms, LSTM epochs actually run,
+# rows processed, cache hit/miss counters and gauges. Job-pool workers forward their
+# observations to the parent process over a queue, so /metrics covers them too.
+# Also holds the per-request timing breakdown and an opt-in cProfile hook.
+
+import io
+import os
+import time
+import queue
+import pstats
+import cProfile
+import threading
+import contextvars
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+LOG_STAGES = os.getenv('TELEMETRY_LOG_STAGES', '0').lower() in ('1', 'true', 'yes')
+
+_forward_queue = None  # set in job-pool workers: observations go to the parent instead
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=(), registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}  # label values tuple -> value (or histogram state)
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _record(self, op, value, labels):
+        key = self._key(labels)
+        if _forward_queue is not None:
+            _forward_queue.put((self.name, op, key, value))
+        else:
+            self._apply(op, key, value)
+
+    def _apply(self, op, key, value):
+        raise NotImplementedError
+
+    def samples(self):
+        """[(suffix, label values, extra labels, value)] for the exposition format."""
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self._record('inc', amount, labels)
+
+    def _apply(self, op, key, value):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self):
+        with self._lock:
+            return [('', key, (), value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        self._record('set', value, labels)
+
+    def dec(self, amount=1, **labels):
+        self._record('inc', -amount, labels)
+
+    def _apply(self, op, key, value):
+        if op == 'set':
+            with self._lock:
+                self._values[key] = value
+        else:
+            super()._apply(op, key, value)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        super().__init__(name, help, labelnames, registry)
+
+    def observe(self, value, **labels):
+        self._record('observe', value, labels)
+
+    def _apply(self, op, key, value):
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, state['counts']):
+                    cumulative += count
+                    out.append(('_bucket', key, (('le', _format_value(bound)),), cumulative))
+                out.append(('_sum', key, (), state['sum']))
+                out.append(('_count', key, (), state['count']))
+        return out
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def add_collector(self, fn):
+        """fn() is called before every render, e.g. to set gauges from current state."""
+        self._collectors.append(fn)
+
+    def render(self):
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception as e:
+                print("Metrics collector error:", e)
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, key, extra, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(metric.labelnames, key, extra)} "
+                             f"{_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+STAGE_SECONDS = Histogram('forecast_stage_duration_seconds',
+                          'Wall time of data fetching and pipeline stages', ['stage'])
+LSTM_EPOCHS = Histogram('forecast_lstm_epochs', 'Epochs an LSTM training ran before stopping', ['phase'],
+                        buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100))
+ROWS = Counter('forecast_rows_processed_total', 'Rows (bars) handled by a stage', ['stage'])
+CACHE = Counter('forecast_cache_requests_total', 'Cache lookups by cache and outcome', ['cache', 'result'])
+HTTP_SECONDS = Histogram('http_request_duration_seconds', 'HTTP request latency',
+                         ['endpoint', 'method', 'status'])
+HTTP_IN_FLIGHT = Gauge('http_requests_in_flight', 'HTTP requests currently being served')
+JOBS = Gauge('forecast_jobs', 'Background forecast jobs by status', ['status'])
+TRAININGS = Gauge('forecast_trainings', 'Trainings in the serving process by state (active, queued)', ['state'])
+QUEUE_WAIT = Histogram('forecast_queue_wait_seconds', 'Time admitted trainings waited for a slot')
+REJECTED = Counter('forecast_rejected_total', 'Requests turned away by admission control', ['queue', 'reason'])
+
+# -------------------------
+# Stage timing and the per-request breakdown
+_current_stage = contextvars.ContextVar('telemetry_stage', default=None)
+_breakdown = contextvars.ContextVar('telemetry_breakdown', default=None)
+
+
+def current_stage():
+    return _current_stage.get()
+
+
+@contextmanager
+def stage(name, rows=None):
+    """Time a block as `name`: feeds the stage histogram and any active recording()."""
+    token = _current_stage.set(name)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        _current_stage.reset(token)
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        if rows:
+            ROWS.inc(rows, stage=name)
+        breakdown = _breakdown.get()
+        if breakdown is not None:
+            breakdown[name] = breakdown.get(name, 0.0) + elapsed
+        if LOG_STAGES:
+            print(f"[stage] {name}: {elapsed:.3f}s")
+
+
+@contextmanager
+def recording():
+    """Collect {stage: seconds} for the stages run by this thread inside the block."""
+    breakdown = {}
+    token = _breakdown.set(breakdown)
+    try:
+        yield breakdown
+    finally:
+        _breakdown.reset(token)
+
+
+# -------------------------
+# Forwarding from job-pool workers
+def forward_to(q):
+    """Called in a worker process: send every observation to the parent over `q`."""
+    global _forward_queue
+    _forward_queue = q
+
+
+def start_drain(q):
+    """Parent side of forward_to: apply observations arriving on `q` in a daemon thread."""
+    def drain():
+        while True:
+            try:
+                name, op, key, value = q.get()
+            except (EOFError, OSError):
+                return
+            except queue.Empty:
+                continue
+            metric = REGISTRY.get(name)
+            if metric is not None:
+                metric._apply(op, key, value)
+    thread = threading.Thread(target=drain, name='telemetry-drain', daemon=True)
+    thread.start()
+    return thread
+
+
+# -------------------------
+# Opt-in cProfile hook for single requests
+_profile_lock = threading.Lock()
+
+
+def start_profile():
+    """Start profiling the calling thread; None when another request is already being profiled."""
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def finish_profile(profiler, directory, label, top=25):
+    """Stop `profiler`, write a .prof file (for snakeviz/pstats) and print the top functions."""
+    try:
+        profiler.disable()
+    finally:
+        _profile_lock.release()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{label}.prof")
+    profiler.dump_stats(path)
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(top)
+    print(summary.getvalue())
+    return path
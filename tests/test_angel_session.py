@@ -0,0 +1,167 @@
+# tests/test_angel_session.py
+import base64
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import angel_session
+from angel_session import AngelSessionManager, CandleFetchError, chunk_ranges, fetch_candles
+
+
+def jwt(exp):
+    payload = base64.urlsafe_b64encode(json.dumps({'exp': exp}).encode()).decode().rstrip('=')
+    return f"header.{payload}.signature"
+
+
+class FakeSmartConnect:
+    """generateSession / generateToken with tokens expiring `ttl` seconds after they are issued."""
+
+    def __init__(self, ttl=3600, refresh_ok=True):
+        self.ttl = ttl
+        self.refresh_ok = refresh_ok
+        self.access_token = None
+
+    def generateSession(self, client_id, password, totp):
+        return {'status': True, 'data': {'jwtToken': jwt(time.time() + self.ttl), 'refreshToken': 'refresh-1'}}
+
+    def generateToken(self, refresh_token):
+        if not self.refresh_ok:
+            return {'status': False, 'message': 'Invalid Refresh Token', 'errorcode': 'AG8003'}
+        return {'status': True, 'data': {'jwtToken': 'Bearer ' + jwt(time.time() + self.ttl),
+                                         'refreshToken': 'refresh-2'}}
+
+    def setAccessToken(self, token):
+        self.access_token = token
+
+
+def manager(**kwargs):
+    clients = []
+
+    def factory():
+        clients.append(FakeSmartConnect(**kwargs))
+        return clients[-1]
+    return AngelSessionManager('key', 'client', 'pin', refresh_margin=300, smartconnect_factory=factory), clients
+
+
+def test_session_is_reused_while_valid():
+    sessions, clients = manager()
+    obj, err = sessions.get('123456')
+    assert err is None
+    assert sessions.get() == (obj, None)
+    assert (sessions.logins, sessions.refreshes, len(clients)) == (1, 0, 1)
+
+
+def test_expiring_session_is_refreshed_not_logged_in_again():
+    sessions, clients = manager(ttl=60)  # inside the refresh margin straight away
+    obj, _ = sessions.get('123456')
+    assert sessions.get() == (obj, None)  # no TOTP needed for a refresh
+    assert (sessions.logins, sessions.refreshes, len(clients)) == (1, 1, 1)
+    assert obj.access_token.count('.') == 2  # "Bearer " prefix stripped
+
+
+def test_failed_refresh_falls_back_to_login():
+    sessions, clients = manager(ttl=60, refresh_ok=False)
+    sessions.get('123456')
+    obj, err = sessions.get('654321')
+    assert err is None and obj is clients[-1]
+    assert (sessions.logins, sessions.refreshes, len(clients)) == (2, 0, 2)
+
+
+def test_expired_session_without_totp_is_an_error():
+    sessions, _ = manager(ttl=60, refresh_ok=False)
+    sessions.get('123456')
+    obj, err = sessions.get()
+    assert obj is None and 'TOTP' in err
+
+
+def test_invalidate_forces_a_refresh():
+    sessions, _ = manager()
+    sessions.get('123456')
+    sessions.invalidate()
+    sessions.get()
+    assert (sessions.logins, sessions.refreshes) == (1, 1)
+
+
+def test_invalidate_keeps_a_session_renewed_since_the_rejected_call():
+    sessions, _ = manager()
+    started = time.time() - 1
+    sessions.get('123456')  # renewed after the rejected call started
+    sessions.invalidate(issued_before=started)
+    sessions.get()
+    assert sessions.refreshes == 0
+    sessions.invalidate(issued_before=time.time() + 1)
+    sessions.get()
+    assert sessions.refreshes == 1
+
+
+class FakeCandles:
+    """getCandleData with one daily candle per chunk; `responses` overrides the answers for a chunk start."""
+
+    def __init__(self, responses=None):
+        self.responses = responses or {}
+        self.calls = []
+
+    def getCandleData(self, params):
+        self.calls.append(params['fromdate'])
+        queued = self.responses.get(params['fromdate'])
+        if queued:
+            return queued.pop(0)
+        return {'status': True, 'data': [[params['fromdate'].replace(' ', 'T'), 1, 2, 0.5, 1.5, 100]]}
+
+
+def test_chunk_ranges_split_at_the_interval_limit():
+    start = datetime(2024, 1, 1)
+    ranges = chunk_ranges(start, start + timedelta(days=60), 'ONE_MINUTE')  # 30 days per request
+    assert ranges[0] == (start, start + timedelta(days=30))
+    assert ranges[1][0] == start + timedelta(days=30, minutes=1)  # no overlap, no gap
+    assert ranges[-1][1] == start + timedelta(days=60)
+    assert len(ranges) == 2
+    assert len(chunk_ranges(start, start + timedelta(days=61), 'ONE_MINUTE')) == 3
+    assert chunk_ranges(start, start + timedelta(days=30), 'ONE_MINUTE') == [(start, start + timedelta(days=30))]
+    assert chunk_ranges(start, start, 'ONE_DAY') == []
+
+
+def test_rate_limited_chunk_is_retried(monkeypatch):
+    monkeypatch.setattr(angel_session.time, 'sleep', lambda s: None)
+    start = datetime(2024, 1, 1)
+    limited = {'status': False, 'errorcode': 'AB1019', 'message': 'Access denied because of exceeding access rate'}
+    obj = FakeCandles({'2024-01-01 00:00': [limited, limited]})
+    df = fetch_candles(obj, '2885', start, start + timedelta(days=4000), max_workers=1)
+    assert obj.calls.count('2024-01-01 00:00') == 3
+    assert len(df) == 2 and list(df.columns) == ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def test_chunk_still_rate_limited_fails_the_fetch(monkeypatch):
+    monkeypatch.setattr(angel_session.time, 'sleep', lambda s: None)
+    start = datetime(2024, 1, 1)
+    limited = {'status': False, 'errorcode': 'AB1019', 'message': 'rate'}
+    obj = FakeCandles({'2024-01-01 00:00': [limited] * 3})
+    with pytest.raises(CandleFetchError, match='rate limited'):
+        fetch_candles(obj, '2885', start, start + timedelta(days=10), retries=2)
+
+
+def test_failed_chunk_fails_the_fetch():
+    start = datetime(2024, 1, 1)
+    second = chunk_ranges(start, start + timedelta(days=4000), 'ONE_DAY')[1][0].strftime('%Y-%m-%d %H:%M')
+    obj = FakeCandles({second: [{'status': False, 'errorcode': 'AB2001', 'message': 'Internal Error'}]})
+    with pytest.raises(CandleFetchError, match='Internal Error'):
+        fetch_candles(obj, '2885', start, start + timedelta(days=4000))
+
+
+def test_empty_chunk_is_not_an_error():
+    start = datetime(2024, 1, 1)
+    obj = FakeCandles({'2024-01-01 00:00': [{'status': True, 'data': None}]})
+    assert fetch_candles(obj, '2885', start, start + timedelta(days=10)) is None
+
+
+def test_rejected_token_raises_auth_error():
+    start = datetime(2024, 1, 1)
+    obj = FakeCandles({'2024-01-01 00:00': [{'status': False, 'errorcode': 'AG8001', 'message': 'Invalid Token'}]})
+    with pytest.raises(angel_session.AngelAuthError):
+        fetch_candles(obj, '2885', start, start + timedelta(days=10))
@@ -0,0 +1,45 @@
+# tests/test_forecast_engine.py
+import gc
+import os
+import sys
+import weakref
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+
+import forecast_engine
+
+
+def small_lstm(time_step=5, features=2):
+    import tensorflow as tf
+    return tf.keras.Sequential([
+        tf.keras.Input((time_step, features)),
+        tf.keras.layers.LSTM(4),
+        tf.keras.layers.Dense(1),
+    ])
+
+
+def test_compiled_rollout_does_not_keep_model_alive():
+    refs = []
+    for _ in range(3):
+        model = small_lstm()
+        forecast_engine.rollout_scaled(model, np.zeros((2, 5, 2)), 3)
+        refs.append(weakref.ref(model))
+        del model
+    gc.collect()
+    assert all(ref() is None for ref in refs)
+    assert len(forecast_engine._rollouts) == 0
+
+
+def test_rollout_matches_step_by_step_predict():
+    model = small_lstm()
+    window = np.random.default_rng(0).random((5, 2)).astype(np.float32)
+    expected, x = [], window.copy()
+    for _ in range(4):
+        pred = float(model(x[None, ...], training=False).numpy()[0, 0])
+        expected.append(pred)
+        x = np.vstack([x[1:], [[pred, x[-1, 1]]]])
+    out = forecast_engine.rollout_scaled(model, window, 4)
+    np.testing.assert_allclose(out[0], expected, rtol=1e-5, atol=1e-6)
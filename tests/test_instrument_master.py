@@ -0,0 +1,101 @@
+# tests/test_instrument_master.py
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from instrument_master import InstrumentMaster, _Index, build_index
+
+ROWS = [
+    {'token': '2885', 'symbol': 'RELIANCE-EQ', 'name': 'RELIANCE', 'exch_seg': 'NSE', 'lotsize': '1', 'tick_size': '5.0'},
+    {'token': '500325', 'symbol': 'RELIANCE', 'name': 'RELIANCE', 'exch_seg': 'BSE', 'lotsize': '1', 'tick_size': '5.0'},
+    {'token': '2963', 'symbol': 'RELINFRA-EQ', 'name': 'RELINFRA', 'exch_seg': 'NSE', 'lotsize': '1', 'tick_size': '5.0'},
+    {'token': '2885', 'symbol': 'RELIANCE-BE', 'name': 'RELIANCE', 'exch_seg': 'NSE', 'lotsize': '1', 'tick_size': '5.0'},
+    {'token': '11536', 'symbol': 'TCS-EQ', 'name': 'TCS', 'exch_seg': 'NSE', 'lotsize': '1', 'tick_size': '5.0'},
+    {'token': '35001', 'symbol': 'RELIANCE27JUN24FUT', 'name': 'RELIANCE', 'exch_seg': 'NFO', 'expiry': '27JUN2024',
+     'instrumenttype': 'FUTSTK', 'lotsize': '250', 'tick_size': '5.0'},
+    {'token': '9999', 'symbol': 'TCS-EQ', 'name': 'TCS', 'exch_seg': 'NSE', 'lotsize': '1', 'tick_size': '5.0'},
+    {'token': '1', 'symbol': '', 'name': 'BLANK', 'exch_seg': 'NSE'},
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    count = build_index(ROWS, str(tmp_path))
+    assert count == len(ROWS) - 1  # rows without a symbol are dropped
+    return _Index(str(tmp_path), 'test')
+
+
+def write_master(path, rows, mtime):
+    path.write_text(json.dumps(rows))
+    os.utime(path, (mtime, mtime))
+
+
+def test_find_is_case_insensitive(index):
+    assert index.find('reliance-eq', 'nse')['token'] == b'2885'
+    assert index.find('RELIANCE', 'BSE')['token'] == b'500325'
+    assert index.find('RELIANCE', 'NSE') is None
+    assert index.find('INFY-EQ', 'NSE') is None
+
+
+def test_duplicate_symbol_keeps_the_first_row(index):
+    assert index.find('TCS-EQ', 'NSE')['token'] == b'11536'
+
+
+def test_search_by_symbol_then_name_prefix(index):
+    symbols = [r['symbol'] for r in index.search('reli')]
+    assert set(symbols) == {'RELIANCE', 'RELIANCE-BE', 'RELIANCE-EQ', 'RELIANCE27JUN24FUT', 'RELINFRA-EQ'}
+    assert index.search('RELIANCE')[0]['symbol'] == 'RELIANCE'  # the exact symbol sorts first
+    assert len(index.search('REL', limit=2)) == 2
+    assert index.search('INFY') == []
+
+
+def test_search_filters_by_exchange_and_segment(index):
+    assert {r['symbol'] for r in index.search('REL', exchange='nse')} == {'RELIANCE-BE', 'RELIANCE-EQ', 'RELINFRA-EQ'}
+    assert [r['symbol'] for r in index.search('REL', exchange='NSE', segment='be')] == ['RELIANCE-BE']
+    future = index.search('RELIANCE', segment='FUTSTK')
+    assert [(r['exchange'], r['expiry'], r['lotsize']) for r in future] == [('NFO', '27JUN2024', 250)]
+    # the filters also apply to name matches, past the first `limit` rows
+    assert [r['symbol'] for r in index.search('TC', exchange='NSE', limit=1)] == ['TCS-EQ']
+
+
+def test_refresh_rebuilds_after_the_master_changes(tmp_path):
+    source = tmp_path / 'OpenAPIScripMaster.json'
+    write_master(source, ROWS[:2], time.time() - 60)
+    master = InstrumentMaster(str(source), str(tmp_path / 'index'), check_every=float('inf'))
+    assert master.get('RELIANCE-EQ') is None  # nothing indexed yet
+    master.refresh(wait=True)
+    assert master.token('RELIANCE-EQ') == '2885'
+    first = master.stats()['generation']
+
+    master.refresh(wait=True)  # unchanged file: same generation
+    assert master.stats()['generation'] == first
+
+    write_master(source, ROWS[:2] + [ROWS[4]], time.time())
+    master.refresh(wait=True)
+    assert master.stats()['generation'] != first
+    assert master.stats()['count'] == 3
+    assert master.get('tcs-eq')['token'] == '11536'
+
+    # another worker on the same directory loads the existing generation without rebuilding
+    other = InstrumentMaster(str(source), str(tmp_path / 'index'), check_every=float('inf'))
+    assert other.stats()['generation'] == master.stats()['generation']
+
+
+def test_lookup_rebuilds_in_the_background(tmp_path):
+    source = tmp_path / 'OpenAPIScripMaster.json'
+    write_master(source, ROWS[:2], time.time() - 60)
+    master = InstrumentMaster(str(source), str(tmp_path / 'index'), check_every=0)
+    master.refresh(wait=True)
+    write_master(source, ROWS[4:5], time.time())
+    assert master.token('RELIANCE-EQ') == '2885'  # served from the old generation while the new one builds
+    deadline = time.time() + 60
+    while master.token('TCS-EQ') is None and time.time() < deadline:
+        time.sleep(0.1)
+    assert master.token('TCS-EQ') == '11536'
+    assert master.token('RELIANCE-EQ') is None
+    assert master.stats()['error'] is None
@@ -0,0 +1,91 @@
+# tests/test_numpy_runtime.py
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+
+from numpy_runtime import export_runtime, load_runtime
+
+TIME_STEP = 8
+STEPS = 12  # longer than the window, so fed-back steps replace every observed row
+TOL = 1e-5
+
+
+@pytest.fixture(scope='module')
+def exported(tmp_path_factory):
+    """A small Keras LSTM and meta NN built like train_lstm_model / KerasMetaLearner, exported and reloaded."""
+    import tensorflow as tf
+    from sklearn.preprocessing import MinMaxScaler
+    tf.keras.utils.set_random_seed(0)
+    rng = np.random.default_rng(0)
+    prices = 100 + np.cumsum(rng.normal(0, 1, 300))
+    frame = np.column_stack((prices, rng.uniform(1e5, 2e5, 300)))
+    lstm = tf.keras.Sequential([
+        tf.keras.Input((TIME_STEP, 2)),
+        tf.keras.layers.LSTM(16),
+        tf.keras.layers.Dropout(0.2),
+        tf.keras.layers.Dense(1),
+    ])
+    meta = tf.keras.Sequential([
+        tf.keras.Input((2,)),
+        tf.keras.layers.Dense(32, activation='relu'),
+        tf.keras.layers.Dropout(0.1),
+        tf.keras.layers.Dense(8, activation='relu'),
+        tf.keras.layers.Dense(1),
+    ])
+    state = {'lstm_model': lstm, 'meta_model': meta, 'time_step': TIME_STEP,
+             'feature_scaler': MinMaxScaler().fit(frame), 'target_scaler': MinMaxScaler().fit(prices[:, None])}
+    directory = tmp_path_factory.mktemp('runtime')
+    export_runtime(state, str(directory))
+    features = state['feature_scaler'].transform(frame).astype(np.float32)
+    return state, load_runtime(str(directory)), features
+
+
+def keras_recursion(model, windows, steps, noise=None):
+    """Reference recursive forecast: one model.predict per step, each prediction fed back as feature 0."""
+    x = np.array(windows, dtype=np.float32)
+    preds = np.empty((len(x), steps))
+    for s in range(steps):
+        pred = model.predict(x, verbose=0)[:, 0]
+        if noise is not None:
+            pred = pred + noise[:, s]
+        preds[:, s] = pred
+        new_step = np.concatenate([pred[:, None, None], x[:, -1:, 1:]], axis=2).astype(np.float32)
+        x = np.concatenate([x[:, 1:], new_step], axis=1)
+    return preds
+
+
+def test_forecast_matches_keras_predict(exported):
+    state, runtime, features = exported
+    windows = np.stack([features[i - TIME_STEP:i] for i in (TIME_STEP, 150, len(features))])
+    expected = keras_recursion(state['lstm_model'], windows, STEPS)
+    np.testing.assert_allclose(runtime['lstm_model'].rollout(windows, STEPS), expected, atol=TOL)
+
+    prices = state['target_scaler'].inverse_transform(expected.reshape(-1, 1))
+    np.testing.assert_allclose(runtime['target_scaler'].inverse_transform(expected.reshape(-1, 1)), prices, rtol=TOL)
+
+
+def test_sample_paths_match_keras_predict(exported):
+    state, runtime, features = exported
+    window = features[-TIME_STEP:]
+    noise = np.random.default_rng(1).normal(0, 0.01, (4, STEPS)).astype(np.float32)
+    expected = keras_recursion(state['lstm_model'], np.repeat(window[None], 4, axis=0), STEPS, noise=noise)
+    np.testing.assert_allclose(runtime['lstm_model'].sample_paths(window, STEPS, 4, noise=noise), expected, atol=TOL)
+
+    point = keras_recursion(state['lstm_model'], window[None], STEPS)
+    np.testing.assert_allclose(runtime['lstm_model'].sample_paths(window, STEPS, 2), np.repeat(point, 2, axis=0),
+                               atol=TOL)
+
+
+def test_meta_and_scalers_match_keras(exported):
+    state, runtime, features = exported
+    X = np.random.default_rng(2).uniform(90, 110, (32, 2))
+    expected = state['meta_model'].predict(X.astype(np.float32), verbose=0).ravel()
+    np.testing.assert_allclose(runtime['meta_model'].predict(X), expected, rtol=TOL, atol=TOL)
+    frame = state['feature_scaler'].inverse_transform(features)
+    np.testing.assert_allclose(runtime['feature_scaler'].transform(frame), features, atol=TOL)
+    assert runtime['lstm_model'].dropout == pytest.approx(0.2)
@@ -0,0 +1,127 @@
+# tests/test_response_cache.py
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_cache import ResponseCache, cache_key, etag_for, http_date, not_modified
+
+KEY = cache_key(symbol='RELIANCE-EQ', forecast_days=7, last_bar='2024-06-28')
+
+
+def slow_compute(calls, body=b'{"ok": true}', delay=0.3):
+    def compute():
+        calls.append(1)
+        time.sleep(delay)
+        return body
+    return compute
+
+
+@pytest.mark.parametrize('shared_dir', [False, True])
+def test_concurrent_misses_compute_once(tmp_path, shared_dir):
+    cache = ResponseCache(root=str(tmp_path) if shared_dir else None)
+    calls, results = [], []
+    barrier = threading.Barrier(4)
+
+    def request():
+        barrier.wait()
+        results.append(cache.get_or_compute(KEY, slow_compute(calls)))
+    threads = [threading.Thread(target=request) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert sorted(status for _, status in results) == ['miss', 'shared', 'shared', 'shared']
+    assert {entry['body'] for entry, _ in results} == {b'{"ok": true}'}
+
+
+def _compute_in_worker(root, log_path, statuses):
+    def compute():
+        with open(log_path, 'a') as f:
+            f.write('computed\n')
+        time.sleep(0.5)
+        return b'body'
+    statuses.put(ResponseCache(root=root).get_or_compute(KEY, compute)[1])
+
+
+def test_concurrent_misses_across_processes_compute_once(tmp_path):
+    ctx = multiprocessing.get_context('fork')
+    log_path = tmp_path / 'computed.log'
+    statuses = ctx.Queue()
+    workers = [ctx.Process(target=_compute_in_worker, args=(str(tmp_path / 'cache'), str(log_path), statuses))
+               for _ in range(3)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(30)
+    assert [w.exitcode for w in workers] == [0, 0, 0]
+    assert log_path.read_text().count('computed') == 1
+    assert sorted(statuses.get(timeout=5) for _ in workers) == ['miss', 'shared', 'shared']
+
+
+def test_disk_hit_is_promoted_to_memory(tmp_path):
+    ResponseCache(root=str(tmp_path)).put(KEY, b'body')
+    cache = ResponseCache(root=str(tmp_path))  # another worker: empty memory tier
+    entry, status = cache.get_or_compute(KEY, lambda: pytest.fail('should not compute'))
+    assert (entry['body'], status) == (b'body', 'disk')
+    os.remove(cache._path(KEY))
+    assert cache.lookup(KEY)[1] == 'hit'
+
+
+def test_expired_disk_entry_is_recomputed(tmp_path):
+    ResponseCache(root=str(tmp_path)).put(KEY, b'old', created_at=time.time() - 10)
+    cache = ResponseCache(root=str(tmp_path), disk_max_age=5)
+    entry, status = cache.get_or_compute(KEY, lambda: b'new')
+    assert (entry['body'], status) == (b'new', 'miss')
+
+
+def test_failed_compute_is_not_cached(tmp_path):
+    cache = ResponseCache(root=str(tmp_path))
+
+    def fail():
+        raise RuntimeError('pipeline failed')
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute(KEY, fail)
+    assert cache.lookup(KEY) == (None, None)
+    assert not cache._inflight
+    assert cache.get_or_compute(KEY, lambda: b'body')[1] == 'miss'
+
+
+def test_memory_tier_is_bounded():
+    cache = ResponseCache(memory_entries=2)
+    for key in 'abc':
+        cache.put(key * 40, key.encode())
+    assert cache.lookup('a' * 40) == (None, None)
+    assert cache.lookup('c' * 40)[1] == 'hit'
+
+
+def test_not_modified_compares_etags_weakly():
+    etag = etag_for(KEY)
+    assert etag.startswith('W/"')
+    assert not_modified(etag, None, if_none_match=etag)
+    assert not_modified(etag, None, if_none_match=etag.removeprefix('W/'))
+    assert not_modified(etag, None, if_none_match=f'"other", {etag}')
+    assert not_modified(etag, None, if_none_match='*')
+    assert not not_modified(etag, None, if_none_match='"other"')
+
+
+def test_not_modified_if_modified_since():
+    created = 1_719_561_600.5
+    etag = etag_for(KEY)
+    assert not_modified(etag, created, if_modified_since=http_date(created))
+    assert not_modified(etag, created, if_modified_since=http_date(created + 60))
+    assert not not_modified(etag, created, if_modified_since=http_date(created - 60))
+    assert not not_modified(etag, created, if_modified_since='not a date')
+    assert not not_modified(etag, None, if_modified_since=http_date(created))
+
+
+def test_if_none_match_wins_over_if_modified_since():
+    created = 1_719_561_600
+    etag = etag_for(KEY)
+    assert not not_modified(etag, created, if_none_match='"other"', if_modified_since=http_date(created + 60))
@@ -0,0 +1,182 @@
+# tools/fake_smartapi_server.py
+# Minimal local stand-in for the Angel One SmartAPI REST endpoints used by the backend
+# (login, token refresh, profile, historical candles, quotes). Candles are deterministic
+# synthetic prices; the per-interval range truncation and the request rate limit mimic
+# the real broker closely enough to exercise angel_session.py.
+#
+# Usage:
+#   python tools/fake_smartapi_server.py --port 8700 --jwt-ttl 3600
+#   ANGEL_API_ROOT=http://127.0.0.1:8700 ANGEL_API_KEY=x ANGEL_CLIENT_ID=x ANGEL_PASSWORD=x \
+#       ANGEL_TOTP_SECRET=JBSWY3DPEHPK3PXP python stock_forecast_api.py
+
+import os
+import sys
+import json
+import time
+import uuid
+import base64
+import argparse
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import Flask, request, jsonify
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from angel_session import MAX_DAYS_PER_REQUEST, DATE_FORMAT
+
+INTERVAL_MINUTES = {'ONE_MINUTE': 1, 'THREE_MINUTE': 3, 'FIVE_MINUTE': 5, 'TEN_MINUTE': 10,
+                    'FIFTEEN_MINUTE': 15, 'THIRTY_MINUTE': 30, 'ONE_HOUR': 60}
+
+app = Flask(__name__)
+state = {'jwt_ttl': 3600, 'rate': 3.0, 'tokens': {}, 'refresh_tokens': set(),
+         'stats': {'logins': 0, 'refreshes': 0, 'candle_requests': 0, 'rate_limited': 0}}
+_rate_lock = threading.Lock()
+_recent = []
+
+
+def _make_jwt():
+    exp = time.time() + state['jwt_ttl']
+    enc = lambda obj: base64.urlsafe_b64encode(json.dumps(obj).encode()).decode().rstrip('=')
+    token = f"{enc({'alg': 'none'})}.{enc({'sub': 'FAKE', 'exp': exp, 'jti': uuid.uuid4().hex})}.sig"
+    state['tokens'][token] = exp
+    return token
+
+
+def _issue_tokens():
+    refresh = uuid.uuid4().hex
+    state['refresh_tokens'].add(refresh)
+    return {'jwtToken': _make_jwt(), 'refreshToken': refresh, 'feedToken': uuid.uuid4().hex}
+
+
+def _authorized():
+    token = request.headers.get('Authorization', '').split(' ')[-1]
+    exp = state['tokens'].get(token)
+    return exp is not None and exp > time.time()
+
+
+def _token_error():
+    return jsonify({'status': False, 'message': 'Invalid Token', 'errorcode': 'AG8001',
+                    'error_type': 'TokenException'}), 403
+
+
+def _rate_limited():
+    with _rate_lock:
+        now = time.monotonic()
+        while _recent and now - _recent[0] > 1.0:
+            _recent.pop(0)
+        if len(_recent) >= state['rate']:
+            return True
+        _recent.append(now)
+        return False
+
+
+def _price(token, ts):
+    # deterministic random walk per symbol token, evaluated at any timestamp
+    seed = int(token) if str(token).isdigit() else abs(hash(token)) % 10000
+    t = ts.timestamp() / 86400.0
+    return 100 + seed % 900 + 20 * np.sin(t / 30.0 + seed) + 5 * np.sin(t / 3.0)
+
+
+def _candles(token, interval, start, end):
+    rows = []
+    if interval == 'ONE_DAY':
+        day = start.replace(hour=0, minute=0)
+        while day <= end:
+            if day.weekday() < 5:
+                rows.append(day.replace(hour=9, minute=15))
+            day += timedelta(days=1)
+    else:
+        step = timedelta(minutes=INTERVAL_MINUTES[interval])
+        day = start.replace(hour=0, minute=0)
+        while day <= end:
+            if day.weekday() < 5:
+                ts = day.replace(hour=9, minute=15)
+                close = day.replace(hour=15, minute=30)
+                while ts < close:
+                    if start <= ts <= end:
+                        rows.append(ts)
+                    ts += step
+            day += timedelta(days=1)
+    out = []
+    for ts in rows:
+        p = float(_price(token, ts))
+        out.append([ts.strftime('%Y-%m-%dT%H:%M:%S+05:30'), round(p - 1, 2), round(p + 2, 2),
+                    round(p - 2, 2), round(p, 2), int(1e5 + (ts.toordinal() % 97) * 1000)])
+    return out
+
+
+@app.route('/rest/auth/angelbroking/user/v1/loginByPassword', methods=['POST'])
+def login():
+    body = request.get_json(force=True, silent=True) or {}
+    if not str(body.get('totp', '')).isdigit():
+        return jsonify({'status': False, 'message': 'Invalid totp', 'errorcode': 'AB1050', 'data': None})
+    state['stats']['logins'] += 1
+    return jsonify({'status': True, 'message': 'SUCCESS', 'errorcode': '', 'data': _issue_tokens()})
+
+
+@app.route('/rest/auth/angelbroking/jwt/v1/generateTokens', methods=['POST'])
+def generate_tokens():
+    body = request.get_json(force=True, silent=True) or {}
+    if body.get('refreshToken') not in state['refresh_tokens']:
+        return jsonify({'status': False, 'message': 'Invalid refresh token', 'errorcode': 'AG8002', 'data': None})
+    state['stats']['refreshes'] += 1
+    return jsonify({'status': True, 'message': 'SUCCESS', 'errorcode': '', 'data': _issue_tokens()})
+
+
+@app.route('/rest/secure/angelbroking/user/v1/getProfile', methods=['GET'])
+def profile():
+    return jsonify({'status': True, 'message': 'SUCCESS', 'errorcode': '',
+                    'data': {'clientcode': 'FAKE', 'name': 'Fake Client'}})
+
+
+@app.route('/rest/secure/angelbroking/historical/v1/getCandleData', methods=['POST'])
+def candle_data():
+    if not _authorized():
+        return _token_error()
+    if _rate_limited():
+        state['stats']['rate_limited'] += 1
+        return jsonify({'status': False, 'message': 'Access denied because of exceeding access rate',
+                        'errorcode': 'AB1019', 'data': None})
+    state['stats']['candle_requests'] += 1
+    body = request.get_json(force=True, silent=True) or {}
+    interval = body.get('interval', 'ONE_DAY')
+    start = datetime.strptime(body['fromdate'], DATE_FORMAT)
+    end = datetime.strptime(body['todate'], DATE_FORMAT)
+    # like the broker, serve at most MAX_DAYS_PER_REQUEST days from the start of the range
+    end = min(end, start + timedelta(days=MAX_DAYS_PER_REQUEST.get(interval, 30)))
+    return jsonify({'status': True, 'message': 'SUCCESS', 'errorcode': '',
+                    'data': _candles(body.get('symboltoken', '0'), interval, start, end)})
+
+
+@app.route('/rest/secure/angelbroking/market/v1/quote', methods=['POST'])
+def quote():
+    if not _authorized():
+        return _token_error()
+    body = request.get_json(force=True, silent=True) or {}
+    fetched = []
+    for exchange, tokens in (body.get('exchangeTokens') or {}).items():
+        for token in tokens:
+            p = float(_price(token, datetime.now()))
+            fetched.append({'exchange': exchange, 'symbolToken': token, 'tradingSymbol': f'FAKE{token}-EQ',
+                            'ltp': round(p, 2), 'open': round(p - 1, 2), 'high': round(p + 2, 2),
+                            'low': round(p - 2, 2), 'close': round(p - 0.5, 2), 'netChange': 0.5,
+                            'percentChange': round(50 / p, 3), 'tradeVolume': 123456})
+    return jsonify({'status': True, 'message': 'SUCCESS', 'errorcode': '',
+                    'data': {'fetched': fetched, 'unfetched': []}})
+
+
+@app.route('/__stats', methods=['GET'])
+def stats():
+    return jsonify(state['stats'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local fake SmartAPI server')
+    parser.add_argument('--port', type=int, default=8700)
+    parser.add_argument('--jwt-ttl', type=int, default=3600, help='lifetime of issued JWTs in seconds')
+    parser.add_argument('--rate', type=float, default=3.0, help='candle requests allowed per second')
+    args = parser.parse_args()
+    state['jwt_ttl'] = args.jwt_ttl
+    state['rate'] = args.rate
+    app.run(host='127.0.0.1', port=args.port, threaded=True)